@@ -37,7 +37,9 @@ if __name__ == "__main__":
     ################################################
     # 1. Parameters for environment
     parser.add_argument("--vector_env_num", type=int, default=4, help="Number of vector envs")
-    parser.add_argument("--vector_env_type", type=str, default='async', help="Options: sync/async")
+    parser.add_argument("--vector_env_type", type=str, default='async', help="Options: sync/async/batched_async/model")
+    parser.add_argument("--envs_per_worker", type=int, default=None, help="Number of envs per worker process of batched_async")
+    parser.add_argument("--vector_env_min_ready", type=int, default=None, help="Step batched_async envs in partial batches of at least this many ready envs")
     parser.add_argument("--gym2gymnasium", type=bool, default=True, help="Convert Gym-style env to Gymnasium-style")
     parser.add_argument("--is_render", type=bool, default=False)
     parser.add_argument("--is_adversary", type=bool, default=False)
@@ -91,6 +91,9 @@ class AlgorithmBase(metaclass=ABCMeta):
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
 
+    def load_flat_weights(self, weights):
+        weights.load_into(self.networks)
+
     def local_update(self, data: dict, iteration: int) -> dict:
         tb_info = self._local_update(data, iteration)
         for key, scheduler in self.networks.scheduler_dict.items():
@@ -108,6 +111,16 @@ class AlgorithmBase(metaclass=ABCMeta):
     def get_remote_update_info(self, data: dict, iteration: int) -> Tuple[dict, dict]:
         raise NotImplemented
 
+    def get_remote_update_info_from_buffer(
+        self, buffer, batch_size: int, iteration: int
+    ) -> Tuple[dict, dict]:
+        """Sample replay data from a buffer in shared memory inside this process."""
+        data = buffer.sample_batch(batch_size)
+        if next(self.networks.parameters()).is_cuda:
+            for k, v in data.items():
+                data[k] = v.cuda()
+        return self.get_remote_update_info(data, iteration)
+
     def _remote_update(self, update_info: dict):
         raise NotImplemented
 
@@ -29,7 +29,12 @@ from gops.algorithm.base import AlgorithmBase, ApprBase
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.gops_typing import DataDict
-from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.common_utils import (
+    flat_grad,
+    get_apprfunc_dict,
+    polyak_update,
+    set_flat_grad,
+)
 
 
 class ApproxContainer(ApprBase):
@@ -119,28 +124,22 @@ class DSAC(AlgorithmBase):
         tb_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q_grad": [p._grad for p in self.networks.q.parameters()],
-            "policy_grad": [p._grad for p in self.networks.policy.parameters()],
+            "grad": flat_grad(self.__trainable_parameters()),
             "iteration": iteration,
         }
-        if self.auto_alpha:
-            update_info.update({"log_alpha_grad":self.networks.log_alpha.grad})
 
         return tb_info, update_info
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q_grad = update_info["q_grad"]
-        policy_grad = update_info["policy_grad"]
+        set_flat_grad(self.__trainable_parameters(), update_info["grad"])
+        self.__update(iteration)
 
-        for p, grad in zip(self.networks.q.parameters(), q_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.policy.parameters(), policy_grad):
-            p._grad = grad
+    def __trainable_parameters(self) -> list:
+        params = list(self.networks.q.parameters()) + list(self.networks.policy.parameters())
         if self.auto_alpha:
-            self.networks.log_alpha._grad = update_info["log_alpha_grad"]
-
-        self.__update(iteration)
+            params.append(self.networks.log_alpha)
+        return params
 
     def __get_alpha(self, requires_grad: bool = False):
         if self.auto_alpha:
@@ -275,16 +274,11 @@ class DSAC(AlgorithmBase):
             if self.auto_alpha:
                 self.networks.alpha_optimizer.step()
 
-            with torch.no_grad():
-                polyak = 1 - self.tau
-                for p, p_targ in zip(
-                    self.networks.q.parameters(), self.networks.q_target.parameters()
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.policy.parameters(),
-                    self.networks.policy_target.parameters(),
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
+            polyak_update(
+                self.networks.q.parameters(), self.networks.q_target.parameters(), self.tau
+            )
+            polyak_update(
+                self.networks.policy.parameters(),
+                self.networks.policy_target.parameters(),
+                self.tau,
+            )
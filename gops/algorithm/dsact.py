@@ -28,23 +28,41 @@ from gops.algorithm.base import AlgorithmBase, ApprBase
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.gops_typing import DataDict
-from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.common_utils import (
+    flat_grad,
+    get_apprfunc_dict,
+    polyak_update,
+    set_flat_grad,
+)
 
 
 class ApproxContainer(ApprBase):
     """Approximate function container for DSAC.
 
-    Contains one policy and one action value.
+    Contains one policy and two action values. With value_func_name
+    "EnsembleActionValueDistri", the two action values are fused into one ensemble q.
     """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # create q networks
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1: nn.Module = create_apprfunc(**q_args)
-        self.q2: nn.Module = create_apprfunc(**q_args)
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
+        self.fused_q = q_args["name"] == "EnsembleActionValueDistri"
+        if self.fused_q:
+            q_args["ensemble_size"] = 2
+            self.q: nn.Module = create_apprfunc(**q_args)
+            self.q_target = deepcopy(self.q)
+            self.q_optimizers = [
+                Adam(self.q.parameters(), lr=kwargs["value_learning_rate"])
+            ]
+        else:
+            self.q1: nn.Module = create_apprfunc(**q_args)
+            self.q2: nn.Module = create_apprfunc(**q_args)
+            self.q1_target = deepcopy(self.q1)
+            self.q2_target = deepcopy(self.q2)
+            self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
+            self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
+            self.q_optimizers = [self.q1_optimizer, self.q2_optimizer]
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
@@ -54,17 +72,13 @@ class ApproxContainer(ApprBase):
         # set target network gradients
         for p in self.policy_target.parameters():
             p.requires_grad = False
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target_parameters():
             p.requires_grad = False
 
         # create entropy coefficient
         self.log_alpha = nn.Parameter(torch.tensor(1, dtype=torch.float32))
 
         # create optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -73,6 +87,28 @@ class ApproxContainer(ApprBase):
     def create_action_distributions(self, logits):
         return self.policy.get_act_dist(logits)
 
+    def q_values(self, obs, act):
+        if self.fused_q:
+            q = self.q(obs, act)
+            return q[0], q[1]
+        return self.q1(obs, act), self.q2(obs, act)
+
+    def q_target_values(self, obs, act):
+        if self.fused_q:
+            q = self.q_target(obs, act)
+            return q[0], q[1]
+        return self.q1_target(obs, act), self.q2_target(obs, act)
+
+    def q_parameters(self) -> list:
+        if self.fused_q:
+            return list(self.q.parameters())
+        return list(self.q1.parameters()) + list(self.q2.parameters())
+
+    def q_target_parameters(self) -> list:
+        if self.fused_q:
+            return list(self.q_target.parameters())
+        return list(self.q1_target.parameters()) + list(self.q2_target.parameters())
+
 
 class DSACT(AlgorithmBase):
     """DSAC algorithm with three refinements, higher performance and more stable.
@@ -122,33 +158,23 @@ class DSACT(AlgorithmBase):
         tb_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p._grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p._grad for p in self.networks.q2.parameters()],
-            "policy_grad": [p._grad for p in self.networks.policy.parameters()],
+            "grad": flat_grad(self.__trainable_parameters()),
             "iteration": iteration,
         }
-        if self.auto_alpha:
-            update_info.update({"log_alpha_grad":self.networks.log_alpha.grad})
 
         return tb_info, update_info
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
-        policy_grad = update_info["policy_grad"]
-
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.policy.parameters(), policy_grad):
-            p._grad = grad
-        if self.auto_alpha:
-            self.networks.log_alpha._grad = update_info["log_alpha_grad"]
-
+        set_flat_grad(self.__trainable_parameters(), update_info["grad"])
         self.__update(iteration)
 
+    def __trainable_parameters(self) -> list:
+        params = self.networks.q_parameters() + list(self.networks.policy.parameters())
+        if self.auto_alpha:
+            params.append(self.networks.log_alpha)
+        return params
+
     def __get_alpha(self, requires_grad: bool = False):
         if self.auto_alpha:
             alpha = self.networks.log_alpha.exp()
@@ -172,24 +198,19 @@ class DSACT(AlgorithmBase):
         new_act, new_log_prob = act_dist.rsample()
         data.update({"new_act": new_act, "new_log_prob": new_log_prob})
 
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        for optimizer in self.networks.q_optimizers:
+            optimizer.zero_grad()
         loss_q, q1, q2, std1, std2, min_std1, min_std2 = self.__compute_loss_q(data)
         loss_q.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-
-        for p in self.networks.q2.parameters():
+        for p in self.networks.q_parameters():
             p.requires_grad = False
 
         self.networks.policy_optimizer.zero_grad()
         loss_policy, entropy = self.__compute_loss_policy(data)
         loss_policy.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
+        for p in self.networks.q_parameters():
             p.requires_grad = True
 
         if self.auto_alpha:
@@ -217,8 +238,7 @@ class DSACT(AlgorithmBase):
 
         return tb_info
 
-    def __q_evaluate(self, obs, act, qnet):
-        StochaQ = qnet(obs, act)
+    def __q_evaluate(self, StochaQ):
         mean, std = StochaQ[..., 0], StochaQ[..., -1]
         normal = Normal(torch.zeros_like(mean), torch.ones_like(std))
         z = normal.sample()
@@ -238,8 +258,9 @@ class DSACT(AlgorithmBase):
         act2_dist = self.networks.create_action_distributions(logits_2)
         act2, log_prob_act2 = act2_dist.rsample()
 
-        q1, q1_std, _ = self.__q_evaluate(obs, act, self.networks.q1)
-        q2, q2_std, _ = self.__q_evaluate(obs, act, self.networks.q2)
+        StochaQ1, StochaQ2 = self.networks.q_values(obs, act)
+        q1, q1_std, _ = self.__q_evaluate(StochaQ1)
+        q2, q2_std, _ = self.__q_evaluate(StochaQ2)
         if self.mean_std1 is None:
             self.mean_std1 = torch.mean(q1_std.detach())
         else:
@@ -251,13 +272,9 @@ class DSACT(AlgorithmBase):
             self.mean_std2 = (1 - self.tau_b) * self.mean_std2 + self.tau_b * torch.mean(q2_std.detach())
 
 
-        q1_next, _, q1_next_sample = self.__q_evaluate(
-            obs2, act2, self.networks.q1_target
-        )
-        
-        q2_next, _, q2_next_sample = self.__q_evaluate(
-            obs2, act2, self.networks.q2_target
-        )
+        StochaQ1_next, StochaQ2_next = self.networks.q_target_values(obs2, act2)
+        q1_next, _, q1_next_sample = self.__q_evaluate(StochaQ1_next)
+        q2_next, _, q2_next_sample = self.__q_evaluate(StochaQ2_next)
         q_next = torch.min(q1_next, q2_next)
         q_next_sample = torch.where(q1_next < q2_next, q1_next_sample, q2_next_sample)
 
@@ -314,8 +331,9 @@ class DSACT(AlgorithmBase):
 
     def __compute_loss_policy(self, data: DataDict):
         obs, new_act, new_log_prob = data["obs"], data["new_act"], data["new_log_prob"]
-        q1, _, _ = self.__q_evaluate(obs, new_act, self.networks.q1)
-        q2, _, _ = self.__q_evaluate(obs, new_act, self.networks.q2)
+        StochaQ1, StochaQ2 = self.networks.q_values(obs, new_act)
+        q1, _, _ = self.__q_evaluate(StochaQ1)
+        q2, _, _ = self.__q_evaluate(StochaQ2)
         loss_policy = (self.__get_alpha() * new_log_prob - torch.min(q1,q2)).mean()
         entropy = -new_log_prob.detach().mean()
         return loss_policy, entropy
@@ -329,8 +347,8 @@ class DSACT(AlgorithmBase):
         return loss_alpha
 
     def __update(self, iteration: int):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
+        for optimizer in self.networks.q_optimizers:
+            optimizer.step()
 
         if iteration % self.delay_update == 0:
             self.networks.policy_optimizer.step()
@@ -338,21 +356,11 @@ class DSACT(AlgorithmBase):
             if self.auto_alpha:
                 self.networks.alpha_optimizer.step()
 
-            with torch.no_grad():
-                polyak = 1 - self.tau
-                for p, p_targ in zip(
-                    self.networks.q1.parameters(), self.networks.q1_target.parameters()
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.q2.parameters(), self.networks.q2_target.parameters()
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
-                for p, p_targ in zip(
-                    self.networks.policy.parameters(),
-                    self.networks.policy_target.parameters(),
-                ):
-                    p_targ.data.mul_(polyak)
-                    p_targ.data.add_((1 - polyak) * p.data)
+            polyak_update(
+                self.networks.q_parameters(), self.networks.q_target_parameters(), self.tau
+            )
+            polyak_update(
+                self.networks.policy.parameters(),
+                self.networks.policy_target.parameters(),
+                self.tau,
+            )
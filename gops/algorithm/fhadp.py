@@ -16,7 +16,6 @@
 __all__ = ["FHADP"]
 
 import time
-from copy import deepcopy
 from typing import Tuple
 
 import torch
@@ -26,6 +25,7 @@ from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
 from gops.utils.gops_typing import DataDict, InfoDict
+from gops.utils.model_rollout import HorizonRollout
 from gops.utils.tensorboard_setup import tb_tags
 
 
@@ -60,8 +60,13 @@ class FHADP(AlgorithmBase):
 
     Paper: https://link.springer.com/book/10.1007/978-981-19-7784-8
 
+    With policy FiniteHorizonFullPolicy, actions of all steps come from one policy
+    forward and are rolled out open-loop in the model.
+
     :param int pre_horizon: envmodel predict horizon.
     :param float gamma: discount factor.
+    :param str rollout_backend: "eager" or "compile" for the horizon rollout.
+    :param bool rollout_timing: record per-step forward time of the rollout.
     """
 
     def __init__(
@@ -70,15 +75,34 @@ class FHADP(AlgorithmBase):
         pre_horizon: int,
         gamma: float = 1.0,
         index: int = 0,
+        rollout_backend: str = "eager",
+        rollout_timing: bool = False,
         **kwargs,
     ):
         super().__init__(index, **kwargs)
-        self.networks = ApproxContainer(**kwargs)
+        self.networks = ApproxContainer(**kwargs, pre_horizon=pre_horizon)
         self.envmodel = create_env_model(**kwargs, pre_horizon=pre_horizon)
         self.pre_horizon = pre_horizon
         self.gamma = gamma
+        self.rollout_backend = rollout_backend
+        self.rollout_timing = rollout_timing
+        self.rollout = self._create_rollout()
         self.tb_info = dict()
 
+    def _create_rollout(self) -> HorizonRollout:
+        return HorizonRollout(
+            self.networks.policy,
+            self.envmodel.forward,
+            self.pre_horizon,
+            self.gamma,
+            self.rollout_backend,
+            self.rollout_timing,
+        )
+
+    def set_parameters(self, param_dict):
+        super().set_parameters(param_dict)
+        self.rollout = self._create_rollout()
+
     @property
     def adjustable_parameters(self) -> Tuple[str]:
         para_tuple = ("pre_horizon", "gamma")
@@ -104,22 +128,21 @@ class FHADP(AlgorithmBase):
     def _compute_gradient(self, data: DataDict):
         start_time = time.time()
         self.networks.policy.zero_grad()
-        loss_policy, loss_info = self._compute_loss_policy(deepcopy(data))
+        # models return new info dicts, so a shallow copy keeps the batch unchanged
+        loss_policy, loss_info = self._compute_loss_policy(dict(data))
         loss_policy.backward()
         end_time = time.time()
         self.tb_info.update(loss_info)
         self.tb_info[tb_tags["alg_time"]] = (end_time - start_time) * 1000  # ms
 
     def _compute_loss_policy(self, data: DataDict) -> Tuple[torch.Tensor, InfoDict]:
-        o, d = data["obs"], data["done"]
-        info = data
-        v_pi = 0
-        for step in range(self.pre_horizon):
-            a = self.networks.policy(o, step + 1)
-            o, r, d, info = self.envmodel.forward(o, a, d, info)
-            v_pi += r * (self.gamma ** step)
+        v_pi = self.rollout(data["obs"], data["done"], data)
         loss_policy = -v_pi.mean()
         loss_info = {
             tb_tags["loss_actor"]: loss_policy.item()
         }
+        if self.rollout_timing:
+            policy_time, model_time = self.rollout.step_time.sum(0)
+            loss_info["FHADP/rollout policy time [ms]-RL iter"] = policy_time
+            loss_info["FHADP/rollout model time [ms]-RL iter"] = model_time
         return loss_policy, loss_info
@@ -24,6 +24,7 @@ import time
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum, rollout_model
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
 
@@ -157,61 +158,42 @@ class INFADP(AlgorithmBase):
         return update_list
 
     def __compute_loss_v(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
-        v = self.networks.v(o)
-        info_init = data
+        v = self.networks.v(data["obs"])
 
         with torch.no_grad():
-            for step in range(self.forward_step):
-                if step == 0:
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info_init)
-                    backup = r
-                else:
-                    o = o2
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                    backup += self.gamma**step * r
-
+            rollout = self.__rollout(data)
+            backup = discounted_sum(rollout.rewards, self.gamma)
             backup += (
-                (~d) * self.gamma**self.forward_step * self.networks.v_target(o2)
+                (~rollout.done)
+                * self.gamma**self.forward_step
+                * self.networks.v_target(rollout.obs)
             )
         loss_v = ((v - backup) ** 2).mean()
         return loss_v, torch.mean(v)
 
     def __compute_loss_policy(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
-        info_init = data
-        v_pi = torch.zeros(1)
         for p in self.networks.v.parameters():
             p.requires_grad = False
-        for step in range(self.forward_step):
-            if step == 0:
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info_init)
-                v_pi = r
-            else:
-                o = o2
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                v_pi += self.gamma**step * r
-        v_pi += (~d) * self.gamma**self.forward_step * self.networks.v_target(o2)
+        rollout = self.__rollout(data)
+        v_pi = discounted_sum(rollout.rewards, self.gamma)
+        v_pi += (
+            (~rollout.done)
+            * self.gamma**self.forward_step
+            * self.networks.v_target(rollout.obs)
+        )
         for p in self.networks.v.parameters():
             p.requires_grad = True
         return -v_pi.mean()
 
+    def __rollout(self, data) -> ModelRollout:
+        return rollout_model(
+            self.envmodel.forward,
+            self.networks.policy,
+            data["obs"],
+            data["done"],
+            dict(data),
+            self.forward_step,
+        )
 
 if __name__ == "__main__":
     print("11111")
@@ -25,6 +25,7 @@ import time
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum, rollout_model
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
 import numpy as np
@@ -156,12 +157,12 @@ class MAC(AlgorithmBase):
                     p_targ.data.mul_(1 - tau)
                     p_targ.data.add_(tau * p.data)
 
-    def dynamic_model_forward(self, o, a, d):
+    def dynamic_model_forward(self, o, a, d, info=None):
         if self.delta is not None:
             self.delta = torch.zeros_like(o)
-        o2, r, d, _ = self.envmodel.forward(o, a, d, {})
+        o2, r, d, info = self.envmodel.forward(o, a, d, {})
         o2 = o2 + self.delta
-        return o2, r, d
+        return o2, r, d, info
 
     def update_ibe_model(self, o, a, d, o2):
         data = o2 - self.envmodel.forward(o, a, d, {})[0]
@@ -200,14 +201,14 @@ class MAC(AlgorithmBase):
 
         if iteration % (self.pev_step + self.pim_step) < self.pev_step:
             self.networks.v.zero_grad()
-            loss_v, v = self.compute_loss_v(deepcopy(data))
+            loss_v, v = self.compute_loss_v(data)
             loss_v.backward()
             self.tb_info[tb_tags["loss_critic"]] = loss_v.item()
             self.tb_info[tb_tags["critic_avg_value"]] = v.item()
             update_list.append("v")
         else:
             self.networks.policy.zero_grad()
-            loss_policy = self.compute_loss_policy(deepcopy(data))
+            loss_policy = self.compute_loss_policy(data)
             loss_policy.backward()
             self.tb_info[tb_tags["loss_actor"]] = loss_policy.item()
             update_list.append("policy")
@@ -219,56 +220,41 @@ class MAC(AlgorithmBase):
         return update_list
 
     def compute_loss_v(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
+        o, a, d, o2 = data["obs"], data["act"], data["done"], data["obs2"]
 
         self.update_ibe_model(o, a, d, o2)
         v = self.networks.v(o)
         with torch.no_grad():
-            for step in range(self.forward_step):
-                if step == 0:
-                    a = self.networks.policy(o)
-                    o2, r, d = self.dynamic_model_forward(o, a, d)
-                    backup = self.reward_scale * r
-                else:
-                    o = o2
-                    a = self.networks.policy(o)
-                    o2, r, d = self.dynamic_model_forward(o, a, d)
-                    backup += self.reward_scale * self.gamma**step * r
-
+            rollout = self.__rollout(data)
+            backup = self.reward_scale * discounted_sum(rollout.rewards, self.gamma)
             backup += (
-                (~d) * self.gamma**self.forward_step * self.networks.v_target(o2)
+                (~rollout.done)
+                * self.gamma**self.forward_step
+                * self.networks.v_target(rollout.obs)
             )
         loss_v = ((v - backup) ** 2).mean()
         return loss_v, torch.mean(v)
 
     def compute_loss_policy(self, data):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
-        v_pi = torch.zeros(1)
         for p in self.networks.v.parameters():
             p.requires_grad = False
-        for step in range(self.forward_step):
-            if step == 0:
-                a = self.networks.policy(o)
-                o2, r, d = self.dynamic_model_forward(o, a, d)
-                v_pi = self.reward_scale * r
-            else:
-                o = o2
-                a = self.networks.policy(o)
-                o2, r, d = self.dynamic_model_forward(o, a, d)
-                v_pi += self.reward_scale * self.gamma**step * r
-        v_pi += (~d) * self.gamma**self.forward_step * self.networks.v_target(o2)
+        rollout = self.__rollout(data)
+        v_pi = self.reward_scale * discounted_sum(rollout.rewards, self.gamma)
+        v_pi += (
+            (~rollout.done)
+            * self.gamma**self.forward_step
+            * self.networks.v_target(rollout.obs)
+        )
         for p in self.networks.v.parameters():
             p.requires_grad = True
         return -v_pi.mean()
+
+    def __rollout(self, data) -> ModelRollout:
+        return rollout_model(
+            self.dynamic_model_forward,
+            self.networks.policy,
+            data["obs"],
+            data["done"],
+            {},
+            self.forward_step,
+        )
@@ -26,42 +26,54 @@ from gops.algorithm.base import AlgorithmBase, ApprBase
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
 from gops.utils.gops_typing import DataDict
-from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.common_utils import (
+    flat_grad,
+    get_apprfunc_dict,
+    polyak_update,
+    set_flat_grad,
+)
 
 
 class ApproxContainer(ApprBase):
     """Approximate function container for SAC.
 
-    Contains one policy and two action values.
+    Contains one policy and two action values. With value_func_name
+    "EnsembleActionValue", the two action values are fused into one ensemble q.
     """
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # create q networks
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1: nn.Module = create_apprfunc(**q_args)
-        self.q2: nn.Module = create_apprfunc(**q_args)
+        self.fused_q = q_args["name"] == "EnsembleActionValue"
+        if self.fused_q:
+            q_args["ensemble_size"] = 2
+            self.q: nn.Module = create_apprfunc(**q_args)
+            self.q_target = deepcopy(self.q)
+            self.q_optimizers = [
+                Adam(self.q.parameters(), lr=kwargs["q_learning_rate"])
+            ]
+        else:
+            self.q1: nn.Module = create_apprfunc(**q_args)
+            self.q2: nn.Module = create_apprfunc(**q_args)
+            self.q1_target = deepcopy(self.q1)
+            self.q2_target = deepcopy(self.q2)
+            self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["q_learning_rate"])
+            self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["q_learning_rate"])
+            self.q_optimizers = [self.q1_optimizer, self.q2_optimizer]
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
         self.policy: nn.Module = create_apprfunc(**policy_args)
 
-        # create target networks
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
-
         # set target networks gradients
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target_parameters():
             p.requires_grad = False
 
         # create entropy coefficient
         self.log_alpha = nn.Parameter(torch.tensor(1, dtype=torch.float32))
 
         # create optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["q_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["q_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -70,6 +82,28 @@ class ApproxContainer(ApprBase):
     def create_action_distributions(self, logits):
         return self.policy.get_act_dist(logits)
 
+    def q_values(self, obs, act):
+        if self.fused_q:
+            q = self.q(obs, act)
+            return q[0], q[1]
+        return self.q1(obs, act), self.q2(obs, act)
+
+    def q_target_values(self, obs, act):
+        if self.fused_q:
+            q = self.q_target(obs, act)
+            return q[0], q[1]
+        return self.q1_target(obs, act), self.q2_target(obs, act)
+
+    def q_parameters(self) -> list:
+        if self.fused_q:
+            return list(self.q.parameters())
+        return list(self.q1.parameters()) + list(self.q2.parameters())
+
+    def q_target_parameters(self) -> list:
+        if self.fused_q:
+            return list(self.q_target.parameters())
+        return list(self.q1_target.parameters()) + list(self.q2_target.parameters())
+
 
 class SAC(AlgorithmBase):
     """Soft Actor-Critic (SAC) algorithm
@@ -119,33 +153,23 @@ class SAC(AlgorithmBase):
         tb_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p.grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p.grad for p in self.networks.q2.parameters()],
-            "policy_grad": [p.grad for p in self.networks.policy.parameters()],
+            "grad": flat_grad(self.__trainable_parameters()),
             "iteration": iteration,
         }
-        if self.auto_alpha:
-            update_info.update({"log_alpha_grad":self.networks.log_alpha.grad})
 
         return tb_info, update_info
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
-        policy_grad = update_info["policy_grad"]
-
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.policy.parameters(), policy_grad):
-            p._grad = grad
-        if self.auto_alpha:
-            self.networks.log_alpha._grad = update_info["log_alpha_grad"]
-
+        set_flat_grad(self.__trainable_parameters(), update_info["grad"])
         self.__update(iteration)
 
+    def __trainable_parameters(self) -> list:
+        params = self.networks.q_parameters() + list(self.networks.policy.parameters())
+        if self.auto_alpha:
+            params.append(self.networks.log_alpha)
+        return params
+
     def __get_alpha(self, requires_grad: bool = False):
         if self.auto_alpha:
             alpha = self.networks.log_alpha.exp()
@@ -165,23 +189,19 @@ class SAC(AlgorithmBase):
         new_act, new_logp = act_dist.rsample()
         data.update({"new_act": new_act, "new_logp": new_logp})
 
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        for optimizer in self.networks.q_optimizers:
+            optimizer.zero_grad()
         loss_q, q1, q2 = self.__compute_loss_q(data)
         loss_q.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-        for p in self.networks.q2.parameters():
+        for p in self.networks.q_parameters():
             p.requires_grad = False
 
         self.networks.policy_optimizer.zero_grad()
         loss_policy, entropy = self.__compute_loss_policy(data)
         loss_policy.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
+        for p in self.networks.q_parameters():
             p.requires_grad = True
 
         if self.auto_alpha:
@@ -209,14 +229,12 @@ class SAC(AlgorithmBase):
             data["obs2"],
             data["done"],
         )
-        q1 = self.networks.q1(obs, act)
-        q2 = self.networks.q2(obs, act)
+        q1, q2 = self.networks.q_values(obs, act)
         with torch.no_grad():
             next_logits = self.networks.policy(obs2)
             next_act_dist = self.networks.create_action_distributions(next_logits)
             next_act, next_logp = next_act_dist.rsample()
-            next_q1 = self.networks.q1_target(obs2, next_act)
-            next_q2 = self.networks.q2_target(obs2, next_act)
+            next_q1, next_q2 = self.networks.q_target_values(obs2, next_act)
             next_q = torch.min(next_q1, next_q2)
             backup = rew + (1 - done) * self.gamma * (
                 next_q - self.__get_alpha() * next_logp
@@ -227,8 +245,7 @@ class SAC(AlgorithmBase):
 
     def __compute_loss_policy(self, data: DataDict):
         obs, new_act, new_logp = data["obs"], data["new_act"], data["new_logp"]
-        q1 = self.networks.q1(obs, new_act)
-        q2 = self.networks.q2(obs, new_act)
+        q1, q2 = self.networks.q_values(obs, new_act)
         loss_policy = (self.__get_alpha() * new_logp - torch.min(q1, q2)).mean()
         entropy = -new_logp.detach().mean()
         return loss_policy, entropy
@@ -241,23 +258,14 @@ class SAC(AlgorithmBase):
         return loss_alpha
 
     def __update(self, iteration: int):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
+        for optimizer in self.networks.q_optimizers:
+            optimizer.step()
 
         self.networks.policy_optimizer.step()
 
         if self.auto_alpha:
             self.networks.alpha_optimizer.step()
 
-        with torch.no_grad():
-            polyak = 1 - self.tau
-            for p, p_targ in zip(
-                self.networks.q1.parameters(), self.networks.q1_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.q2.parameters(), self.networks.q2_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(
+            self.networks.q_parameters(), self.networks.q_target_parameters(), self.tau
+        )
@@ -25,6 +25,7 @@ import numpy as np
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.create_pkg.create_env_model import create_env_model
 from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.model_rollout import ModelRollout, discounted_sum, rollout_model
 from gops.utils.tensorboard_setup import tb_tags
 from gops.algorithm.base import AlgorithmBase, ApprBase
 
@@ -161,14 +162,23 @@ class SPIL(AlgorithmBase):
         update_list = []
 
         start_time = time.time()
+        # one differentiable rollout serves both the value target and the policy loss
+        rollout = rollout_model(
+            self.envmodel.forward,
+            self.networks.policy,
+            data["obs"],
+            data["done"],
+            dict(data),
+            self.forward_step,
+        )
         self.networks.v.zero_grad()
-        loss_v, v = self.__compute_loss_v(deepcopy(data))
+        loss_v, v = self.__compute_loss_v(data, rollout)
         loss_v.backward()
         self.tb_info[tb_tags["loss_critic"]] = loss_v.item()
         self.tb_info[tb_tags["critic_avg_value"]] = v.item()
         update_list.append("v")
         self.networks.policy.zero_grad()
-        loss_policy = self.__compute_loss_policy(deepcopy(data))
+        loss_policy = self.__compute_loss_policy(rollout)
         loss_policy.backward()
         self.tb_info[tb_tags["loss_actor"]] = loss_policy.item()
         update_list.append("policy")
@@ -179,48 +189,24 @@ class SPIL(AlgorithmBase):
 
         return update_list
 
-    def __compute_loss_v(self, data: dict):
-        o, a, r, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["obs2"],
-            data["done"],
-        )
-        v = self.networks.v(o)
-        traj_issafe = torch.ones(o.shape[0], self.n_constraint)
-        info = data
+    def __compute_loss_v(self, data: dict, rollout: ModelRollout):
+        v = self.networks.v(data["obs"])
 
         with torch.no_grad():
-            for step in range(self.forward_step):
-                if step == 0:
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                    r_sum = self.reward_scale * r
-                    traj_issafe *= info["constraint"] <= 0
-
-                else:
-                    o = o2
-                    a = self.networks.policy(o)
-                    o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                    r_sum += self.reward_scale * self.gamma**step * r
-                    traj_issafe *= info["constraint"] <= 0
-
-            r_sum += self.gamma**self.forward_step * self.networks.v_target(o2)
+            traj_issafe = torch.ones(v.shape[0], self.n_constraint)
+            for info in rollout.infos:
+                traj_issafe *= info["constraint"] <= 0
+            r_sum = self.reward_scale * discounted_sum(
+                [r.detach() for r in rollout.rewards], self.gamma
+            )
+            r_sum += self.gamma**self.forward_step * self.networks.v_target(
+                rollout.obs.detach()
+            )
         loss_v = ((v - r_sum) ** 2).mean()
         self.safe_prob = traj_issafe.mean(0).numpy()
         return loss_v, torch.mean(v)
 
-    def __compute_loss_policy(self, data: dict):
-        o, a, r, c, o2, d = (
-            data["obs"],
-            data["act"],
-            data["rew"],
-            data["constraint"],
-            data["obs2"],
-            data["done"],
-        )
-
+    def __compute_loss_policy(self, rollout: ModelRollout):
         def Phi(y):
             # transfer constraint to cost
             m1 = 1
@@ -231,25 +217,10 @@ class SPIL(AlgorithmBase):
             )
             return sig
 
-        info = data
-        for step in range(self.forward_step):
-            if step == 0:
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                c = info["constraint"]
-                c = Phi(c)
-                r_sum = self.reward_scale * r
-                c_sum = c
-                c_mul = c
-            else:
-                o = o2
-                a = self.networks.policy(o)
-                o2, r, d, info = self.envmodel.forward(o, a, d, info)
-                c = info["constraint"]
-                c = Phi(c)
-                r_sum = r_sum + self.reward_scale * self.gamma**step * r
-                c_sum = c_sum + c
-                c_mul = c_mul * c
+        r_sum = self.reward_scale * discounted_sum(rollout.rewards, self.gamma)
+        c_mul = Phi(rollout.infos[0]["constraint"])
+        for info in rollout.infos[1:]:
+            c_mul = c_mul * Phi(info["constraint"])
         w_r, w_c = self.__spil_get_weight()
         loss_pi = (w_r * r_sum + (c_mul * torch.Tensor(w_c)).sum(1)).mean()
         return -loss_pi
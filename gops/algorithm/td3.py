@@ -24,37 +24,50 @@ from torch.optim import Adam
 from gops.algorithm.base import AlgorithmBase, ApprBase
 from gops.create_pkg.create_apprfunc import create_apprfunc
 from gops.utils.tensorboard_setup import tb_tags
-from gops.utils.common_utils import get_apprfunc_dict
+from gops.utils.common_utils import (
+    flat_grad,
+    get_apprfunc_dict,
+    polyak_update,
+    set_flat_grad,
+)
 
 
 class ApproxContainer(ApprBase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # create value network
+        # create value network, twin critics are fused for EnsembleActionValue
         q_args = get_apprfunc_dict("value", **kwargs)
-        self.q1 = create_apprfunc(**q_args)
-        self.q2 = create_apprfunc(**q_args)
+        self.fused_q = q_args["name"] == "EnsembleActionValue"
+        if self.fused_q:
+            q_args["ensemble_size"] = 2
+            self.q = create_apprfunc(**q_args)
+            self.q_target = deepcopy(self.q)
+            self.q_optimizers = [
+                Adam(self.q.parameters(), lr=kwargs["value_learning_rate"])
+            ]
+        else:
+            self.q1 = create_apprfunc(**q_args)
+            self.q2 = create_apprfunc(**q_args)
+            self.q1_target = deepcopy(self.q1)
+            self.q2_target = deepcopy(self.q2)
+            self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
+            self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
+            self.q_optimizers = [self.q1_optimizer, self.q2_optimizer]
 
         # create policy network
         policy_args = get_apprfunc_dict("policy", **kwargs)
         self.policy = create_apprfunc(**policy_args)
 
         #  create target networks
-        self.q1_target = deepcopy(self.q1)
-        self.q2_target = deepcopy(self.q2)
         self.policy_target = deepcopy(self.policy)
 
         # set target network gradients
-        for p in self.q1_target.parameters():
-            p.requires_grad = False
-        for p in self.q2_target.parameters():
+        for p in self.q_target_parameters():
             p.requires_grad = False
         for p in self.policy_target.parameters():
             p.requires_grad = False
 
         # set optimizers
-        self.q1_optimizer = Adam(self.q1.parameters(), lr=kwargs["value_learning_rate"])
-        self.q2_optimizer = Adam(self.q2.parameters(), lr=kwargs["value_learning_rate"])
         self.policy_optimizer = Adam(
             self.policy.parameters(), lr=kwargs["policy_learning_rate"]
         )
@@ -63,6 +76,33 @@ class ApproxContainer(ApprBase):
     def create_action_distributions(self, logits):
         return self.policy.get_act_dist(logits)
 
+    def q_values(self, obs, act):
+        if self.fused_q:
+            q = self.q(obs, act)
+            return q[0], q[1]
+        return self.q1(obs, act), self.q2(obs, act)
+
+    def q_target_values(self, obs, act):
+        if self.fused_q:
+            q = self.q_target(obs, act)
+            return q[0], q[1]
+        return self.q1_target(obs, act), self.q2_target(obs, act)
+
+    def q1_value(self, obs, act):
+        if self.fused_q:
+            return self.q(obs, act)[0]
+        return self.q1(obs, act)
+
+    def q_parameters(self) -> list:
+        if self.fused_q:
+            return list(self.q.parameters())
+        return list(self.q1.parameters()) + list(self.q2.parameters())
+
+    def q_target_parameters(self) -> list:
+        if self.fused_q:
+            return list(self.q_target.parameters())
+        return list(self.q1_target.parameters()) + list(self.q2_target.parameters())
+
 
 class TD3(AlgorithmBase):
     """
@@ -106,8 +146,8 @@ class TD3(AlgorithmBase):
     def __compute_gradient(self, data: dict, iteration):
         tb_info = dict()
         start_time = time.time()
-        self.networks.q1_optimizer.zero_grad()
-        self.networks.q2_optimizer.zero_grad()
+        for optimizer in self.networks.q_optimizers:
+            optimizer.zero_grad()
         self.networks.policy_optimizer.zero_grad()
 
         if not self.per_flag:
@@ -135,17 +175,13 @@ class TD3(AlgorithmBase):
             )
             loss_q.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = False
-        for p in self.networks.q2.parameters():
+        for p in self.networks.q_parameters():
             p.requires_grad = False
 
         loss_policy = self.__compute_loss_pi(o)
         loss_policy.backward()
 
-        for p in self.networks.q1.parameters():
-            p.requires_grad = True
-        for p in self.networks.q2.parameters():
+        for p in self.networks.q_parameters():
             p.requires_grad = True
 
         end_time = time.time()
@@ -160,8 +196,7 @@ class TD3(AlgorithmBase):
             return tb_info
 
     def __compute_loss_q(self, o, a, r, o2, d):
-        q1 = self.networks.q1(o, a)
-        q2 = self.networks.q2(o, a)
+        q1, q2 = self.networks.q_values(o, a)
 
         # Bellman backup for Q functions
         with torch.no_grad():
@@ -177,8 +212,7 @@ class TD3(AlgorithmBase):
             )
 
             # Target Q-values
-            q1_pi_targ = self.networks.q1_target(o2, a2)
-            q2_pi_targ = self.networks.q2_target(o2, a2)
+            q1_pi_targ, q2_pi_targ = self.networks.q_target_values(o2, a2)
             q_pi_targ = torch.min(q1_pi_targ, q2_pi_targ)
             backup = r + self.gamma * (1 - d) * q_pi_targ
 
@@ -190,8 +224,7 @@ class TD3(AlgorithmBase):
         return loss_q, loss_q1, loss_q2
 
     def __compute_loss_q_per(self, o, a, r, o2, d, idx, weight):
-        q1 = self.networks.q1(o, a)
-        q2 = self.networks.q2(o, a)
+        q1, q2 = self.networks.q_values(o, a)
 
         # Bellman backup for Q functions
         with torch.no_grad():
@@ -207,8 +240,7 @@ class TD3(AlgorithmBase):
             )
 
             # Target Q-values
-            q1_pi_targ = self.networks.q1_target(o2, a2)
-            q2_pi_targ = self.networks.q2_target(o2, a2)
+            q1_pi_targ, q2_pi_targ = self.networks.q_target_values(o2, a2)
             q_pi_targ = torch.min(q1_pi_targ, q2_pi_targ)
             backup = r + self.gamma * (1 - d) * q_pi_targ
 
@@ -221,34 +253,24 @@ class TD3(AlgorithmBase):
         return loss_q, loss_q1, loss_q2, abs_err
 
     def __compute_loss_pi(self, o):
-        q1_pi = self.networks.q1(o, self.networks.policy(o))
+        q1_pi = self.networks.q1_value(o, self.networks.policy(o))
         return -q1_pi.mean()
 
     def __update(self, iteration):
-        self.networks.q1_optimizer.step()
-        self.networks.q2_optimizer.step()
+        for optimizer in self.networks.q_optimizers:
+            optimizer.step()
 
         if iteration % self.delay_update == 0:
             self.networks.policy_optimizer.step()
 
-        with torch.no_grad():
-            polyak = 1 - self.tau
-            for p, p_targ in zip(
-                self.networks.q1.parameters(), self.networks.q1_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.q2.parameters(), self.networks.q2_target.parameters()
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
-            for p, p_targ in zip(
-                self.networks.policy.parameters(),
-                self.networks.policy_target.parameters(),
-            ):
-                p_targ.data.mul_(polyak)
-                p_targ.data.add_((1 - polyak) * p.data)
+        polyak_update(
+            self.networks.q_parameters(), self.networks.q_target_parameters(), self.tau
+        )
+        polyak_update(
+            self.networks.policy.parameters(),
+            self.networks.policy_target.parameters(),
+            self.tau,
+        )
 
     def local_update(self, data: dict, iteration: int):
         extra_info = self.__compute_gradient(data, iteration)
@@ -259,9 +281,7 @@ class TD3(AlgorithmBase):
         extra_info = self.__compute_gradient(data, iteration)
 
         update_info = {
-            "q1_grad": [p._grad for p in self.networks.q1.parameters()],
-            "q2_grad": [p._grad for p in self.networks.q2.parameters()],
-            "policy_grad": [p._grad for p in self.networks.policy.parameters()],
+            "grad": flat_grad(self.__trainable_parameters()),
             "iteration": iteration,
         }
 
@@ -269,15 +289,8 @@ class TD3(AlgorithmBase):
 
     def remote_update(self, update_info: dict):
         iteration = update_info["iteration"]
-        q1_grad = update_info["q1_grad"]
-        q2_grad = update_info["q2_grad"]
-        policy_grad = update_info["policy_grad"]
-
-        for p, grad in zip(self.networks.q1.parameters(), q1_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.q2.parameters(), q2_grad):
-            p._grad = grad
-        for p, grad in zip(self.networks.policy.parameters(), policy_grad):
-            p._grad = grad
-
+        set_flat_grad(self.__trainable_parameters(), update_info["grad"])
         self.__update(iteration)
+
+    def __trainable_parameters(self) -> list:
+        return self.networks.q_parameters() + list(self.networks.policy.parameters())
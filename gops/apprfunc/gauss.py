@@ -83,9 +83,11 @@ class FiniteHorizonPolicy(nn.Module, Action_Distribution):
         self.action_distribution_cls = kwargs["action_distribution_cls"]
 
     def forward(self, obs, virtual_t=1):
-        virtual_t = virtual_t * torch.ones(
-            size=[obs.shape[0], 1], dtype=torch.float32, device=obs.device
-        )
+        # virtual_t may be given as a preallocated [batch, 1] tensor
+        if not isinstance(virtual_t, torch.Tensor):
+            virtual_t = virtual_t * torch.ones(
+                size=[obs.shape[0], 1], dtype=torch.float32, device=obs.device
+            )
         expand_obs = torch.cat((obs, virtual_t), 1)
         action = (self.act_high_lim - self.act_low_lim) / 2 * torch.tanh(
             self.pi(expand_obs)
@@ -18,8 +18,10 @@ __all__ = [
     "FiniteHorizonFullPolicy",
     "StochaPolicy",
     "ActionValue",
+    "EnsembleActionValue",
     "ActionValueDis",
     "ActionValueDistri",
+    "EnsembleActionValueDistri",
     "StochaPolicyDis",
     "StateValue",
 ]
@@ -101,9 +103,11 @@ class FiniteHorizonPolicy(nn.Module, Action_Distribution):
         self.action_distribution_cls = kwargs["action_distribution_cls"]
 
     def forward(self, obs, virtual_t=1):
-        virtual_t = virtual_t * torch.ones(
-            size=[obs.shape[0], 1], dtype=torch.float32, device=obs.device
-        )
+        # virtual_t may be given as a preallocated [batch, 1] tensor
+        if not isinstance(virtual_t, torch.Tensor):
+            virtual_t = virtual_t * torch.ones(
+                size=[obs.shape[0], 1], dtype=torch.float32, device=obs.device
+            )
         expand_obs = torch.cat((obs, virtual_t), 1)
         action = (self.act_high_lim - self.act_low_lim) / 2 * torch.tanh(
             self.pi(expand_obs)
@@ -113,9 +117,11 @@ class FiniteHorizonPolicy(nn.Module, Action_Distribution):
 
 class FiniteHorizonFullPolicy(nn.Module, Action_Distribution):
     """
-    Approximated function of deterministic policy for finite-horizon.
-    Input: observation, time step.
-    Output: action.
+    Approximated function of deterministic policy for finite-horizon, which predicts
+    actions of all steps in the horizon at once.
+    Input: observation.
+    Output: action of the first step, acting in receding-horizon manner, or actions of
+    all steps by forward_all_policy.
     """
 
     def __init__(self, **kwargs):
@@ -136,7 +142,7 @@ class FiniteHorizonFullPolicy(nn.Module, Action_Distribution):
         self.action_distribution_cls = kwargs["action_distribution_cls"]
 
     def forward(self, obs):
-        return self.forward_all_policy(obs)[0, :]
+        return self.forward_all_policy(obs)[:, 0, :]
 
     def forward_all_policy(self, obs):
         actions = self.pi(obs).reshape(obs.shape[0], self.pre_horizon, self.act_dim)
@@ -245,6 +251,53 @@ class ActionValue(nn.Module, Action_Distribution):
         return torch.squeeze(q, -1)
 
 
+class EnsembleActionValue(nn.Module, Action_Distribution):
+    """
+    Approximated function of an ensemble of action-value functions, e.g. twin critics.
+    Weights of all members are stacked, so that each layer of the ensemble is evaluated
+    by a single batched matmul.
+    Input: observation, action.
+    Output: action-values of all members, with the member as the first dimension.
+    """
+
+    # number of outputs of each member
+    output_size = 1
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        obs_dim = kwargs["obs_dim"]
+        act_dim = kwargs["act_dim"]
+        hidden_sizes = kwargs["hidden_sizes"]
+        self.ensemble_size = kwargs.get("ensemble_size", 2)
+        sizes = [obs_dim + act_dim] + list(hidden_sizes) + [self.output_size]
+        self.weights = nn.ParameterList()
+        self.biases = nn.ParameterList()
+        for j in range(len(sizes) - 1):
+            # members are initialized as independent nn.Linear layers
+            layers = [nn.Linear(sizes[j], sizes[j + 1]) for _ in range(self.ensemble_size)]
+            self.weights.append(
+                nn.Parameter(torch.stack([l.weight.data.t() for l in layers]))
+            )
+            self.biases.append(
+                nn.Parameter(torch.stack([l.bias.data.unsqueeze(0) for l in layers]))
+            )
+        self.hidden_activation = get_activation_func(kwargs["hidden_activation"])()
+        self.output_activation = get_activation_func(kwargs["output_activation"])()
+        self.action_distribution_cls = kwargs["action_distribution_cls"]
+
+    def _members_forward(self, obs, act):
+        x = torch.cat([obs, act], dim=-1)
+        x = x.unsqueeze(0).expand(self.ensemble_size, *x.shape)
+        for j, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = torch.baddbmm(b, x, w)
+            if j < len(self.weights) - 1:
+                x = self.hidden_activation(x)
+        return self.output_activation(x)
+
+    def forward(self, obs, act):
+        return torch.squeeze(self._members_forward(obs, act), -1)
+
+
 class ActionValueDis(nn.Module, Action_Distribution):
     """
     Approximated function of action-value function for discrete action space.
@@ -296,6 +349,24 @@ class ActionValueDistri(nn.Module):
         return torch.cat((value_mean, value_log_std), dim=-1)
 
 
+class EnsembleActionValueDistri(EnsembleActionValue):
+    """
+    Approximated function of an ensemble of distributed action-value functions, e.g.
+    twin critics of DSAC-T, fused like EnsembleActionValue.
+    Input: observation, action.
+    Output: parameters of action-value distribution of all members, with the member
+    as the first dimension.
+    """
+
+    output_size = 2
+
+    def forward(self, obs, act):
+        logits = self._members_forward(obs, act)
+        value_mean, value_std = torch.chunk(logits, chunks=2, dim=-1)
+        value_log_std = torch.nn.functional.softplus(value_std)
+        return torch.cat((value_mean, value_log_std), dim=-1)
+
+
 class StochaPolicyDis(ActionValueDis, Action_Distribution):
     """
     Approximated function of stochastic policy for discrete action space.
@@ -72,8 +72,13 @@ def create_buffer(**kwargs) -> object:
     trainer_name = _kwargs.get("trainer", None)
     if trainer_name is None or trainer_name.startswith("on"):
         buf = None
-    elif trainer_name.startswith("off_serial"):
+    elif trainer_name.startswith("off_serial") or trainer_name.startswith("off_dist"):
         buf = buffer_creator(**_kwargs)
+    elif buffer_name == "shared_replay_buffer" and (
+        trainer_name.startswith("off_async") or trainer_name.startswith("off_sync")
+    ):
+        # storage lives in shared memory owned by the driver, samplers and algorithms attach to it
+        buf = [buffer_creator(**_kwargs)]
     elif trainer_name.startswith("off_async") or trainer_name.startswith("off_sync"):
         import ray
 
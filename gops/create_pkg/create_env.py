@@ -17,11 +17,15 @@ from typing import Callable, Dict, Optional, Union
 import gym
 import numpy as np
 from gym.wrappers.time_limit import TimeLimit
+from gops.create_pkg.create_env_model import create_env_model
 from gops.create_pkg.create_env_model import register as register_env_model
 from gops.env.vector.sync_vector_env import SyncVectorEnv
 from gops.env.vector.async_vector_env import AsyncVectorEnv
+from gops.env.vector.batched_async_vector_env import BatchedAsyncVectorEnv
+from gops.env.vector.model_vector_env import ModelVectorEnv
 from gops.env.wrapper.action_repeat import ActionRepeatData
 from gops.env.wrapper.convert_type import ConvertType
+from gops.env.wrapper.fused_data import FusedData, FusedGymnasiumData
 from gops.env.wrapper.gym2gymnasium import Gym2Gymnasium
 from gops.env.wrapper.noise_observation import NoiseData
 from gops.env.wrapper.reset_info import ResetInfoData
@@ -102,6 +106,8 @@ def create_env(
     *,
     vector_env_num: Optional[int] = None,
     vector_env_type: Optional[str] = None,
+    num_workers: Optional[int] = None,
+    envs_per_worker: Optional[int] = None,
     max_episode_steps: Optional[int] = None,
     reward_shift: Optional[float] = None,
     reward_scale: Optional[float] = None,
@@ -115,6 +121,8 @@ def create_env(
     min_action: Union[float, int, np.ndarray, list] = -1.0,
     max_action: Union[float, int, np.ndarray, list] = 1.0,
     gym2gymnasium: bool = False,
+    fused_wrapper: bool = False,
+    raw_info: bool = False,
     **kwargs,
 ) -> object:
     """Automatically wrap data type environment according to input arguments. Wrapper will not be used
@@ -135,6 +143,16 @@ def create_env(
     :param bool action_scale: parameter for scale action wrapper, default to True.
     :param Union[float, int, np.ndarray, list] min_action: minimum action after scaling.
     :param Union[float, int, np.ndarray, list] max_action: maximum action after scaling.
+    :param bool fused_wrapper: wrap with FusedData, which does what all wrappers above do in
+        one step call, with affine transforms folded into one scale and shift each.
+    :param bool raw_info: with fused_wrapper, also write "raw_obs", "raw_action" and "raw_reward"
+        into info, which the wrapper chain always does.
+    :param Optional[str] vector_env_type: "sync", "async", "batched_async" or "model", where
+        "batched_async" runs envs_per_worker envs in each of num_workers processes and "model"
+        steps all vector envs in the batched env model of env_id with the same wrappers.
+    :param Optional[int] num_workers: number of worker processes of "batched_async".
+    :param Optional[int] envs_per_worker: number of envs per worker process of "batched_async",
+        vector_env_num defaults to num_workers * envs_per_worker.
     :return: wrapped data type environment.
     """
     spec_ = registry.get(env_id)
@@ -154,6 +172,25 @@ def create_env(
     def env_fn():
         env = env_creator(**_kwargs)
 
+        if fused_wrapper:
+            fused_cls = FusedGymnasiumData if gym2gymnasium else FusedData
+            return fused_cls(
+                env,
+                max_episode_steps=max_episode_steps,
+                repeat_num=repeat_num,
+                sum_reward=sum_reward,
+                reward_shift=reward_shift,
+                reward_scale=reward_scale,
+                obs_noise_type=obs_noise_type,
+                obs_noise_data=obs_noise_data,
+                obs_shift=obs_shift,
+                obs_scale=obs_scale,
+                action_scale=action_scale,
+                min_action=min_action,
+                max_action=max_action,
+                raw_info=raw_info,
+            )
+
         env = ResetInfoData(env)
 
         _max_episode_steps = None
@@ -192,6 +229,11 @@ def create_env(
 
         return env
 
+    if vector_env_num is None and vector_env_type == "batched_async":
+        if num_workers is None or envs_per_worker is None:
+            raise ValueError("batched_async needs vector_env_num, or num_workers and envs_per_worker!")
+        vector_env_num = num_workers * envs_per_worker
+
     if vector_env_num is None:
         env = env_fn()
     else:
@@ -200,6 +242,37 @@ def create_env(
             env = SyncVectorEnv(env_fns)
         elif vector_env_type == "async":
             env = AsyncVectorEnv(env_fns)
+        elif vector_env_type == "batched_async":
+            if envs_per_worker is not None:
+                _num_workers = -(-vector_env_num // envs_per_worker)
+                if num_workers is not None and num_workers != _num_workers:
+                    raise ValueError(
+                        f"{vector_env_num} envs do not fit in {num_workers} workers "
+                        f"of {envs_per_worker} envs!"
+                    )
+                num_workers = _num_workers
+            env = BatchedAsyncVectorEnv(env_fns, num_workers)
+        elif vector_env_type == "model":
+            if obs_noise_type is not None:
+                raise ValueError("Observation noise is not supported by model vector env!")
+
+            def model_fn():
+                return create_env_model(
+                    env_id,
+                    reward_shift=reward_shift,
+                    reward_scale=reward_scale,
+                    obs_shift=obs_shift,
+                    obs_scale=obs_scale,
+                    clip_obs=False,
+                    repeat_num=repeat_num,
+                    sum_reward=sum_reward,
+                    action_scale=action_scale,
+                    min_action=min_action,
+                    max_action=max_action,
+                    **dict(_kwargs, use_gpu=_kwargs.get("use_gpu", False)),
+                )
+
+            env = ModelVectorEnv(env_fn, model_fn, vector_env_num, max_episode_steps)
         else:
             raise ValueError(f"Invalid vector_env_type {vector_env_type}!")
 
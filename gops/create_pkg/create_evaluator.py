@@ -13,7 +13,7 @@
 from dataclasses import dataclass, field
 from typing import Callable, Dict, Union
 
-import ray
+from gops.utils.execution_backend import create_actor
 
 
 @dataclass
@@ -58,4 +58,7 @@ def create_evaluator(evaluator_name: str, **kwargs) -> object:
     else:
         raise RuntimeError(f"{spec_.evaluator_name} registered but entry_point is not specified")
 
-    return ray.remote(num_cpus=1)(evaluator_creator).remote(**_kwargs)
+    # Ray actor, or with a local execution backend a worker thread or subprocess
+    return create_actor(
+        evaluator_creator, _kwargs.get("execution_backend", "ray"), **_kwargs
+    )
@@ -41,14 +41,17 @@ def register(
     registry[new_spec.trainer] = new_spec
 
 
-# register trainer
+# register trainer, modules are imported on creation, so that serial trainers do
+# not import ray through the parallel ones
 trainer_file_list = os.listdir(trainer_path)
 
 for trainer_file in trainer_file_list:
     if trainer_file.endswith("trainer.py"):
         trainer_name = trainer_file[:-3]
-        mdl = importlib.import_module("gops.trainer." + trainer_name)
-        register(trainer=trainer_name, entry_point=getattr(mdl, underline2camel(trainer_name)))
+        register(
+            trainer=trainer_name,
+            entry_point="gops.trainer.{}:{}".format(trainer_name, underline2camel(trainer_name)),
+        )
 
 
 def create_trainer(alg, sampler, buffer, evaluator, **kwargs,) -> object:
@@ -58,7 +61,10 @@ def create_trainer(alg, sampler, buffer, evaluator, **kwargs,) -> object:
     if spec_ is None:
         raise KeyError(f"No registered trainer with id: {trainer_name}")
 
-    if callable(spec_.entry_point):
+    if isinstance(spec_.entry_point, str):
+        module_name, cls_name = spec_.entry_point.split(":")
+        trainer_creator = getattr(importlib.import_module(module_name), cls_name)
+    elif callable(spec_.entry_point):
         trainer_creator = spec_.entry_point
     else:
         raise RuntimeError(f"{spec_.trainer} registered but entry_point is not specified")
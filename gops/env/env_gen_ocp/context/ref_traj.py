@@ -13,14 +13,22 @@ class RefTrajContext(Context):
         dt: float = 0.1,
         path_param: Optional[Dict[str, Dict]] = None,
         speed_param: Optional[Dict[str, Dict]] = None,
+        ref_table_time: Optional[float] = None,
+        ref_table_resolution: int = 10,
+        ref_table_dir: Optional[str] = None,
     ):
         self.ref_traj = MultiRefTrajData(
             path_param=path_param,
             speed_param=speed_param,
+            table_time=ref_table_time,
+            table_resolution=ref_table_resolution,
+            table_dir=ref_table_dir,
         )
         self.pre_horizon = pre_horizon
         self.dt = dt
         self.state = None
+        if ref_table_time is not None:
+            self.ref_traj.build_tables(dt)
 
     def reset(
         self,
@@ -29,22 +37,9 @@ class RefTrajContext(Context):
         path_num: int,
         speed_num: int,
     ) -> ContextState[np.ndarray]:
-        ref_points = []
-        for i in range(2 * self.pre_horizon + 1):
-            ref_x = self.ref_traj.compute_x(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_y = self.ref_traj.compute_y(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_phi = self.ref_traj.compute_phi(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_u = self.ref_traj.compute_u(
-                ref_time + i * self.dt, path_num, speed_num
-            )
-            ref_points.append([ref_x, ref_y, ref_phi, ref_u])
-        ref_points = np.array(ref_points, dtype=np.float32)
+        ref_points = self.ref_traj.compute_ref_points(
+            ref_time, path_num, speed_num, self.dt, 2 * self.pre_horizon + 1
+        )
 
         self.state = ContextState(reference=ref_points)
         self.ref_time = ref_time
@@ -55,24 +50,10 @@ class RefTrajContext(Context):
     def step(self) -> ContextState[np.ndarray]:
         self.ref_time = self.ref_time + self.dt
 
-        new_ref_point = np.array([
-            self.ref_traj.compute_x(
-                self.ref_time + 2 * self.pre_horizon * self.dt, 
-                self.path_num, self.speed_num
-            ),
-            self.ref_traj.compute_y(
-                self.ref_time + 2 * self.pre_horizon * self.dt, 
-                self.path_num, self.speed_num
-            ),
-            self.ref_traj.compute_phi(
-                self.ref_time + 2 * self.pre_horizon * self.dt, 
-                self.path_num, self.speed_num
-            ),
-            self.ref_traj.compute_u(
-                self.ref_time + 2 * self.pre_horizon * self.dt, 
-                self.path_num, self.speed_num
-            ),
-        ], dtype=np.float32)
+        new_ref_point = self.ref_traj.compute_ref_points(
+            self.ref_time + 2 * self.pre_horizon * self.dt,
+            self.path_num, self.speed_num, self.dt, 1
+        )[0]
         ref_points = self.state.reference.copy()
         ref_points[:-1] = ref_points[1:]
         ref_points[-1] = new_ref_point
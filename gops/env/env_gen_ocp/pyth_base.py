@@ -1,7 +1,6 @@
 from abc import abstractmethod, ABCMeta
 from dataclasses import dataclass, fields
 from typing import Dict, Generic, Optional, Sequence, Tuple, TypeVar, Union
-from copy import deepcopy
 
 import gym
 from gym import spaces
@@ -10,67 +9,63 @@ import torch
 
 stateType = TypeVar('stateType', np.ndarray, torch.Tensor)
 
+# dataclass -> names of its fields, cached instead of reflected by fields() on every call
+_field_names: Dict[type, Tuple[str, ...]] = {}
+
+
+def field_names(obj) -> Tuple[str, ...]:
+    cls = obj if isinstance(obj, type) else type(obj)
+    names = _field_names.get(cls)
+    if names is None:
+        names = _field_names[cls] = tuple(f.name for f in fields(cls))
+    return names
+
+
 @dataclass
 class ContextState(Generic[stateType]):
     reference: stateType
     constraint: Optional[stateType] = None
     t: Union[int, stateType] = 0
 
-    def array2tensor(self) -> 'ContextState[torch.Tensor]':
+    def _map(self, fn, types) -> 'ContextState':
+        # new ContextState with fn applied to the fields of the given types
         value = []
-        for field in fields(self):
-            v = getattr(self, field.name)
-            if isinstance(v, np.ndarray):
-                value.append(torch.from_numpy(v))
-            else:
-                value.append(v)
+        for name in field_names(self):
+            v = getattr(self, name)
+            value.append(fn(v) if isinstance(v, types) else v)
         return self.__class__(*value)
 
+    def array2tensor(self) -> 'ContextState[torch.Tensor]':
+        return self._map(torch.from_numpy, np.ndarray)
+
     def tensor2array(self) -> 'ContextState[np.ndarray]':
-        value = []
-        for field in fields(self):
-            v = getattr(self, field.name)
-            if isinstance(v, torch.Tensor):
-                value.append(v.numpy())
-            else:
-                value.append(v)
-        return self.__class__(*value)
+        return self._map(lambda v: v.numpy(), torch.Tensor)
 
     def cuda(self) -> 'ContextState[torch.Tensor]':
-        value = []
-        for field in fields(self):
-            v = getattr(self, field.name)
-            if isinstance(v, torch.Tensor):
-                value.append(v.cuda())
-            else:
-                value.append(v)
-        return self.__class__(*value)
+        return self._map(lambda v: v.cuda(), torch.Tensor)
+
+    def snapshot(self) -> 'ContextState[stateType]':
+        """Shallow copy sharing the arrays, see Env._get_info."""
+        return self.__class__(*[getattr(self, name) for name in field_names(self)])
 
     def  __getitem__(self, index):
         try:
-            value = []
-            for field in fields(self):
-                v = getattr(self, field.name)
-                if isinstance(v, (np.ndarray, torch.Tensor)):
-                    value.append(v[index])
-                else:
-                    value.append(v)
-            return self.__class__(*value)
+            return self._map(lambda v: v[index], (np.ndarray, torch.Tensor))
         except IndexError: "ContextState cannot be indexed or index out of range!"
 
     def __setitem__(self, index, value):
         try:
-            for field in fields(self):
-                v = getattr(self, field.name)
+            for name in field_names(self):
+                v = getattr(self, name)
                 if isinstance(v, (np.ndarray, torch.Tensor)):
-                    v[index] = getattr(value, field.name)
+                    v[index] = getattr(value, name)
         except IndexError: "ContextState cannot be indexed or index out of range!"
     
     def index_by_t(self) -> 'ContextState[stateType]':
         value = []
-        for field in fields(self):
-            v = getattr(self, field.name)
-            if field.name == "t":
+        for name in field_names(self):
+            v = getattr(self, name)
+            if name == "t":
                 value.append(0)
             elif isinstance(v, (np.ndarray, torch.Tensor)):
                 value.append(v[np.arange(v.shape[0]), self.t])
@@ -100,6 +95,10 @@ class State(Generic[stateType]):
         context_state = self.context_state.cuda()
         return self.__class__(robot_state, context_state)
 
+    def snapshot(self) -> 'State[stateType]':
+        """Shallow copy sharing the arrays, see Env._get_info."""
+        return self.__class__(self.robot_state, self.context_state.snapshot())
+
     @classmethod
     def stack(cls, states: Sequence['State[stateType]'], dim: int = 0) -> 'State[stateType]':
         robot_states = stack([state.robot_state for state in states], dim)
@@ -139,6 +138,7 @@ class State(Generic[stateType]):
 
 
 class Robot(metaclass=ABCMeta):
+    # replaced, not written into, on reset and step
     state: np.ndarray
     state_space: spaces.Box
     action_space: spaces.Box
@@ -157,6 +157,7 @@ class Robot(metaclass=ABCMeta):
 
 # TODO: Static constraint value
 class Context(metaclass=ABCMeta):
+    # arrays of state are replaced, not written into, on reset and step
     state: ContextState[np.ndarray]
     
     @abstractmethod
@@ -184,7 +185,9 @@ class Env(gym.Env, metaclass=ABCMeta):
         return self._get_obs(), reward, terminated, self._get_info()
 
     def _get_info(self) -> dict:
-        info = {'state': deepcopy(self._state)}
+        # Robots and contexts replace state arrays on step instead of writing into them,
+        # so a snapshot sharing the arrays stays unchanged without copying them.
+        info = {'state': self._state.snapshot()}
         try:
             info['cost'] = self._get_constraint()
         except NotImplementedError:
@@ -263,8 +266,8 @@ def concat(x: Sequence[Union[np.ndarray, torch.Tensor]], dim: int = 0) -> Union[
 
 def batch_context_state(context_state: 'ContextState[stateType]', batch_size: int) -> 'ContextState[stateType]':
     values = []
-    for field in fields(context_state):
-        v = getattr(context_state, field.name)
+    for name in field_names(context_state):
+        v = getattr(context_state, name)
         if isinstance(v, (np.ndarray, torch.Tensor)):
             values.append(batch(v, batch_size))
         else:
@@ -274,10 +277,10 @@ def batch_context_state(context_state: 'ContextState[stateType]', batch_size: in
 
 def stack_context_state(context_states: Sequence['ContextState[stateType]'], dim: int = 0) -> 'ContextState[stateType]':
     values = []
-    for field in fields(context_states[0]):
-        v = getattr(context_states[0], field.name)
+    for name in field_names(context_states[0]):
+        v = getattr(context_states[0], name)
         if isinstance(v, (np.ndarray, torch.Tensor)):
-            value_seq = [getattr(e, field.name) for e in context_states]
+            value_seq = [getattr(e, name) for e in context_states]
             values.append(stack(value_seq, dim))
         else:
             values.append(v)
@@ -286,10 +289,10 @@ def stack_context_state(context_states: Sequence['ContextState[stateType]'], dim
 
 def concat_context_state(context_states: Sequence['ContextState[stateType]'], dim: int = 0) -> 'ContextState[stateType]':
     values = []
-    for field in fields(context_states[0]):
-        v = getattr(context_states[0], field.name)
+    for name in field_names(context_states[0]):
+        v = getattr(context_states[0], name)
         if isinstance(v, (np.ndarray, torch.Tensor)):
-            value_seq = [getattr(e, field.name) for e in context_states]
+            value_seq = [getattr(e, name) for e in context_states]
             values.append(concat(value_seq, dim))
         else:
             values.append(v)
@@ -33,6 +33,9 @@ class Veh3DoFTracking(Env):
             dt=dt,
             path_param=path_para,
             speed_param=u_para,
+            ref_table_time=kwargs.get("ref_table_time", None),
+            ref_table_resolution=kwargs.get("ref_table_resolution", 10),
+            ref_table_dir=kwargs.get("ref_table_dir", None),
         )
 
         self.state_dim = 6
@@ -115,17 +115,10 @@ class Veh2dofcontiModel(PythBaseModel):
 
         next_ref_points = ref_points.clone()
         next_ref_points[:, :-1] = ref_points[:, 1:]
-        new_ref_point = torch.stack(
-            (
-                self.ref_traj.compute_y(
-                    next_t + self.pre_horizon * self.dt, path_num, u_num
-                ),
-                self.ref_traj.compute_phi(
-                    next_t + self.pre_horizon * self.dt, path_num, u_num
-                ),
-            ),
-            dim=1,
+        _, ref_y, ref_phi, _ = self.ref_traj.compute_all(
+            next_t + self.pre_horizon * self.dt, path_num, u_num
         )
+        new_ref_point = torch.stack((ref_y, ref_phi), dim=1)
         next_ref_points[:, -1] = new_ref_point
 
         ego_obs = torch.concat(
@@ -95,19 +95,8 @@ class Veh3dofcontiSurrCstrPenaltyModel(Veh3dofcontiModel):
         next_ref_points = ref_points.clone()
         next_ref_points[:, :-1] = ref_points[:, 1:]
         new_ref_point = torch.stack(
-            (
-                self.ref_traj.compute_x(
-                    next_t + self.pre_horizon * self.dt, path_num, u_num
-                ),
-                self.ref_traj.compute_y(
-                    next_t + self.pre_horizon * self.dt, path_num, u_num
-                ),
-                self.ref_traj.compute_phi(
-                    next_t + self.pre_horizon * self.dt, path_num, u_num
-                ),
-                self.ref_traj.compute_u(
-                    next_t + self.pre_horizon * self.dt, path_num, u_num
-                ),
+            self.ref_traj.compute_all(
+                next_t + self.pre_horizon * self.dt, path_num, u_num
             ),
             dim=1,
         )
@@ -73,6 +73,25 @@ class PythBaseEnv(gym.Env):
             )
         return state
 
+    def sample_initial_states(self, num, np_random=None):
+        # batch of num states sampled like sample_initial_state, e.g. for vector envs
+        if np_random is None:
+            np_random = self.np_random
+        size = (num,) + self.init_space[0].shape
+        if self.initial_distribution == "uniform":
+            states = np_random.uniform(
+                low=self.init_space[0], high=self.init_space[1], size=size
+            )
+        elif self.initial_distribution == "normal":
+            mean = (self.init_space[0] + self.init_space[1]) / 2
+            std = (self.init_space[1] - self.init_space[0]) / 6
+            states = np_random.normal(loc=mean, scale=std, size=size)
+        else:
+            raise ValueError(
+                f"Invalid initial distribution: {self.initial_distribution}!"
+            )
+        return states
+
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
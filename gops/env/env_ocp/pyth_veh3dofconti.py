@@ -85,6 +85,9 @@ class SimuVeh3dofconti(PythBaseEnv):
         **kwargs,
     ):
         work_space = kwargs.pop("work_space", None)
+        ref_table_time = kwargs.pop("ref_table_time", None)
+        ref_table_resolution = kwargs.pop("ref_table_resolution", 10)
+        ref_table_dir = kwargs.pop("ref_table_dir", None)
         if work_space is None:
             # initial range of [delta_x, delta_y, delta_phi, delta_u, v, w]
             init_high = np.array([2, 1, np.pi / 6, 2, 0.1, 0.1], dtype=np.float32)
@@ -93,7 +96,9 @@ class SimuVeh3dofconti(PythBaseEnv):
         super(SimuVeh3dofconti, self).__init__(work_space=work_space, **kwargs)
 
         self.vehicle_dynamics = VehicleDynamicsData()
-        self.ref_traj = MultiRefTrajData(path_para, u_para)
+        self.ref_traj = MultiRefTrajData(
+            path_para, u_para, ref_table_time, ref_table_resolution, ref_table_dir
+        )
 
         self.state_dim = 6
         self.pre_horizon = pre_horizon
@@ -110,6 +115,8 @@ class SimuVeh3dofconti(PythBaseEnv):
             dtype=np.float32,
         )
         self.dt = 0.1
+        if ref_table_time is not None:
+            self.ref_traj.build_tables(self.dt)
         self.max_episode_steps = 200
 
         self.state = None
@@ -164,22 +171,9 @@ class SimuVeh3dofconti(PythBaseEnv):
         else:
             self.u_num = self.np_random.choice([0, 1])
 
-        ref_points = []
-        for i in range(self.pre_horizon + 1):
-            ref_x = self.ref_traj.compute_x(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_y = self.ref_traj.compute_y(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_phi = self.ref_traj.compute_phi(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_u = self.ref_traj.compute_u(
-                self.t + i * self.dt, self.path_num, self.u_num
-            )
-            ref_points.append([ref_x, ref_y, ref_phi, ref_u])
-        self.ref_points = np.array(ref_points, dtype=np.float32)
+        self.ref_points = self.ref_traj.compute_ref_points(
+            self.t, self.path_num, self.u_num, self.dt, self.pre_horizon + 1
+        )
 
         if init_state is not None:
             delta_state = np.array(init_state, dtype=np.float32)
@@ -201,23 +195,9 @@ class SimuVeh3dofconti(PythBaseEnv):
         self.t = self.t + self.dt
 
         self.ref_points[:-1] = self.ref_points[1:]
-        new_ref_point = np.array(
-            [
-                self.ref_traj.compute_x(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_y(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_phi(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-                self.ref_traj.compute_u(
-                    self.t + self.pre_horizon * self.dt, self.path_num, self.u_num
-                ),
-            ],
-            dtype=np.float32,
-        )
+        new_ref_point = self.ref_traj.compute_ref_points(
+            self.t + self.pre_horizon * self.dt, self.path_num, self.u_num, self.dt, 1
+        )[0]
         self.ref_points[-1] = new_ref_point
 
         self.done = self.judge_done()
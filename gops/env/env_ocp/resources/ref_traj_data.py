@@ -9,6 +9,9 @@
 #  Description: reference trajectory for data environment
 #  Update: 2022-11-16, Yujie Yang: create reference trajectory
 
+import hashlib
+import math
+import os
 from abc import ABCMeta, abstractmethod
 from copy import deepcopy
 from dataclasses import dataclass
@@ -37,11 +40,39 @@ DEFAULT_SPEED_PARAM = {
 }
 
 
+# reference tables by content, shared by all envs of a process and its forked workers
+_REF_TABLES: Dict[str, np.ndarray] = {}
+
+
 class MultiRefTrajData:
+    """
+    Reference trajectories of data environments, given by path_num and speed_num.
+
+    Reference points can optionally be looked up in precomputed tables, one per
+    (path_num, speed_num, dt), which hold x, y, phi and u at table_resolution points
+    per dt over the time span [0, table_time]. Points are linearly interpolated
+    between table rows, so computing the reference points of a horizon costs the
+    same for any horizon length. At the corners of piecewise linear paths, phi is
+    thereby smoothed over one table row. Points outside the table are computed directly.
+    Tables are cached per process and, with table_dir, saved as .npy files that are
+    memory-mapped read-only, so all vector env workers share one copy.
+
+    Args:
+        path_param (dict, optional): parameters updating DEFAULT_PATH_PARAM.
+        speed_param (dict, optional): parameters updating DEFAULT_SPEED_PARAM.
+        table_time (float, optional): time span of reference tables, no tables are
+                                      used if None. Defaults to None.
+        table_resolution (int, optional): table rows per dt. Defaults to 10.
+        table_dir (str, optional): folder of memory-mapped table files. Defaults to None.
+    """
+
     def __init__(
         self,
         path_param: Optional[Dict[str, Dict]] = None,
         speed_param: Optional[Dict[str, Dict]] = None,
+        table_time: Optional[float] = None,
+        table_resolution: int = 10,
+        table_dir: Optional[str] = None,
     ):
         self.path_param = deepcopy(DEFAULT_PATH_PARAM)
         if path_param is not None:
@@ -66,6 +97,11 @@ class MultiRefTrajData:
             TriangleRefTrajData(ref_speeds, **self.path_param["straight_lane"]),
         ]
 
+        self.table_time = table_time
+        self.table_resolution = table_resolution
+        self.table_dir = table_dir
+        self.tables = {}
+
     def compute_x(self, t: float, path_num: int, speed_num: int) -> float:
         return self.ref_trajs[path_num].compute_x(t, speed_num)
 
@@ -78,6 +114,95 @@ class MultiRefTrajData:
     def compute_phi(self, t: float, path_num: int, speed_num: int) -> float:
         return self.ref_trajs[path_num].compute_phi(t, speed_num)
 
+    def compute_all(self, t: np.ndarray, path_num: int, speed_num: int) -> np.ndarray:
+        """Reference points [x, y, phi, u] at times t, in a [len(t), 4] array."""
+        ref_traj = self.ref_trajs[path_num]
+        return np.stack(
+            [
+                ref_traj.compute_x(t, speed_num),
+                ref_traj.compute_y(t, speed_num),
+                ref_traj.compute_phi(t, speed_num),
+                np.broadcast_to(ref_traj.compute_u(t, speed_num), t.shape),
+            ],
+            axis=1,
+        )
+
+    def compute_ref_points(
+        self, t: float, path_num: int, speed_num: int, dt: float, num: int
+    ) -> np.ndarray:
+        """Reference points [x, y, phi, u] at times t + i * dt for i in range(num)."""
+        if self.table_time is not None:
+            table = self.get_table(path_num, speed_num, dt)
+            pos = t * self.table_resolution / dt
+            row = math.floor(pos)
+            last_row = row + (num - 1) * self.table_resolution + 1
+            if row >= 0 and last_row < len(table):
+                lower = table[row:last_row:self.table_resolution]
+                upper = table[row + 1:last_row + 1:self.table_resolution]
+                points = (lower + (pos - row) * (upper - lower)).astype(np.float32)
+                points[:, 2] = np.remainder(points[:, 2] + np.pi, 2 * np.pi) - np.pi
+                return points
+        if num == 1:
+            # a single point is evaluated faster on floats than on arrays
+            return np.array(
+                [[
+                    self.compute_x(t, path_num, speed_num),
+                    self.compute_y(t, path_num, speed_num),
+                    self.compute_phi(t, path_num, speed_num),
+                    self.compute_u(t, path_num, speed_num),
+                ]],
+                dtype=np.float32,
+            )
+        times = t + np.arange(num) * dt
+        return self.compute_all(times, path_num, speed_num).astype(np.float32)
+
+    def get_table(self, path_num: int, speed_num: int, dt: float) -> np.ndarray:
+        """Reference table of (path_num, speed_num, dt), built on first use."""
+        table = self.tables.get((path_num, speed_num, dt))
+        if table is None:
+            table = self._load_table(path_num, speed_num, dt)
+            self.tables[(path_num, speed_num, dt)] = table
+        return table
+
+    def _load_table(self, path_num: int, speed_num: int, dt: float) -> np.ndarray:
+        size = int(np.ceil(self.table_time / dt * self.table_resolution)) + 1
+        key = repr(
+            (self.path_param, self.speed_param, path_num, speed_num, dt,
+             size, self.table_resolution)
+        )
+        key = hashlib.md5(key.encode()).hexdigest()
+        table = _REF_TABLES.get(key)
+        if table is not None:
+            return table
+        path = None
+        if self.table_dir is not None:
+            path = os.path.join(self.table_dir, "ref_table_" + key + ".npy")
+        if path is not None and os.path.exists(path):
+            table = np.load(path, mmap_mode="r")
+        else:
+            table = self.compute_all(
+                np.arange(size) * (dt / self.table_resolution), path_num, speed_num
+            )
+            # phi is interpolated continuously across +-pi
+            table[:, 2] = np.unwrap(table[:, 2])
+            if path is not None:
+                os.makedirs(self.table_dir, exist_ok=True)
+                tmp_path = path + ".{}.tmp".format(os.getpid())
+                with open(tmp_path, "wb") as f:
+                    np.save(f, table)
+                os.replace(tmp_path, path)
+                table = np.load(path, mmap_mode="r")
+            else:
+                table.setflags(write=False)
+        _REF_TABLES[key] = table
+        return table
+
+    def build_tables(self, dt: float) -> None:
+        """Build the tables of all references for dt, e.g. before forking workers."""
+        for path_num, ref_traj in enumerate(self.ref_trajs):
+            for speed_num in range(len(ref_traj.ref_speeds)):
+                self.get_table(path_num, speed_num, dt)
+
 
 class RefSpeedData(metaclass=ABCMeta):
     @abstractmethod
@@ -166,6 +291,10 @@ class DoubleLaneRefTrajData(RefTrajData):
         return self.ref_speeds[speed_num].compute_integrate_u(t)
 
     def compute_y(self, t: float, speed_num: int) -> float:
+        if isinstance(t, np.ndarray):
+            return np.interp(
+                t, [self.t1, self.t2, self.t3, self.t4], [self.y1, self.y2, self.y2, self.y1]
+            )
         if t <= self.t1:
             y = self.y1
         elif t <= self.t2:
@@ -191,6 +320,8 @@ class TriangleRefTrajData(RefTrajData):
 
     def compute_y(self, t: float, speed_num: int) -> float:
         s = t % self.T
+        if isinstance(t, np.ndarray):
+            return np.interp(s, [0.0, self.T / 2, self.T], [0.0, self.A, 0.0])
         if s <= self.T / 2:
             y = 2 * self.A / self.T * s
         else:
@@ -12,7 +12,7 @@
 from abc import ABCMeta, abstractmethod
 from copy import deepcopy
 from dataclasses import dataclass
-from typing import Dict, Optional, Sequence
+from typing import Callable, Dict, Optional, Sequence, Tuple
 
 import numpy as np
 import torch
@@ -83,6 +83,51 @@ class MultiRefTrajModel:
             phi = phi + (path_num == i) * ref_traj.compute_phi(t, speed_num)
         return phi
 
+    def compute_all(
+        self, t: torch.Tensor, path_num: torch.Tensor, speed_num: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Compute x, y, phi and u of reference points at once, where every path is only
+        evaluated on the rows that follow it.
+
+        t may be of shape [batch] or a time grid of shape [batch, horizon], path_num and
+        speed_num are of shape [batch] or the same shape as t.
+        """
+        path_num = _expand_as(path_num, t).reshape(-1)
+        speed_num = _expand_as(speed_num, t).reshape(-1)
+        flat_t = t.reshape(-1)
+        x, y, phi, u = (torch.zeros_like(flat_t) for _ in range(4))
+        for i, ref_traj in enumerate(self.ref_trajs):
+            xi, yi, phii, ui = _apply_on_rows(
+                path_num == i, ref_traj.compute_all, flat_t, speed_num
+            )
+            x, y, phi, u = x + xi, y + yi, phi + phii, u + ui
+        return tuple(v.reshape(t.shape) for v in (x, y, phi, u))
+
+
+def _expand_as(index: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+    index = index.reshape(index.shape + (1,) * (t.dim() - index.dim()))
+    return index.expand(t.shape)
+
+
+def _is_compiling() -> bool:
+    compiler = getattr(torch, "compiler", None)
+    return compiler is not None and hasattr(compiler, "is_compiling") and compiler.is_compiling()
+
+
+def _apply_on_rows(mask: torch.Tensor, fn: Callable, *inputs: torch.Tensor) -> tuple:
+    """
+    Evaluate fn only on the elements of inputs selected by mask, outputs are zeros
+    elsewhere. Inside torch.compile, fn is evaluated on all elements and masked instead,
+    which keeps the graph free of data-dependent shapes.
+    """
+    if _is_compiling():
+        outputs = fn(*inputs)
+        return tuple(torch.where(mask, v, torch.zeros_like(v)) for v in outputs)
+    rows = torch.nonzero(mask, as_tuple=True)
+    outputs = fn(*(v[rows] for v in inputs))
+    return tuple(torch.zeros_like(inputs[0]).index_put_(rows, v) for v in outputs)
+
 
 class RefSpeedModel(metaclass=ABCMeta):
     @abstractmethod
@@ -135,18 +180,49 @@ class RefTrajModel(metaclass=ABCMeta):
     def compute_y(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
         ...
 
+    # every speed profile is only evaluated on the rows that follow it
     def compute_u(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
         u = torch.zeros_like(t)
         for i, ref_speed in enumerate(self.ref_speeds):
-            u = u + (speed_num == i) * ref_speed.compute_u(t)
+            (ui,) = _apply_on_rows(
+                torch.broadcast_to(speed_num == i, t.shape),
+                lambda t: (ref_speed.compute_u(t),),
+                t,
+            )
+            u = u + ui
         return u
 
+    def compute_integrate_u(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
+        arc_len = torch.zeros_like(t)
+        for i, ref_speed in enumerate(self.ref_speeds):
+            (arc_len_i,) = _apply_on_rows(
+                torch.broadcast_to(speed_num == i, t.shape),
+                lambda t: (ref_speed.compute_integrate_u(t),),
+                t,
+            )
+            arc_len = arc_len + arc_len_i
+        return arc_len
+
     def compute_phi(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
         dt = 0.001
         dx = self.compute_x(t + dt, speed_num) - self.compute_x(t, speed_num)
         dy = self.compute_y(t + dt, speed_num) - self.compute_y(t, speed_num)
         return torch.atan2(dy, dx)
 
+    def compute_all(
+        self, t: torch.Tensor, speed_num: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        # x and y at t + dt for phi are evaluated together with those at t
+        dt = 0.001
+        n = t.shape[0]
+        tt = torch.cat((t, t + dt))
+        ss = torch.cat((speed_num, speed_num))
+        xx = self.compute_x(tt, ss)
+        yy = self.compute_y(tt, ss)
+        x, y = xx[:n], yy[:n]
+        phi = torch.atan2(yy[n:] - y, xx[n:] - x)
+        return x, y, phi, self.compute_u(t, speed_num)
+
 
 @dataclass
 class SineRefTrajModel(RefTrajModel):
@@ -155,10 +231,7 @@ class SineRefTrajModel(RefTrajModel):
     phi: float
 
     def compute_x(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
-        x = torch.zeros_like(t)
-        for i, ref_speed in enumerate(self.ref_speeds):
-            x = x + (speed_num == i) * ref_speed.compute_integrate_u(t)
-        return x
+        return self.compute_integrate_u(t, speed_num)
 
     def compute_y(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
         return self.A * torch.sin(self.omega * t + self.phi)
@@ -174,10 +247,7 @@ class DoubleLaneRefTrajModel(RefTrajModel):
     y2: float
 
     def compute_x(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
-        x = torch.zeros_like(t)
-        for i, ref_speed in enumerate(self.ref_speeds):
-            x = x + (speed_num == i) * ref_speed.compute_integrate_u(t)
-        return x
+        return self.compute_integrate_u(t, speed_num)
 
     def compute_y(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
         y1 = self.y1
@@ -200,10 +270,7 @@ class TriangleRefTrajModel(RefTrajModel):
     T: float
 
     def compute_x(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
-        x = torch.zeros_like(t)
-        for i, ref_speed in enumerate(self.ref_speeds):
-            x = x + (speed_num == i) * ref_speed.compute_integrate_u(t)
-        return x
+        return self.compute_integrate_u(t, speed_num)
 
     def compute_y(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
         s = torch.remainder(t, self.T)
@@ -220,13 +287,9 @@ class CircleRefTrajModel(RefTrajModel):
     r: float
 
     def compute_x(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
-        arc_len = torch.zeros_like(t)
-        for i, ref_speed in enumerate(self.ref_speeds):
-            arc_len = arc_len + (speed_num == i) * ref_speed.compute_integrate_u(t)
+        arc_len = self.compute_integrate_u(t, speed_num)
         return self.r * torch.sin(arc_len / self.r)
 
     def compute_y(self, t: torch.Tensor, speed_num: torch.Tensor) -> torch.Tensor:
-        arc_len = torch.zeros_like(t)
-        for i, ref_speed in enumerate(self.ref_speeds):
-            arc_len = arc_len + (speed_num == i) * ref_speed.compute_integrate_u(t)
+        arc_len = self.compute_integrate_u(t, speed_num)
         return self.r * (torch.cos(arc_len / self.r) - 1)
@@ -25,6 +25,7 @@ from gops.create_pkg.create_alg import create_approx_contrainer
 from gops.utils.common_utils import change_type, get_args_from_json
 from gops.utils.plot_evaluation import cm2inch
 from gops.create_pkg.create_env import create_env
+from gops.utils.policy_actor import PolicyActor
 
 # define figure sytle
 default_cfg = dict()
@@ -67,13 +68,8 @@ def load_policy(args, policy_path):
     networks.load_state_dict(torch.load(policy_path))
     return networks
 
-def compute_action(obs, networks):
-    batch_obs = torch.from_numpy(np.expand_dims(obs, axis=0).astype("float32"))
-    logits = networks.policy(batch_obs)
-    action_distribution = networks.create_action_distributions(logits)
-    action = action_distribution.mode()
-    action = action.detach().numpy()[0]
-    return action
+def compute_action(obs, actor):
+    return actor.mode(np.expand_dims(obs, axis=0))[0]
 
 
 def draw_figures(
@@ -178,7 +174,7 @@ def check_dynamic(
         policy_path = os.path.join(
             log_policy_dir, "apprfunc", "apprfunc_{}.pkl".format(policy_iteration)
         )
-        controller = load_policy(args, policy_path)
+        controller = PolicyActor(load_policy(args, policy_path))
     else:
         env = create_env(**env_info)
         print("The env is created successfully according to 'env_info'")
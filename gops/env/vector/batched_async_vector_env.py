@@ -0,0 +1,678 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab(iDLab), Tsinghua University
+
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+
+#  Description: Async vector environment hosting several environments per worker process
+
+
+"""An async vector environment with several environments per worker and shared-memory stepping."""
+import multiprocessing as mp
+import sys
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+import gymnasium as gym
+from gymnasium import logger
+from gymnasium.error import AlreadyPendingCallError, ClosedEnvironmentError, NoAsyncCallError
+from gymnasium.vector.utils import CloudpickleWrapper, clear_mpi_env_vars
+from gops.env.vector.vector_env import VectorEnv
+
+
+__all__ = ["BatchedAsyncVectorEnv"]
+
+# commands of workers, written to the shared command array before releasing them
+_STEP = 1
+_PIPE = 2
+
+
+class BatchedAsyncVectorEnv(VectorEnv):
+    """Vectorized environment that runs several environments in each of its worker processes.
+
+    Each worker steps its environments in a loop. Actions, observations, rewards,
+    termination and truncation flags and the infos of the keys in info_keys, by
+    default those of the env's additional_info, are exchanged through shared-memory
+    arrays, and a step is handed to the workers and back by semaphores, so stepping
+    pickles nothing. Other calls, e.g. reset, seed or call, go through pipes.
+
+    Finished environments are reset automatically in the worker. Their final
+    observations and infos are returned in info like by AsyncVectorEnv. Info keys
+    not in info_keys are not returned.
+
+    Besides stepping all environments, environments can be stepped asynchronously
+    in partial batches like in EnvPool: send(actions, env_ids) starts stepping some
+    environments, and recv(min_ready) returns the results of whichever environments
+    are ready, at least min_ready of them, with their ids in info["env_id"], so that
+    a slow environment, e.g. with an expensive reset, does not stall the others.
+    Readiness is tracked per worker, i.e. envs_per_worker = 1 is the finest.
+
+    Example:
+        >>> env = create_env("pyth_veh2dofconti", vector_env_num=16,
+        ...                  vector_env_type="batched_async", num_workers=4,
+        ...                  gym2gymnasium=True)
+    """
+
+    def __init__(
+        self,
+        env_fns: Sequence[Callable[[], gym.Env]],
+        num_workers: Optional[int] = None,
+        info_keys: Optional[Sequence[str]] = None,
+        copy: bool = True,
+        context: Optional[str] = None,
+        daemon: bool = True,
+    ):
+        """Vectorized environment that runs several environments in each of its worker processes.
+
+        Args:
+            env_fns: Functions that create the environments.
+            num_workers: Number of worker processes, among which the environments are split
+                as evenly as possible. If ``None``, then the number of CPUs is taken.
+            info_keys: Info keys exchanged through shared memory. If ``None``, then the keys of
+                the additional_info of the first environment are taken.
+            copy: If ``True``, then :meth:`reset` and :meth:`step` return copies of the
+                shared arrays.
+            context: Context for `multiprocessing`. If ``None``, then the default context is used.
+            daemon: If ``True``, then subprocesses have ``daemon`` flag turned on.
+        """
+        ctx = mp.get_context(context)
+        self.env_fns = env_fns
+        self.copy = copy
+        dummy_env = env_fns[0]()
+        self.metadata = dummy_env.metadata
+        additional_info = getattr(dummy_env, "additional_info", {})
+        observation_space = dummy_env.observation_space
+        action_space = dummy_env.action_space
+        dummy_env.close()
+        del dummy_env
+        super().__init__(
+            num_envs=len(env_fns),
+            observation_space=observation_space,
+            action_space=action_space,
+        )
+        for space in (observation_space, action_space):
+            if not isinstance(space, (gym.spaces.Box, gym.spaces.Discrete)):
+                raise ValueError(
+                    f"BatchedAsyncVectorEnv only supports Box and Discrete spaces, got {space}!"
+                )
+        if info_keys is None:
+            info_keys = list(additional_info.keys())
+        self.info_keys = list(info_keys)
+
+        if num_workers is None:
+            num_workers = mp.cpu_count()
+        num_workers = max(1, min(num_workers, self.num_envs))
+        self.num_workers = num_workers
+        # environments [env_offsets[w], env_offsets[w + 1]) run in worker w
+        self.env_offsets = np.linspace(0, self.num_envs, num_workers + 1).round().astype(int)
+
+        # (shape, dtype) of all shared arrays
+        n = self.num_envs
+        specs = {
+            "action": ((n, *action_space.shape), action_space.dtype),
+            "obs": ((n, *observation_space.shape), observation_space.dtype),
+            "final_obs": ((n, *observation_space.shape), observation_space.dtype),
+            "reward": ((n,), np.float64),
+            "terminated": ((n,), np.bool_),
+            "truncated": ((n,), np.bool_),
+            "stepping": ((n,), np.bool_),
+            "command": ((num_workers,), np.int8),
+            "failed": ((num_workers,), np.bool_),
+        }
+        for k in self.info_keys:
+            shape = tuple(additional_info[k]["shape"]) if k in additional_info else ()
+            dtype = additional_info[k]["dtype"] if k in additional_info else np.float32
+            specs["info." + k] = ((n, *shape), dtype)
+            specs["final_info." + k] = ((n, *shape), dtype)
+        self._buffers = {
+            name: (ctx.RawArray("b", max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)), shape, dtype)
+            for name, (shape, dtype) in specs.items()
+        }
+        self._arrays = _attach(self._buffers)
+
+        # a worker releases its done semaphore and then the ready semaphore after a step
+        self.ready_semaphore = ctx.Semaphore(0)
+        self.start_semaphores, self.done_semaphores = [], []
+        self.parent_pipes, self.processes = [], []
+        self.error_queue = ctx.Queue()
+        with clear_mpi_env_vars():
+            for w in range(num_workers):
+                start, done = ctx.Semaphore(0), ctx.Semaphore(0)
+                parent_pipe, child_pipe = ctx.Pipe()
+                offset, end = self.env_offsets[w], self.env_offsets[w + 1]
+                process = ctx.Process(
+                    target=_batched_worker,
+                    name=f"Worker<{type(self).__name__}>-{w}",
+                    args=(
+                        w,
+                        offset,
+                        CloudpickleWrapper(list(self.env_fns[offset:end])),
+                        child_pipe,
+                        parent_pipe,
+                        self._buffers,
+                        self.info_keys,
+                        start,
+                        done,
+                        self.ready_semaphore,
+                        self.error_queue,
+                    ),
+                )
+                self.start_semaphores.append(start)
+                self.done_semaphores.append(done)
+                self.parent_pipes.append(parent_pipe)
+                self.processes.append(process)
+
+                process.daemon = daemon
+                process.start()
+                child_pipe.close()
+
+        self._waiting = None
+        # worker -> ids of the envs it is stepping, and workers done but not received
+        self._busy = {}
+        self._done = []
+        # ready signals taken minus workers received, see _wait_workers
+        self._ready_signals = 0
+        self._check_spaces()
+
+    def seed_async(self, seed: Optional[Union[int, Sequence[int]]] = None):
+        """Send calls to the :obj:`seed` methods of the sub-environments.
+
+        Args:
+            seed: The seed
+        """
+        self._pipe_async("seed", self._split(self._seeds(seed)))
+
+    def seed_wait(self, timeout: Optional[Union[int, float]] = None):
+        """Wait for the calls to :obj:`seed` in each sub-environment to finish."""
+        self._pipe_wait("seed", timeout)
+
+    def reset_async(
+        self,
+        seed: Optional[Union[int, List[int]]] = None,
+        options: Optional[dict] = None,
+    ):
+        """Send calls to the :obj:`reset` methods of the sub-environments.
+
+        Args:
+            seed: List of seeds for each environment
+            options: The reset option
+        """
+        kwargs = []
+        for single_seed in self._seeds(seed):
+            single_kwargs = {}
+            if single_seed is not None:
+                single_kwargs["seed"] = single_seed
+            if options is not None:
+                single_kwargs["options"] = options
+            kwargs.append(single_kwargs)
+        self._pipe_async("reset", self._split(kwargs))
+
+    def reset_wait(
+        self,
+        timeout: Optional[Union[int, float]] = None,
+        seed: Optional[int] = None,
+        options: Optional[dict] = None,
+    ) -> Tuple[Any, dict]:
+        """Waits for the calls triggered by :meth:`reset_async` to finish and returns the results.
+
+        Args:
+            timeout: Number of seconds before the call to `reset_wait` times out.
+            seed: ignored
+            options: ignored
+
+        Returns:
+            A tuple of batched observations and infos
+        """
+        self._pipe_wait("reset", timeout)
+        return self._output(self._arrays["obs"]), self._infos()
+
+    def step_async(self, actions: np.ndarray):
+        """Send the actions of all environments to the workers.
+
+        Args:
+            actions: Batch of actions. element of :attr:`~VectorEnv.action_space`
+        """
+        if self._waiting is not None:
+            raise AlreadyPendingCallError(
+                f"Calling `step_async` while waiting for a pending call to `{self._waiting}` to complete.",
+                self._waiting,
+            )
+        self.send(actions)
+        self._waiting = "step"
+
+    def step_wait(
+        self, timeout: Optional[Union[int, float]] = None
+    ) -> Tuple[Any, NDArray[Any], NDArray[Any], NDArray[Any], dict]:
+        """Wait for all workers to step their environments.
+
+        Args:
+            timeout: Number of seconds before the call to :meth:`step_wait` times out.
+
+        Returns:
+             The batched environment step information, (obs, reward, terminated, truncated, info)
+        """
+        if self._waiting != "step":
+            raise NoAsyncCallError(
+                "Calling `step_wait` without any prior call to `step_async`.", "step"
+            )
+        self._waiting = None
+        obs, reward, terminated, truncated, infos = self.recv(self.num_envs, timeout)
+        del infos["env_id"]
+        return obs, reward, terminated, truncated, infos
+
+    def send(self, actions: np.ndarray, env_ids: Optional[Sequence[int]] = None):
+        """Start stepping some environments asynchronously.
+
+        Args:
+            actions: Actions of the environments in env_ids.
+            env_ids: Ids of the environments to step, whose workers must not be stepping.
+                If ``None``, then all environments are stepped.
+        """
+        self._assert_is_running()
+        if self._waiting is not None:
+            raise AlreadyPendingCallError(
+                f"Calling `send` while waiting for a pending call to `{self._waiting}` to complete.",
+                self._waiting,
+            )
+        if env_ids is None:
+            env_ids = np.arange(self.num_envs)
+        env_ids = np.asarray(env_ids, dtype=np.int64)
+        workers = np.searchsorted(self.env_offsets, env_ids, side="right") - 1
+        received = [d for d, _ in self._done]
+        for w in np.unique(workers):
+            if w in self._busy or w in received:
+                raise AlreadyPendingCallError(
+                    f"Calling `send` for environments of Worker-{w}, which is still stepping.",
+                    "step",
+                )
+        action = self._arrays["action"]
+        action[env_ids] = np.asarray(actions, dtype=action.dtype).reshape(
+            (len(env_ids), *action.shape[1:])
+        )
+        stepping = self._arrays["stepping"]
+        for w in np.unique(workers):
+            ids = env_ids[workers == w]
+            stepping[self.env_offsets[w]:self.env_offsets[w + 1]] = False
+            stepping[ids] = True
+            self._busy[w] = np.sort(ids)
+            self._arrays["command"][w] = _STEP
+            self.start_semaphores[w].release()
+
+    def recv(
+        self, min_ready: int = 1, timeout: Optional[Union[int, float]] = None
+    ) -> Tuple[Any, NDArray[Any], NDArray[Any], NDArray[Any], dict]:
+        """Wait until at least min_ready of the stepping environments are ready and return them.
+
+        Args:
+            min_ready: Minimum number of environments to return, clipped to the number of
+                stepping environments. All ready environments are returned, so there may
+                be more.
+            timeout: Number of seconds before the call to :meth:`recv` times out.
+
+        Returns:
+            (obs, reward, terminated, truncated, info) of the ready environments, whose ids
+            are in info["env_id"], in increasing order
+        """
+        self._assert_is_running()
+        if not self._busy and not self._done:
+            raise NoAsyncCallError("Calling `recv` without any prior call to `send`.", "step")
+        stepping = sum(len(ids) for ids in self._busy.values())
+        min_ready = min(min_ready, stepping + sum(len(ids) for _, ids in self._done))
+        self._wait_workers(min_ready, timeout)
+        done, self._done = sorted(self._done, key=lambda x: x[0]), []
+        failed = self._arrays["failed"]
+        if failed.any():
+            self._raise_if_errors(~failed)
+
+        env_ids = np.concatenate([ids for _, ids in done])
+        terminated = self._arrays["terminated"][env_ids]
+        truncated = self._arrays["truncated"][env_ids]
+        infos = {k: self._arrays["info." + k][env_ids] for k in self.info_keys}
+        finished = np.nonzero(terminated | truncated)[0]
+        if len(finished) > 0:
+            final_obs = np.empty(len(env_ids), dtype=object)
+            final_info = np.empty(len(env_ids), dtype=object)
+            for i in finished:
+                final_obs[i] = self._arrays["final_obs"][env_ids[i]].copy()
+                final_info[i] = {
+                    k: self._arrays["final_info." + k][env_ids[i]].copy()
+                    for k in self.info_keys
+                }
+            mask = terminated | truncated
+            infos.update(
+                final_observation=final_obs,
+                _final_observation=mask,
+                final_info=final_info,
+                _final_info=mask,
+            )
+        infos["env_id"] = env_ids
+        return (
+            self._arrays["obs"][env_ids],
+            self._arrays["reward"][env_ids],
+            terminated,
+            truncated,
+            infos,
+        )
+
+    def _wait_workers(self, min_ready: int, timeout: Optional[Union[int, float]]):
+        """Move stepping workers to _done until they hold at least min_ready envs."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        num_ready = sum(len(ids) for _, ids in self._done)
+        while True:
+            for w in list(self._busy):
+                if self.done_semaphores[w].acquire(block=False):
+                    self._done.append((w, self._busy.pop(w)))
+                    num_ready += len(self._done[-1][1])
+                    self._ready_signals -= 1
+            if num_ready >= min_ready:
+                return
+            # Every step releases the ready semaphore once, after the worker's done
+            # semaphore. Signals of workers received above without blocking are taken
+            # here first, they return at once.
+            remaining = None if deadline is None else max(deadline - time.perf_counter(), 0)
+            if not self.ready_semaphore.acquire(timeout=remaining):
+                raise mp.TimeoutError(
+                    f"The call to `recv` has timed out after {timeout} second(s)."
+                )
+            self._ready_signals += 1
+
+    def call_async(self, name: str, *args, **kwargs):
+        """Calls the method with name asynchronously and apply args and kwargs to the method.
+
+        Args:
+            name: Name of the method or property to call.
+            *args: Arguments to apply to the method call.
+            **kwargs: Keyword arguments to apply to the method call.
+        """
+        self._pipe_async("_call", [(name, args, kwargs)] * self.num_workers)
+
+    def call_wait(self, timeout: Optional[Union[int, float]] = None) -> tuple:
+        """Waits for the results of :meth:`call_async` of all environments."""
+        return tuple(r for results in self._pipe_wait("_call", timeout) for r in results)
+
+    def set_attr(self, name: str, values: Union[list, tuple, object]):
+        """Sets an attribute of the sub-environments.
+
+        Args:
+            name: Name of the property to be set in each individual environment.
+            values: Values of the property to be set to. If ``values`` is a list or
+                tuple, then it corresponds to the values for each individual
+                environment, otherwise a single value is set for all environments.
+        """
+        if not isinstance(values, (list, tuple)):
+            values = [values for _ in range(self.num_envs)]
+        if len(values) != self.num_envs:
+            raise ValueError(
+                "Values must be a list or tuple with length equal to the "
+                f"number of environments. Got `{len(values)}` values for "
+                f"{self.num_envs} environments."
+            )
+        self._pipe_async("_setattr", [(name, v) for v in self._split(list(values))])
+        self._pipe_wait("_setattr")
+
+    def close_extras(
+        self, timeout: Optional[Union[int, float]] = None, terminate: bool = False
+    ):
+        """Close the environments & clean up the extra resources (processes and pipes).
+
+        Args:
+            timeout: Number of seconds before the call to :meth:`close` times out.
+            terminate: If ``True``, then the :meth:`close` operation is forced and all processes are terminated.
+        """
+        timeout = 0 if terminate else timeout
+        try:
+            if self._waiting is not None:
+                logger.warn(
+                    f"Calling `close` while waiting for a pending call to `{self._waiting}` to complete."
+                )
+                if self._waiting == "step":
+                    self.step_wait(timeout)
+                else:
+                    self._pipe_wait(self._waiting, timeout)
+            if self._busy:
+                self.recv(self.num_envs, timeout)
+        except mp.TimeoutError:
+            terminate = True
+
+        if terminate:
+            for process in self.processes:
+                if process.is_alive():
+                    process.terminate()
+        else:
+            alive = [w for w, pipe in enumerate(self.parent_pipes) if pipe is not None]
+            for w in alive:
+                self._arrays["command"][w] = _PIPE
+                self.parent_pipes[w].send(("close", None))
+                self.start_semaphores[w].release()
+            for w in alive:
+                self.parent_pipes[w].recv()
+
+        for pipe in self.parent_pipes:
+            if pipe is not None:
+                pipe.close()
+        for process in self.processes:
+            process.join()
+
+    def _seeds(self, seed: Optional[Union[int, Sequence[int]]]) -> list:
+        if seed is None:
+            seed = [None for _ in range(self.num_envs)]
+        if isinstance(seed, int):
+            seed = [seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+        return list(seed)
+
+    def _split(self, values: list) -> list:
+        """Split per environment values into per worker lists."""
+        return [
+            values[self.env_offsets[w]:self.env_offsets[w + 1]]
+            for w in range(self.num_workers)
+        ]
+
+    def _pipe_async(self, command: str, data: list):
+        self._assert_is_running()
+        if self._waiting is not None or self._busy or self._done:
+            waiting = self._waiting or "step"
+            raise AlreadyPendingCallError(
+                f"Calling `{command}` while waiting for a pending call to `{waiting}` to complete.",
+                waiting,
+            )
+        self._arrays["command"][:] = _PIPE
+        for pipe, start, worker_data in zip(self.parent_pipes, self.start_semaphores, data):
+            pipe.send((command, worker_data))
+            start.release()
+        self._waiting = command
+
+    def _pipe_wait(self, command: str, timeout: Optional[Union[int, float]] = None) -> list:
+        self._assert_is_running()
+        if self._waiting != command:
+            raise NoAsyncCallError(
+                f"Calling `{command}_wait` without any prior call to `{command}_async`.",
+                command,
+            )
+        for pipe in self.parent_pipes:
+            if timeout is not None and not pipe.poll(timeout):
+                self._waiting = None
+                raise mp.TimeoutError(
+                    f"The call to `{command}_wait` has timed out after {timeout} second(s)."
+                )
+        results, successes = zip(*[pipe.recv() for pipe in self.parent_pipes])
+        self._waiting = None
+        self._raise_if_errors(successes)
+        return list(results)
+
+    def _check_spaces(self):
+        spaces = (self.single_observation_space, self.single_action_space)
+        self._pipe_async("_check_spaces", [spaces] * self.num_workers)
+        results = self._pipe_wait("_check_spaces")
+        if not all(same_obs for same_obs, _ in results):
+            raise RuntimeError(
+                "Some environments have an observation space different from "
+                f"`{self.single_observation_space}`. In order to batch observations, "
+                "the observation spaces from all environments must be equal."
+            )
+        if not all(same_act for _, same_act in results):
+            raise RuntimeError(
+                "Some environments have an action space different from "
+                f"`{self.single_action_space}`. In order to batch actions, the "
+                "action spaces from all environments must be equal."
+            )
+
+    def _output(self, array: np.ndarray) -> np.ndarray:
+        return array.copy() if self.copy else array
+
+    def _infos(self) -> dict:
+        return {k: self._output(self._arrays["info." + k]) for k in self.info_keys}
+
+    def _assert_is_running(self):
+        if self.closed:
+            raise ClosedEnvironmentError(
+                f"Trying to operate on `{type(self).__name__}`, after a call to `close()`."
+            )
+
+    def _raise_if_errors(self, successes):
+        if all(successes):
+            return
+
+        num_errors = self.num_workers - sum(successes)
+        assert num_errors > 0
+        for i in range(num_errors):
+            index, exctype, value = self.error_queue.get()
+            logger.error(
+                f"Received the following error from Worker-{index}: {exctype.__name__}: {value}"
+            )
+            logger.error(f"Shutting down Worker-{index}.")
+            self.parent_pipes[index].close()
+            self.parent_pipes[index] = None
+
+            if i == num_errors - 1:
+                logger.error("Raising the last exception back to the main process.")
+                raise exctype(value)
+
+    def __del__(self):
+        """On deleting the object, checks that the vector environment is closed."""
+        if not getattr(self, "closed", True) and hasattr(self, "_waiting"):
+            self.close(terminate=True)
+
+
+def _attach(buffers: dict) -> dict:
+    """Numpy views of the shared arrays."""
+    return {
+        name: np.frombuffer(raw, dtype=np.uint8)[: int(np.prod(shape)) * np.dtype(dtype).itemsize]
+        .view(dtype)
+        .reshape(shape)
+        for name, (raw, shape, dtype) in buffers.items()
+    }
+
+
+def _batched_worker(
+    index,
+    offset,
+    env_fns,
+    pipe,
+    parent_pipe,
+    buffers,
+    info_keys,
+    start,
+    done,
+    ready,
+    error_queue,
+):
+    envs = [env_fn() for env_fn in env_fns.fn]
+    parent_pipe.close()
+    arrays = _attach(buffers)
+    obs, final_obs = arrays["obs"], arrays["final_obs"]
+    infos = [arrays["info." + k] for k in info_keys]
+    final_infos = [arrays["final_info." + k] for k in info_keys]
+
+    def write(i, observation, info, obs_array, info_arrays):
+        obs_array[i] = observation
+        for k, array in zip(info_keys, info_arrays):
+            if k in info:
+                array[i] = info[k]
+
+    command = None
+    try:
+        while True:
+            start.acquire()
+            command = arrays["command"][index]
+            if command == _STEP:
+                for j, env in enumerate(envs):
+                    i = offset + j
+                    if not arrays["stepping"][i]:
+                        continue
+                    observation, reward, terminated, truncated, info = env.step(
+                        arrays["action"][i]
+                    )
+                    arrays["reward"][i] = reward
+                    arrays["terminated"][i] = terminated
+                    arrays["truncated"][i] = truncated
+                    if terminated or truncated:
+                        write(i, observation, info, final_obs, final_infos)
+                        observation, info = env.reset()
+                    write(i, observation, info, obs, infos)
+                done.release()
+                ready.release()
+                continue
+
+            command, data = pipe.recv()
+            if command == "reset":
+                for j, (env, kwargs) in enumerate(zip(envs, data)):
+                    observation, info = env.reset(**kwargs)
+                    write(offset + j, observation, info, obs, infos)
+                pipe.send((None, True))
+            elif command == "seed":
+                for env, seed in zip(envs, data):
+                    env.seed(seed)
+                pipe.send((None, True))
+            elif command == "close":
+                pipe.send((None, True))
+                break
+            elif command == "_call":
+                name, args, kwargs = data
+                if name in ["reset", "step", "seed", "close"]:
+                    raise ValueError(
+                        f"Trying to call function `{name}` with "
+                        f"`_call`. Use `{name}` directly instead."
+                    )
+                results = []
+                for env in envs:
+                    function = getattr(env, name)
+                    results.append(function(*args, **kwargs) if callable(function) else function)
+                pipe.send((results, True))
+            elif command == "_setattr":
+                name, values = data
+                for env, value in zip(envs, values):
+                    setattr(env, name, value)
+                pipe.send((None, True))
+            elif command == "_check_spaces":
+                pipe.send(
+                    (
+                        (
+                            all(data[0] == env.observation_space for env in envs),
+                            all(data[1] == env.action_space for env in envs),
+                        ),
+                        True,
+                    )
+                )
+            else:
+                raise RuntimeError(
+                    f"Received unknown command `{command}`. Must "
+                    "be one of {`reset`, `seed`, `close`, `_call`, "
+                    "`_setattr`, `_check_spaces`}."
+                )
+    except (KeyboardInterrupt, Exception):
+        error_queue.put((index,) + sys.exc_info()[:2])
+        if command == _STEP:
+            arrays["failed"][index] = True
+            done.release()
+            ready.release()
+        else:
+            pipe.send((None, False))
+    finally:
+        for env in envs:
+            env.close()
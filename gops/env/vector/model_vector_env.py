@@ -0,0 +1,225 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab(iDLab), Tsinghua University
+
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+
+#  Description: Vector environment stepping all environments in a batched env model
+
+
+"""A vector environment running on the batched torch model of an environment."""
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from numpy.typing import NDArray
+
+from gymnasium import Env
+from gymnasium.utils import seeding
+from gops.env.vector.vector_env import VectorEnv
+
+
+__all__ = ["ModelVectorEnv"]
+
+
+class ModelVectorEnv(VectorEnv):
+    """Vectorized environment that steps all environments at once in the env model.
+
+    The observations and additional infos of all environments are kept as batched
+    tensors and stepped by one call of the model's forward, so the cost of a step
+    barely grows with the number of environments. Terminations come from the model,
+    truncations from max_episode_steps, both as masks over the environments.
+
+    Finished environments are reset automatically through a single data environment:
+    their initial states are sampled in one batch with the semantics of
+    PythBaseEnv.sample_initial_state and passed as init_state to its reset, which
+    composes observations and infos, e.g. with references, like in data sampling.
+    Final observations and infos are returned in info like by SyncVectorEnv.
+
+    Example:
+        >>> env = create_env("pyth_veh3dofconti", vector_env_num=1000,
+        ...                  vector_env_type="model", gym2gymnasium=True)
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[[], Env],
+        model_fn: Callable[[], Any],
+        num_envs: int,
+        max_episode_steps: Optional[int] = None,
+    ):
+        """Vectorized environment that steps all environments at once in the env model.
+
+        Args:
+            env_fn: function creating the data environment, used for spaces and resets.
+            model_fn: function creating the env model with the same wrappers as the data
+                environment.
+            num_envs: number of environments.
+            max_episode_steps: episode length after which environments are truncated.
+                If ``None``, then the max_episode_steps of the data environment is taken.
+        """
+        self.env = env_fn()
+        self.model = model_fn()
+        self.metadata = self.env.metadata
+        super().__init__(
+            num_envs=num_envs,
+            observation_space=self.env.observation_space,
+            action_space=self.env.action_space,
+        )
+        if max_episode_steps is None:
+            max_episode_steps = getattr(self.env, "max_episode_steps", None)
+        self.max_episode_steps = max_episode_steps
+        self.additional_info = getattr(self.env, "additional_info", {})
+        self.device = getattr(self.model, "device", None) or "cpu"
+
+        self.np_random, _ = seeding.np_random()
+        self._obs = torch.zeros(
+            (num_envs, *self.single_observation_space.shape),
+            dtype=torch.float32,
+            device=self.device,
+        )
+        self._info = {
+            k: torch.zeros(
+                (num_envs, *v["shape"]),
+                dtype=torch.from_numpy(np.zeros(0, dtype=v["dtype"])).dtype,
+                device=self.device,
+            )
+            for k, v in self.additional_info.items()
+        }
+        self._steps = torch.zeros(num_envs, dtype=torch.int64, device=self.device)
+        self._not_done = torch.zeros(num_envs, dtype=torch.bool, device=self.device)
+        self._actions = None
+
+    def seed(self, seed: Optional[Union[int, Sequence[int]]] = None):
+        """Sets the seed of initial state sampling and of the data environment.
+
+        Args:
+            seed: The seed, only the first one is used for a sequence of seeds
+        """
+        if isinstance(seed, (list, tuple)):
+            seed = seed[0]
+        self.np_random, _ = seeding.np_random(seed)
+        self.env.seed(seed)
+
+    def reset_wait(
+        self,
+        seed: Optional[Union[int, List[int]]] = None,
+        options: Optional[dict] = None,
+    ):
+        """Resets all environments.
+
+        Args:
+            seed: The reset environment seed
+            options: Option information for the environment reset
+
+        Returns:
+            The reset observation of the environment and reset information
+        """
+        if seed is not None:
+            self.seed(seed)
+        self._reset_envs(np.arange(self.num_envs), options)
+        return self._obs.cpu().numpy().copy(), self._numpy_info()
+
+    def step_async(self, actions):
+        """Sets :attr:`_actions` as a batched tensor for :meth:`step_wait`."""
+        self._actions = torch.as_tensor(
+            np.asarray(actions, dtype=np.float32), device=self.device
+        )
+
+    def step_wait(self) -> Tuple[Any, NDArray[Any], NDArray[Any], NDArray[Any], dict]:
+        """Steps all environments in the model and resets the finished ones.
+
+        Returns:
+            The batched environment step results
+        """
+        with torch.no_grad():
+            obs, reward, terminated, info = self.model.forward(
+                self._obs, self._actions, self._not_done, self._info
+            )
+        self._obs = obs
+        self._info = {k: info[k] for k in self.additional_info.keys()}
+        self._steps += 1
+        terminated = terminated.bool()
+        truncated = torch.zeros_like(terminated)
+        if self.max_episode_steps is not None:
+            truncated = (self._steps >= self.max_episode_steps) & ~terminated
+
+        infos = {}
+        finished = np.nonzero((terminated | truncated).cpu().numpy())[0]
+        if len(finished) > 0:
+            final_obs = np.empty(self.num_envs, dtype=object)
+            final_info = np.empty(self.num_envs, dtype=object)
+            finished_obs = obs[finished].cpu().numpy()
+            finished_info = {k: v[finished].cpu().numpy() for k, v in self._info.items()}
+            for i, env_index in enumerate(finished):
+                final_obs[env_index] = finished_obs[i]
+                final_info[env_index] = {k: v[i] for k, v in finished_info.items()}
+            mask = np.zeros(self.num_envs, dtype=np.bool_)
+            mask[finished] = True
+            infos.update(
+                final_observation=final_obs,
+                _final_observation=mask,
+                final_info=final_info,
+                _final_info=mask,
+            )
+            self._reset_envs(finished)
+        infos.update(self._numpy_info())
+
+        return (
+            self._obs.cpu().numpy().copy(),
+            reward.detach().cpu().numpy().astype(np.float64),
+            terminated.cpu().numpy(),
+            truncated.cpu().numpy(),
+            infos,
+        )
+
+    def _reset_envs(self, env_indices: np.ndarray, options: Optional[dict] = None):
+        """Reset the given environments in place, sampling their initial states in one batch."""
+        unwrapped = self.env.unwrapped
+        init_states = None
+        if hasattr(unwrapped, "sample_initial_states"):
+            init_states = unwrapped.sample_initial_states(len(env_indices), self.np_random)
+        obs, infos = [], []
+        for i in range(len(env_indices)):
+            kwargs = {}
+            if init_states is not None:
+                kwargs["init_state"] = init_states[i]
+            if options is not None:
+                kwargs["options"] = options
+            o, info = self.env.reset(**kwargs)
+            obs.append(o)
+            infos.append(info)
+        rows = torch.as_tensor(env_indices, device=self.device)
+        self._obs[rows] = torch.as_tensor(
+            np.stack(obs), dtype=torch.float32, device=self.device
+        )
+        for k, v in self._info.items():
+            v[rows] = torch.as_tensor(
+                np.stack([info[k] for info in infos]).astype(
+                    self.additional_info[k]["dtype"]
+                ),
+                device=self.device,
+            )
+        self._steps[rows] = 0
+
+    def _numpy_info(self) -> dict:
+        return {k: v.cpu().numpy().copy() for k, v in self._info.items()}
+
+    def call(self, name, *args, **kwargs) -> tuple:
+        """Calls the method with name of the data environment, once for all environments."""
+        function = getattr(self.env, name)
+        if callable(function):
+            return (function(*args, **kwargs),)
+        return (function,)
+
+    def set_attr(self, name: str, values: Union[list, tuple, Any]):
+        """Sets an attribute of the data environment, which is shared by all environments."""
+        if isinstance(values, (list, tuple)):
+            values = values[0]
+        setattr(self.env, name, values)
+
+    def close_extras(self, **kwargs):
+        """Close the data environment."""
+        self.env.close()
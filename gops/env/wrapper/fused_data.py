@@ -0,0 +1,227 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: data type environment wrapper fusing the wrappers of create_env into one
+
+
+from typing import Optional, Tuple, Union
+
+import gym
+import numpy as np
+from gym.core import ObsType, ActType
+from gym.utils import seeding
+from gymnasium.core import Env as GymnasiumEnv
+
+from gops.env.env_gen_ocp.pyth_base import State
+from gops.env.wrapper.gym2gymnasium import convert_gym_space
+
+
+class FusedData(gym.Wrapper):
+    """Data type environment wrapper that does in one step and one reset what the wrapper
+        chain of create_env does, i.e. ResetInfoData, TimeLimit, ActionRepeatData,
+        ConvertType, StateData, ShapingRewardData, NoiseData, ScaleObservationData and
+        ScaleActionData, with the same arguments.
+
+    Affine transforms are folded into one precomputed scale and shift each:
+        obs_rescaled = obs * obs_scale + obs_shift * obs_scale
+        r_rescaled = r * reward_scale + reward_shift * reward_scale
+        raw_action = action * k + b, with k and b mapping [min_action, max_action] to
+        the action space of env.
+    Results equal those of the wrapper chain up to floating point rounding.
+
+    Raw observation, action and reward are only written into info as "raw_obs",
+    "raw_action" and "raw_reward" if raw_info is True, like the chain does for the
+    wrappers in use.
+
+    :param env: original data type environment.
+    :param Optional[int] max_episode_steps: time limit, defaults to max_episode_steps of env.
+    :param Optional[int] repeat_num: repeat n times action in one step.
+    :param bool sum_reward: sum the rewards during repeating steps.
+    :param Optional[float] reward_shift: shift factor of reward.
+    :param Optional[float] reward_scale: scale factor of reward.
+    :param Optional[str] obs_noise_type: "normal" or "uniform" noise of observation.
+    :param Optional[list] obs_noise_data: parameters of noise distribution.
+    :param Union[np.ndarray, float, list, None] obs_shift: shift factor of observation.
+    :param Union[np.ndarray, float, list, None] obs_scale: scale factor of observation.
+    :param bool action_scale: scale Box action space to [min_action, max_action].
+    :param Union[float, int, np.ndarray, list] min_action: minimum action after scaling.
+    :param Union[float, int, np.ndarray, list] max_action: maximum action after scaling.
+    :param bool raw_info: write raw observation, action and reward into info.
+    """
+
+    def __init__(
+        self,
+        env,
+        max_episode_steps: Optional[int] = None,
+        repeat_num: Optional[int] = None,
+        sum_reward: bool = True,
+        reward_shift: Optional[float] = None,
+        reward_scale: Optional[float] = None,
+        obs_noise_type: Optional[str] = None,
+        obs_noise_data: Optional[list] = None,
+        obs_shift: Union[np.ndarray, float, list, None] = None,
+        obs_scale: Union[np.ndarray, float, list, None] = None,
+        action_scale: bool = True,
+        min_action: Union[float, int, np.ndarray, list] = -1.0,
+        max_action: Union[float, int, np.ndarray, list] = 1.0,
+        raw_info: bool = False,
+    ):
+        super(FusedData, self).__init__(env)
+        self.raw_info = raw_info
+        # step returns (obs, reward, terminated, truncated, info) like Gym2Gymnasium
+        self.gymnasium = False
+
+        if max_episode_steps is None and hasattr(env, "max_episode_steps"):
+            max_episode_steps = getattr(env, "max_episode_steps")
+        if max_episode_steps is not None and self.env.spec is not None:
+            self.env.spec.max_episode_steps = max_episode_steps
+        self._max_episode_steps = max_episode_steps
+        self._elapsed_steps = None
+
+        self.repeat_num = repeat_num
+        self.sum_reward = sum_reward
+
+        self.act_data_type = env.action_space.dtype
+        self.gops_data_type = np.float32
+        self.current_obs = None
+
+        self.reward_scaled = reward_scale is not None or reward_shift is not None
+        if self.reward_scaled:
+            self.reward_scale = 1.0 if reward_scale is None else reward_scale
+            self.reward_shift = (0.0 if reward_shift is None else reward_shift) * self.reward_scale
+
+        if obs_noise_type is not None:
+            assert obs_noise_type in ["normal", "uniform"]
+            assert (
+                len(obs_noise_data) == 2
+                and len(obs_noise_data[0]) == env.observation_space.shape[0]
+            )
+            obs_noise_data = np.array(obs_noise_data, dtype=np.float32)
+        self.noise_type = obs_noise_type
+        self.noise_data = obs_noise_data
+
+        self.obs_scaled = obs_shift is not None or obs_scale is not None
+        if self.obs_scaled:
+            obs_shift = 0.0 if obs_shift is None else obs_shift
+            obs_scale = 1.0 if obs_scale is None else obs_scale
+            if isinstance(obs_shift, list):
+                obs_shift = np.array(obs_shift, dtype=np.float32)
+            if isinstance(obs_scale, list):
+                obs_scale = np.array(obs_scale, dtype=np.float32)
+            self.obs_scale = obs_scale
+            self.obs_shift = obs_shift * obs_scale
+
+        self.action_scaled = action_scale and isinstance(env.action_space, gym.spaces.Box)
+        if self.action_scaled:
+            if isinstance(min_action, list):
+                min_action = np.array(min_action, dtype=env.action_space.dtype)
+            if isinstance(max_action, list):
+                max_action = np.array(max_action, dtype=env.action_space.dtype)
+            self.min_action = np.zeros_like(env.action_space.low) + min_action
+            self.max_action = np.zeros_like(env.action_space.high) + max_action
+            self.action_space = gym.spaces.Box(low=self.min_action, high=self.max_action)
+            self.low = env.action_space.low
+            self.high = env.action_space.high
+            self.action_k = (self.high - self.low) / (self.max_action - self.min_action)
+            self.action_b = self.low - self.min_action * self.action_k
+
+    def reset(self, **kwargs) -> Tuple[ObsType, dict]:
+        ret = self.env.reset(**kwargs)
+        if isinstance(ret, tuple):
+            obs, info = ret
+        else:
+            obs, info = ret, {}
+        self._elapsed_steps = 0
+        obs, info = self._observation(obs, info)
+        return obs, info
+
+    def step(self, action: ActType) -> Tuple[ObsType, float, bool, dict]:
+        if self.action_scaled:
+            action = np.clip(action, self.min_action, self.max_action)
+            raw_action = np.clip(action * self.action_k + self.action_b, self.low, self.high)
+        else:
+            raw_action = action
+        env_action = raw_action.astype(self.act_data_type)
+
+        repeat_num = 1 if self.repeat_num is None else self.repeat_num
+        reward = 0
+        for _ in range(repeat_num):
+            obs, r, done, info = self.env.step(env_action)
+            if self._max_episode_steps is not None:
+                self._elapsed_steps += 1
+                if self._elapsed_steps >= self._max_episode_steps:
+                    info["TimeLimit.truncated"] = not done
+                    done = True
+            reward += r
+            if done:
+                break
+        if self.repeat_num is None or not self.sum_reward:
+            reward = r
+
+        obs, info = self._observation(obs, info)
+        if self.reward_scaled:
+            if self.raw_info:
+                info["raw_reward"] = reward
+            reward = reward * self.reward_scale + self.reward_shift
+        if self.raw_info and self.action_scaled:
+            info["raw_action"] = raw_action
+        if self.gymnasium:
+            truncated = info.get("TimeLimit.truncated", False)
+            info["TimeLimit.truncated"] = truncated
+            return obs, reward, done ^ truncated, truncated, info
+        return obs, reward, done, info
+
+    def _observation(self, obs, info: dict):
+        obs = obs.astype(self.gops_data_type)
+        self.current_obs = obs
+        if self.noise_type == "normal":
+            obs = obs + self.np_random.normal(loc=self.noise_data[0], scale=self.noise_data[1])
+        elif self.noise_type == "uniform":
+            obs = obs + self.np_random.uniform(low=self.noise_data[0], high=self.noise_data[1])
+        if self.obs_scaled:
+            if self.raw_info:
+                info["raw_obs"] = obs
+            obs = obs * self.obs_scale + self.obs_shift
+        return obs, info
+
+    def seed(self, seed=None):
+        if self.noise_type is None:
+            return self.env.seed(seed)
+        np_random, _ = seeding.np_random(seed)
+        noise_seed = int(np_random.randint(2 ** 31))
+        self.np_random, noise_seed = seeding.np_random(noise_seed)
+        seeds = self.env.seed(seed)
+        return seeds + [noise_seed]
+
+    @property
+    def state(self):
+        if hasattr(self.env, "state"):
+            if isinstance(self.env.state, State):
+                return self.env.state
+            else:
+                return State(
+                    robot_state = np.array(self.env.state, dtype=np.float32),
+                    context_state = None
+                )
+        else:
+            return  State(
+                    robot_state = self.current_obs,
+                    context_state = None
+                )
+
+
+class FusedGymnasiumData(FusedData, GymnasiumEnv):
+    """FusedData that also converts the environment into a gymnasium.Env like
+        Gym2Gymnasium, i.e. step returns (obs, reward, terminated, truncated, info).
+    """
+
+    def __init__(self, env, **kwargs):
+        super(FusedGymnasiumData, self).__init__(env, **kwargs)
+        self.gymnasium = True
+        self.observation_space = convert_gym_space(self.observation_space)
+        self.action_space = convert_gym_space(self.action_space)
@@ -164,6 +164,34 @@ class OptController:
             0, : self.action_dim
         ]
 
+    def warm_start(self, actions: np.ndarray, x: np.ndarray, info: InfoDict = {}):
+        """Set initial guess of the next call from a predicted action sequence
+
+        :param np.ndarray actions:
+            Actions of all num_pred_step steps, e.g. forward_all_policy of a full-horizon policy,
+            of shape [num_pred_step, action_dim].
+        :param np.ndarray x: Current state
+        :param InfoDict info: (Optional) Additional info that are required by model. Default to {}.
+        """
+        x = torch.tensor(x, dtype=torch.float32)
+        if info:
+            info = info.copy()
+            for (key, value) in info.items():
+                info[key] = torch.tensor(value, dtype=torch.float32)
+        us = torch.as_tensor(
+            actions[: self.num_pred_step : self.ctrl_interval], dtype=torch.float32
+        )
+        if self.mode == "collocation":
+            # states of the guess are those reached by rolling out the actions
+            inputs = torch.cat((us, torch.zeros((self.num_ctrl_points, self.obs_dim))), 1)
+            rollout_mode, self.rollout_mode = self.rollout_mode, "loop"
+            states, _, _ = self._rollout(inputs.reshape(-1), x, info)
+            self.rollout_mode = rollout_mode
+            us = torch.cat((us, states[1 :: self.ctrl_interval, :]), 1)
+        self.initial_guess = np.clip(
+            us.reshape(-1).numpy().astype("d"), self.bounds.lb, self.bounds.ub
+        )
+
     def _cost_fcn_and_jac(
         self, inputs: np.ndarray, x: torch.Tensor, info: InfoDict
     ) -> Tuple[float, np.ndarray]:
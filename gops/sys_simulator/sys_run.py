@@ -30,6 +30,7 @@ from gops.env.env_gen_ocp.pyth_base import Env, State
 from gops.utils.plot_evaluation import cm2inch
 from gops.utils.common_utils import get_args_from_json, mp4togif
 from gops.utils.gops_path import gops_path
+from gops.utils.policy_actor import PolicyActor
 
 default_cfg = dict()
 default_cfg["fig_size"] = (12, 9)
@@ -258,13 +259,8 @@ class PolicyRunner:
 
         return eval_dict, tracking_dict
 
-    def compute_action(self, obs: np.ndarray, networks: Any) -> np.ndarray:
-        batch_obs = torch.from_numpy(np.expand_dims(obs, axis=0).astype("float32"))
-        logits = networks.policy(batch_obs)
-        action_distribution = networks.create_action_distributions(logits)
-        action = action_distribution.mode()
-        action = action.detach().numpy()[0]
-        return action
+    def compute_action(self, obs: np.ndarray, actor: PolicyActor) -> np.ndarray:
+        return actor.mode(np.expand_dims(obs, axis=0))[0]
 
     def draw(self):
         fig_size = (
@@ -849,10 +845,11 @@ class PolicyRunner:
                 print("Work space: ")
                 print(self.__convert_format(env.work_space))
             networks = self.__load_policy(log_policy_dir, trained_policy_iteration)
+            actor = PolicyActor(networks)
 
             # Run policy
             eval_dict, tracking_dict = self.run_an_episode(
-                env, networks, self.init_info, is_opt=False, render=False
+                env, actor, self.init_info, is_opt=False, render=False
             )
             print("Successfully run policy {}".format(i + 1))
             print("===========================================================\n")
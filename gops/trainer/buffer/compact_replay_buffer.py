@@ -0,0 +1,284 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer storing every observation once
+
+
+from typing import Union
+
+import numpy as np
+import torch
+from gops.trainer.buffer.replay_buffer import ReplayBuffer, combined_shape, flatten_arrays
+from gops.trainer.sampler.base import Experience, stack_experiences
+from gops.utils.state_columns import StateColumns
+
+__all__ = ["CompactReplayBuffer"]
+
+
+class CompactReplayBuffer(ReplayBuffer):
+    """
+    Implementation of replay buffer with uniform sampling probability which stores every
+    observation once.
+
+    Observations, together with their additional infos, are kept in a ring of frames and
+    a transition only keeps the indices of the frames of its obs and next obs. When the
+    obs of a transition equals the next obs of an earlier transition of the same or the
+    previous stored batch, i.e. it continues an episode, that frame is reused, so only
+    the next obs is written in the common case. Frames are matched by their stored
+    content in one vectorized pass, only the frame indices of the previous batch are
+    kept for it.
+    The first obs of an episode gets a frame of its own, and the next obs of the last
+    step remains as the terminal observation. A transition is evicted once its frames
+    are overwritten, so very short episodes reduce the effective capacity.
+    Sampled batches have the same keys and dtypes as those of ReplayBuffer, but are not
+    gathered into preallocated tensors.
+
+    Args:
+        buffer_frame_size (int, optional): Number of observation frames.
+                                           Defaults to 1.125 * buffer_max_size.
+    """
+
+    snapshot_keys = ReplayBuffer.snapshot_keys + ("frames_written",)
+
+    def __init__(self, index=0, **kwargs):
+        max_size = kwargs["buffer_max_size"]
+        self.frame_size = kwargs.get("buffer_frame_size", max_size + max_size // 8)
+        # frames are counted from the start, the frame slot is the count modulo frame_size
+        self.frames_written = 0
+        # next obs frames of the previous chunk, to be reused by the following transitions
+        self.last_obs2_frames = np.zeros(0, dtype=np.int64)
+        # weights of the fingerprints of stored rows, see _fingerprints
+        self.row_weights = None
+        super().__init__(index, **kwargs)
+
+    def _create_transition_fields(self) -> dict:
+        self.frames = {
+            "obs": self._create_field(
+                "frames.obs",
+                combined_shape(self.frame_size, self.obsv_dim),
+                self.obs_dtype,
+            )
+        }
+        for k, v in self.additional_info.items():
+            self.frames[k] = self._create_info_field("frames." + k, v, self.frame_size)
+        return {
+            "act": self._create_field(
+                "act", combined_shape(self.max_size, self.act_dim), np.float32
+            ),
+            "rew": self._create_field("rew", (self.max_size,), np.float32),
+            "done": self._create_field("done", (self.max_size,), np.float32),
+            "logp": self._create_field("logp", (self.max_size,), np.float32),
+            "obs_frame": self._create_field("obs_frame", (self.max_size,), np.int64),
+            "obs2_frame": self._create_field("obs2_frame", (self.max_size,), np.int64),
+        }
+
+    def _named_arrays(self) -> dict:
+        return dict(super()._named_arrays(), **flatten_arrays(
+            {"frames." + k: v for k, v in self.frames.items()}
+        ))
+
+    def store(
+        self,
+        obs: np.ndarray,
+        act: np.ndarray,
+        rew: float,
+        done: bool,
+        info: dict,
+        next_obs: np.ndarray,
+        next_info: dict,
+        logp: np.ndarray,
+    ) -> None:
+        self.add_batch([Experience(obs, act, rew, done, info, next_obs, next_info, logp)])
+
+    def add_batch(self, samples: Union[list, dict]) -> None:
+        if not isinstance(samples, dict):
+            samples = stack_experiences(samples, list(self.additional_info.keys()))
+        self.store_columns(samples)
+
+    def store_columns(self, samples: dict) -> None:
+        batch_size = len(samples["rew"])
+        if batch_size > self.max_size:
+            samples = {k: v[batch_size - self.max_size:] for k, v in samples.items()}
+            batch_size = self.max_size
+        # a chunk writes at most two frames per transition, which must not wrap around
+        chunk_size = max(self.frame_size // 2, 1)
+        for start in range(0, batch_size, chunk_size):
+            self._store_chunk({k: v[start:start + chunk_size] for k, v in samples.items()})
+
+    def memory_info(self) -> dict:
+        info = super().memory_info()
+        info["fields"]["last_obs2_frames"] = int(self.last_obs2_frames.nbytes)
+        info["allocated"] += self.last_obs2_frames.nbytes
+        info["resident"] += self.last_obs2_frames.nbytes
+        info["bytes_per_transition"] = info["allocated"] / self.max_size
+        return info
+
+    def _store_chunk(self, samples: dict) -> None:
+        batch_size = len(samples["rew"])
+        info_keys = list(self.additional_info.keys())
+        obs = self._encode_obs(samples["obs"])
+        obs2 = self._encode_obs(samples["obs2"])
+        infos = [self._frame_values(k, samples[k], batch_size) for k in info_keys]
+        next_infos = [
+            self._frame_values(k, samples["next_" + k], batch_size) for k in info_keys
+        ]
+
+        # Candidates for the obs frame of row i are the next obs frames of the previous
+        # chunk and those of rows j < i, the latest one with equal content is reused.
+        prev_frames = self.last_obs2_frames
+        prev_slots = prev_frames % self.frame_size
+        num_prev = len(prev_frames)
+        rows = np.concatenate(
+            [
+                self._frame_rows(
+                    self.frames["obs"][prev_slots],
+                    [
+                        self._frame_values(k, self._take_frames(k, prev_slots), num_prev)
+                        for k in info_keys
+                    ],
+                ),
+                self._frame_rows(obs2, next_infos),
+                self._frame_rows(obs, infos),
+            ]
+        )
+        _, content = np.unique(self._fingerprints(rows), return_inverse=True)
+        content = content.ravel()
+        num_candidates = num_prev + batch_size
+        candidate_content, obs_content = content[:num_candidates], content[num_candidates:]
+        # keys sort candidates by content, then by position
+        keys = candidate_content * num_candidates + np.arange(num_candidates)
+        order = np.argsort(keys)
+        query = obs_content * num_candidates + num_prev + np.arange(batch_size)
+        latest = order[np.maximum(np.searchsorted(keys[order], query) - 1, 0)]
+        matched = candidate_content[latest] == obs_content
+        # rows with equal fingerprints are compared in full
+        matched[matched] = (
+            rows[latest[matched]] == rows[num_candidates + np.nonzero(matched)[0]]
+        ).all(axis=1)
+        # frames of the previous chunk older than this may be overwritten by this chunk
+        reuse_limit = self.frames_written + 2 * batch_size - self.frame_size
+        from_prev = matched & (latest < num_prev)
+        from_prev[from_prev] = prev_frames[latest[from_prev]] >= reuse_limit
+        from_chunk = matched & (latest >= num_prev)
+        new_obs_rows = np.nonzero(~(from_prev | from_chunk))[0]
+
+        # frames of new obs come before the next obs frames of this chunk, so the obs frame
+        # of a transition is never newer than its next obs frame
+        num_new = len(new_obs_rows)
+        obs2_frame = self.frames_written + num_new + np.arange(batch_size)
+        obs_frame = np.empty(batch_size, dtype=np.int64)
+        obs_frame[new_obs_rows] = self.frames_written + np.arange(num_new)
+        obs_frame[from_prev] = prev_frames[latest[from_prev]]
+        obs_frame[from_chunk] = obs2_frame[latest[from_chunk] - num_prev]
+
+        slots = obs_frame[new_obs_rows] % self.frame_size
+        self.frames["obs"][slots] = obs[new_obs_rows]
+        for k in info_keys:
+            self.frames[k][slots] = samples[k][new_obs_rows]
+        slots = obs2_frame % self.frame_size
+        self.frames["obs"][slots] = obs2
+        for k in info_keys:
+            self.frames[k][slots] = samples["next_" + k]
+        self.frames_written += num_new + batch_size
+        self.last_obs2_frames = obs2_frame
+
+        super().store_columns(
+            {
+                "act": samples["act"],
+                "rew": samples["rew"],
+                "done": samples["done"],
+                "logp": samples["logp"],
+                "obs_frame": obs_frame,
+                "obs2_frame": obs2_frame,
+            }
+        )
+
+        # evict the oldest transitions whose frames are overwritten
+        frame_limit = self.frames_written - self.frame_size
+        while self.size > 0:
+            n = min(self.size, 2 * batch_size)
+            oldest = (self.ptr - self.size + np.arange(n)) % self.max_size
+            alive = self.buf["obs_frame"][oldest] >= frame_limit
+            if alive.any():
+                self.size -= int(np.argmax(alive))
+                break
+            self.size -= n
+
+    def _take_frames(self, k: str, slots: np.ndarray):
+        v = self.frames[k]
+        return v[slots] if isinstance(v, np.ndarray) else v.take(slots)
+
+    def _frame_values(self, k: str, v, n: int) -> list:
+        """Arrays of n infos as laid out in their frames, e.g. the blocks of StateColumns."""
+        field = self.frames[k]
+        if isinstance(field, np.ndarray):
+            return [np.asarray(v, dtype=field.dtype)]
+        if not isinstance(v, StateColumns):
+            columns = StateColumns(
+                field.layout,
+                [
+                    np.empty((n, width), dtype=dtype)
+                    for dtype, width in zip(field.layout.dtypes, field.layout.widths)
+                ],
+            )
+            columns[:] = v
+            v = columns
+        return v.blocks
+
+    def _fingerprints(self, rows: np.ndarray) -> np.ndarray:
+        """Hash of every row of bytes, sorting them is much cheaper than sorting rows."""
+        words = rows.view(np.uint64)
+        if self.row_weights is None or len(self.row_weights) != words.shape[1]:
+            rng = np.random.default_rng(0)
+            self.row_weights = rng.integers(0, 2 ** 63, words.shape[1], dtype=np.uint64) | 1
+        return words @ self.row_weights
+
+    @staticmethod
+    def _frame_rows(obs: np.ndarray, infos: list) -> np.ndarray:
+        """Stored bytes of obs and infos, one row per frame, padded to whole words."""
+        leaves = [obs] + [leaf for values in infos for leaf in values]
+        parts = [
+            np.ascontiguousarray(v).reshape(len(v), int(np.prod(v.shape[1:]))).view(np.uint8)
+            for v in leaves
+        ]
+        width = sum(part.shape[1] for part in parts)
+        parts.append(np.zeros((len(obs), -width % 8), dtype=np.uint8))
+        return np.concatenate(parts, axis=1)
+
+    def sample_batch(self, batch_size: int) -> dict:
+        frame_limit = self.frames_written - self.frame_size
+        oldest = self.ptr - self.size
+        idxes = (oldest + np.random.randint(0, self.size, size=batch_size)) % self.max_size
+        stale = self.buf["obs_frame"][idxes] < frame_limit
+        while stale.any():
+            # transitions of interleaved episodes may lose their frames before older ones
+            idxes[stale] = (
+                oldest + np.random.randint(0, self.size, size=stale.sum())
+            ) % self.max_size
+            stale = self.buf["obs_frame"][idxes] < frame_limit
+        return self.get_batch(idxes)
+
+    def get_batch(self, idxes: np.ndarray) -> dict:
+        obs_slots = self.buf["obs_frame"][idxes] % self.frame_size
+        obs2_slots = self.buf["obs2_frame"][idxes] % self.frame_size
+        batch = {
+            "obs": torch.from_numpy(self._decode_obs(self.frames["obs"][obs_slots])),
+            "obs2": torch.from_numpy(self._decode_obs(self.frames["obs"][obs2_slots])),
+        }
+        for k in ("act", "rew", "done", "logp"):
+            batch[k] = torch.as_tensor(self.buf[k][idxes], dtype=torch.float32)
+        for k in self.additional_info.keys():
+            batch[k] = self._gather_frames(self.frames[k], obs_slots)
+            batch["next_" + k] = self._gather_frames(self.frames[k], obs2_slots)
+        return batch
+
+    @staticmethod
+    def _gather_frames(v, slots: np.ndarray):
+        if isinstance(v, np.ndarray):
+            return torch.as_tensor(v[slots], dtype=torch.float32)
+        return v.take(slots).tensor()
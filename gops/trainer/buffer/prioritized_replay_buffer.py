@@ -11,7 +11,7 @@
 #  Update: 2023-08-08, Zhilong Zheng: Make this compatible with new version of GOPS; Speed up sampling and updating
 
 
-from typing import Tuple
+from typing import Tuple, Union
 import numpy as np
 import torch
 from gops.trainer.buffer.replay_buffer import ReplayBuffer
@@ -37,16 +37,23 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                                           Defaults to 0.01.
     """
 
-    def __init__(self, index=0, **kwargs):
-        super().__init__(index, **kwargs)
+    snapshot_keys = ReplayBuffer.snapshot_keys + ("beta", "max_priority")
 
-        self.sum_tree = np.zeros(2 * self.max_size - 1)
-        self.min_tree = float("inf") * np.ones(2 * self.max_size - 1)
+    def __init__(self, index=0, **kwargs):
         self.alpha = 0.6  #TODO: make it specifiable?
         self.beta = 0.4
         self.beta_increment = 0.01
         self.epsilon = 1e-6
         self.max_priority = 1.0 ** self.alpha
+        super().__init__(index, **kwargs)
+
+        self.sum_tree = self._create_field("sum_tree", (2 * self.max_size - 1,), np.float64)
+        self.min_tree = self._create_field("min_tree", (2 * self.max_size - 1,), np.float64)
+        if not self.resumed:
+            self.min_tree[...] = float("inf")
+
+    def _named_arrays(self) -> dict:
+        return dict(super()._named_arrays(), sum_tree=self.sum_tree, min_tree=self.min_tree)
 
     def store(
         self,
@@ -59,21 +66,25 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         next_info: dict,
         logp: np.ndarray,
     ) -> None:
-        self.buf["obs"][self.ptr] = obs
-        self.buf["obs2"][self.ptr] = next_obs
-        self.buf["act"][self.ptr] = act
-        self.buf["rew"][self.ptr] = rew
-        self.buf["done"][self.ptr] = done
-        self.buf["logp"][self.ptr] = logp
-        for k in self.additional_info.keys():
-            self.buf[k][self.ptr] = info[k]
-            self.buf["next_" + k][self.ptr] = next_info[k]
         tree_idx = self.ptr + self.max_size - 1
+        super().store(obs, act, rew, done, info, next_obs, next_info, logp)
         self.sum_tree[tree_idx] = self.max_priority
         self.min_tree[tree_idx] = self.max_priority
         self.update_tree(tree_idx)
-        self.ptr = (self.ptr + 1) % self.max_size
-        self.size = min(self.size + 1, self.max_size)
+
+    def add_batch(self, samples: Union[list, dict]) -> None:
+        if isinstance(samples, dict):
+            batch_size = len(samples["rew"])
+        else:
+            batch_size = len(samples)
+        tree_idxes = (self.ptr + np.arange(batch_size)) % self.max_size + self.max_size - 1
+        if isinstance(samples, dict):
+            self.store_columns(samples)
+        else:
+            list(map(lambda sample: ReplayBuffer.store(self, *sample), samples))
+        self.sum_tree[tree_idxes] = self.max_priority
+        self.min_tree[tree_idxes] = self.max_priority
+        self.update_trees(tree_idxes)
 
     def update_tree(self, tree_idx: int) -> None:
         parent = (tree_idx - 1) // 2
@@ -86,6 +97,22 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                 break
             parent = (parent - 1) // 2
 
+    def update_trees(self, tree_idxes: np.ndarray) -> None:
+        """Refresh all ancestors of a batch of leaves, one tree level per iteration.
+
+        A node may be reached at several distances when leaves lie on different
+        depths; it is then refreshed once per distance, and the last refresh happens
+        after all of its children are final, so the result equals sequential updates.
+        """
+        nodes = np.unique((np.asarray(tree_idxes, dtype=np.int64) - 1) // 2)
+        nodes = nodes[nodes >= 0]
+        while nodes.size > 0:
+            left = 2 * nodes + 1
+            right = left + 1
+            self.sum_tree[nodes] = self.sum_tree[left] + self.sum_tree[right]
+            self.min_tree[nodes] = np.minimum(self.min_tree[left], self.min_tree[right])
+            nodes = np.unique((nodes[nodes > 0] - 1) // 2)
+
     def get_leaf(self, value: float) -> Tuple[int, float]:
         parent = 0
         while True:
@@ -102,29 +129,37 @@ class PrioritizedReplayBuffer(ReplayBuffer):
                     parent = right
         return idx, self.sum_tree[idx]
 
+    def get_leaves(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Descend the sum tree for all query values at once, one tree level per iteration."""
+        values = np.array(values, dtype=np.float64)
+        idxes = np.zeros(values.shape[0], dtype=np.int64)
+        active = np.arange(values.shape[0])
+        while active.size > 0:
+            left = 2 * idxes[active] + 1
+            not_leaf = left < len(self.sum_tree)
+            active, left = active[not_leaf], left[not_leaf]
+            left_sum = self.sum_tree[left]
+            go_left = values[active] <= left_sum
+            values[active] = np.where(go_left, values[active], values[active] - left_sum)
+            idxes[active] = np.where(go_left, left, left + 1)
+        return idxes, self.sum_tree[idxes]
+
     def sample_batch(self, batch_size: int) -> dict:
-        idxes, weights = np.zeros(batch_size, dtype=np.int32), np.zeros(batch_size)
         segment = self.sum_tree[0] / batch_size
         self.beta = min(1.0, self.beta + self.beta_increment)  #TODO: technically useless
         min_prob = self.min_tree[0] / self.sum_tree[0]
         max_weight = (min_prob * self.size) ** (-self.beta)
 
         values = np.random.uniform(np.arange(batch_size) * segment, np.arange(batch_size) * segment + segment)
-        idxes, priorities = zip(*map(self.get_leaf, values))
-        idxes = np.array(idxes, dtype=np.int32)
-        priorities = np.array(priorities)
+        idxes, priorities = self.get_leaves(values)
+        idxes = idxes.astype(np.int32)
         probs = priorities / self.sum_tree[0]
         weights = (probs * self.size) ** (-self.beta) / max_weight
 
-        batch = {}
         ptrs = idxes - self.max_size + 1
+        batch = self.get_batch(ptrs)
         batch["idx"] = torch.as_tensor(idxes, dtype=torch.int32)
         batch["weight"] = torch.as_tensor(weights, dtype=torch.float32)
-        for k, v in self.buf.items():
-            if isinstance(v, np.ndarray):
-                batch[k] = torch.as_tensor(v[ptrs], dtype=torch.float32)
-            else:
-                batch[k] = v[ptrs].array2tensor()
         return batch
 
     def update_batch(self, idxes: int, priorities: float) -> None:
@@ -136,16 +171,73 @@ class PrioritizedReplayBuffer(ReplayBuffer):
         self.sum_tree[idxes] = priorities
         self.min_tree[idxes] = priorities
         self.max_priority = max(self.max_priority, priorities.max())
+        self.update_trees(idxes)
+
 
-        idxes_to_update = {}  # lazy update to avoid redundancy
+if __name__ == "__main__":
+    # micro-benchmark of the batched sum tree against per-sample tree walks
+    import time
+
+    def update_batch_per_node(buffer, idxes, priorities):
+        priorities = (priorities + buffer.epsilon) ** buffer.alpha
+        buffer.sum_tree[idxes] = priorities
+        buffer.min_tree[idxes] = priorities
+        idxes_to_update = {}
         for idx in idxes:
-            while idx >= 0 and idx not in idxes_to_update:
+            while idx > 0 and idx not in idxes_to_update:
                 idxes_to_update[idx] = True
                 idx = (idx - 1) // 2
         for idx in sorted(idxes_to_update.keys(), reverse=True):
             parent = (idx - 1) // 2
             left = 2 * parent + 1
             right = left + 1
-            self.sum_tree[parent] = self.sum_tree[left] + self.sum_tree[right]
-            self.min_tree[parent] = min(self.min_tree[left], self.min_tree[right])
-
+            buffer.sum_tree[parent] = buffer.sum_tree[left] + buffer.sum_tree[right]
+            buffer.min_tree[parent] = min(buffer.min_tree[left], buffer.min_tree[right])
+
+    buffer_max_size, batch_size, repeat = int(1e6), 256, 20
+    buffers = [
+        PrioritizedReplayBuffer(
+            trainer="off_serial_trainer",
+            seed=0,
+            obsv_dim=1,
+            action_dim=1,
+            buffer_max_size=buffer_max_size,
+            additional_info={},
+        )
+        for _ in range(2)
+    ]
+    rng = np.random.default_rng(0)
+    leaves = np.arange(buffer_max_size) + buffer_max_size - 1
+    init_priorities = rng.uniform(0.0, 1.0, buffer_max_size)
+    for buffer in buffers:
+        buffer.size = buffer_max_size
+        buffer.sum_tree[leaves] = (init_priorities + buffer.epsilon) ** buffer.alpha
+        buffer.min_tree[leaves] = buffer.sum_tree[leaves]
+        buffer.update_trees(leaves)
+
+    t_scalar, t_batch = 0.0, 0.0
+    for _ in range(repeat):
+        segment = buffers[0].sum_tree[0] / batch_size
+        values = rng.uniform(np.arange(batch_size) * segment, np.arange(batch_size) * segment + segment)
+
+        start = time.perf_counter()
+        idxes_scalar, priorities_scalar = map(np.array, zip(*map(buffers[0].get_leaf, values)))
+        t_scalar += time.perf_counter() - start
+        start = time.perf_counter()
+        idxes_batch, priorities_batch = buffers[1].get_leaves(values)
+        t_batch += time.perf_counter() - start
+        assert np.array_equal(idxes_scalar, idxes_batch)
+        assert np.array_equal(priorities_scalar, priorities_batch)
+
+        new_priorities = rng.uniform(0.0, 1.0, batch_size)
+        start = time.perf_counter()
+        update_batch_per_node(buffers[0], idxes_scalar, new_priorities)
+        t_scalar += time.perf_counter() - start
+        start = time.perf_counter()
+        buffers[1].update_batch(idxes_batch, new_priorities)
+        t_batch += time.perf_counter() - start
+        assert np.array_equal(buffers[0].sum_tree, buffers[1].sum_tree)
+        assert np.array_equal(buffers[0].min_tree, buffers[1].min_tree)
+
+    print("per-sample tree walk: {:.3f} ms / step".format(t_scalar / repeat * 1000))
+    print("batched tree walk:    {:.3f} ms / step".format(t_batch / repeat * 1000))
@@ -10,10 +10,16 @@
 #  Update: 2021-03-05, Yuheng Lei: Create replay buffer
 
 
+import json
+import os
+from dataclasses import is_dataclass
+from typing import Union
+
 import numpy as np
-import sys
 import torch
+from gops.env.env_gen_ocp.pyth_base import field_names
 from gops.utils.common_utils import set_seed
+from gops.utils.state_columns import StateColumns
 
 __all__ = ["ReplayBuffer"]
 
@@ -24,52 +30,246 @@ def combined_shape(length: int, shape=None):
     return (length, shape) if np.isscalar(shape) else (length, *shape)
 
 
+def flatten_arrays(values: dict) -> dict:
+    """
+    Flatten a dict of arrays, States, ContextStates and StateColumns into arrays with
+    dotted names.
+    """
+    arrays = {}
+    stack = list(values.items())
+    while stack:
+        k, v = stack.pop(0)
+        if isinstance(v, np.ndarray):
+            arrays[k] = v
+        elif isinstance(v, StateColumns):
+            arrays.update(v.named_blocks(k))
+        elif is_dataclass(v):
+            stack.extend((k + "." + name, getattr(v, name)) for name in field_names(v))
+    return arrays
+
+
 class ReplayBuffer:
     """
     Implementation of replay buffer with uniform sampling probability.
+
+    Args:
+        buffer_preallocate (bool, optional): Gather sampled batches into reusable
+                                             preallocated tensors that keep the dtype
+                                             of each field. Defaults to False.
+        buffer_pin_memory (bool, optional): Allocate the reusable tensors in pinned
+                                            memory so that copies to GPU can be
+                                            asynchronous. Only used with
+                                            buffer_preallocate and CUDA.
+                                            Defaults to False.
+        buffer_storage (str, optional): Storage backend of the buffer fields, "ram" or
+                                        "memmap". With "memmap" every field is an
+                                        np.memmap file, so buffers larger than RAM live
+                                        in the page cache, and a buffer whose snapshot
+                                        is found in the storage directory is resumed.
+                                        Defaults to "ram".
+        buffer_storage_dir (str, optional): Directory of the memmap files, a previous
+                                            run's directory can be given to resume its
+                                            buffer. Defaults to save_folder.
+        buffer_obs_dtype (str, optional): Storage dtype of observations, "float32",
+                                          "float16" or "uint8". Batches are always
+                                          dequantized to float32. Defaults to "float32".
+        buffer_obs_range (tuple, optional): (low, high) of observations, scalars or
+                                            per dimension arrays, giving the scale of
+                                            uint8 storage. Required with "uint8".
     """
 
+    # attributes written into the header snapshot of a memmap buffer
+    snapshot_keys = ("ptr", "size")
+
     def __init__(self, index=0, **kwargs):
         set_seed(kwargs["trainer"], kwargs["seed"], index + 100)
         self.obsv_dim = kwargs["obsv_dim"]
         self.act_dim = kwargs["action_dim"]
         self.max_size = kwargs["buffer_max_size"]
-        self.buf = {
-            "obs": np.zeros(
-                combined_shape(self.max_size, self.obsv_dim), dtype=np.float32
-            ),
-            "obs2": np.zeros(
-                combined_shape(self.max_size, self.obsv_dim), dtype=np.float32
-            ),
-            "act": np.zeros(
-                combined_shape(self.max_size, self.act_dim), dtype=np.float32
-            ),
-            "rew": np.zeros(self.max_size, dtype=np.float32),
-            "done": np.zeros(self.max_size, dtype=np.float32),
-            "logp": np.zeros(self.max_size, dtype=np.float32),
-        }
+        self.storage = kwargs.get("buffer_storage", "ram")
+        if self.storage not in ("ram", "memmap"):
+            raise ValueError(f"Unknown buffer storage: {self.storage}")
+        self.storage_dir = None
+        self.resumed = False
+        if self.storage == "memmap":
+            self.storage_dir = os.path.join(
+                kwargs.get("buffer_storage_dir") or kwargs["save_folder"],
+                "buffer_{}".format(index),
+            )
+            os.makedirs(self.storage_dir, exist_ok=True)
+            self.resumed = os.path.exists(self._snapshot_path())
+        self.obs_dtype = np.dtype(kwargs.get("buffer_obs_dtype", "float32"))
+        self.obs_scale, self.obs_offset = None, None
+        if self.obs_dtype == np.uint8:
+            if kwargs.get("buffer_obs_range") is None:
+                raise ValueError("buffer_obs_range is required for uint8 observation storage!")
+            low, high = (np.asarray(x, dtype=np.float32) for x in kwargs["buffer_obs_range"])
+            self.obs_offset = low
+            self.obs_scale = np.where(high > low, (high - low) / 255, 1).astype(np.float32)
+        elif self.obs_dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported observation storage dtype: {self.obs_dtype}")
         self.additional_info = kwargs["additional_info"]
-        for k, v in self.additional_info.items():
-            if isinstance(v, dict):
-                self.buf[k] = np.zeros(
-                    combined_shape(self.max_size, v["shape"]), dtype=v["dtype"]
-                )
-                self.buf["next_" + k] = np.zeros(
-                    combined_shape(self.max_size, v["shape"]), dtype=v["dtype"]
-                )
-            else:
-                self.buf[k] = v.batch(self.max_size)
-                self.buf["next_" + k] = v.batch(self.max_size)
+        self.buf = self._create_transition_fields()
         self.ptr, self.size, = (
             0,
             0,
         )
+        if self.resumed:
+            self._load_snapshot()
+        self.preallocate = kwargs.get("buffer_preallocate", False)
+        self.pin_memory = kwargs.get("buffer_pin_memory", False) and torch.cuda.is_available()
+        self.batch_cache = {}
+        # CUDA events of pending asynchronous copies of the reusable tensors
+        self.copy_events = {}
 
     def __len__(self):
         return self.size
 
+    def _create_transition_fields(self) -> dict:
+        buf = {
+            "obs": self._create_field(
+                "obs", combined_shape(self.max_size, self.obsv_dim), self.obs_dtype
+            ),
+            "obs2": self._create_field(
+                "obs2", combined_shape(self.max_size, self.obsv_dim), self.obs_dtype
+            ),
+            "act": self._create_field(
+                "act", combined_shape(self.max_size, self.act_dim), np.float32
+            ),
+            "rew": self._create_field("rew", (self.max_size,), np.float32),
+            "done": self._create_field("done", (self.max_size,), np.float32),
+            "logp": self._create_field("logp", (self.max_size,), np.float32),
+        }
+        for k, v in self.additional_info.items():
+            buf[k] = self._create_info_field(k, v)
+            buf["next_" + k] = self._create_info_field("next_" + k, v)
+        return buf
+
+    def _create_info_field(self, name: str, v, length: int = None):
+        length = self.max_size if length is None else length
+        if isinstance(v, dict):
+            return self._create_field(name, combined_shape(length, v["shape"]), v["dtype"])
+        return self._create_state_field(name, v, length)
+
+    def _create_field(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        """Allocate storage of one buffer field, overridden by other storage backends."""
+        if self.storage == "ram":
+            return np.zeros(shape, dtype=dtype)
+        path = os.path.join(self.storage_dir, name + ".npy")
+        if self.resumed:
+            field = np.load(path, mmap_mode="r+")
+            if field.shape != tuple(shape) or field.dtype != np.dtype(dtype):
+                raise ValueError(
+                    f"Buffer field {name} in {self.storage_dir} has shape {field.shape} "
+                    f"and dtype {field.dtype}, expected {tuple(shape)} and {np.dtype(dtype)}!"
+                )
+            return field
+        # a new file is sparse, pages are only backed by disk once written
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+
+    def _encode_obs(self, obs: np.ndarray) -> np.ndarray:
+        if self.obs_dtype == np.float32:
+            return obs
+        if self.obs_scale is None:
+            return np.asarray(obs, dtype=self.obs_dtype)
+        q = np.rint((np.asarray(obs, dtype=np.float32) - self.obs_offset) / self.obs_scale)
+        return np.clip(q, 0, 255).astype(np.uint8)
+
+    def _decode_obs(self, q: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        if out is None:
+            out = np.empty(q.shape, dtype=np.float32)
+        if self.obs_scale is None:
+            np.copyto(out, q)
+        else:
+            np.multiply(q, self.obs_scale, out=out)
+            out += self.obs_offset
+        return out
+
+    def _create_state_field(self, name: str, v, length: int):
+        """
+        Allocate a State or ContextState field as StateColumns, i.e. one block per dtype
+        holding all leaves, filled with the template.
+        """
+        if isinstance(v, np.ndarray):
+            field = self._create_field(name, combined_shape(length, v.shape), v.dtype)
+            if not self.resumed:
+                field[...] = v
+            return field
+        elif is_dataclass(v):
+            field = StateColumns.allocate(
+                v,
+                (length,),
+                lambda block_name, shape, dtype: self._create_field(
+                    name + "." + block_name, shape, dtype
+                ),
+            )
+            # new storage is zeroed, writing a zero template would only commit its pages
+            if not self.resumed and any(np.any(leaf) for leaf in field.layout.split(v)):
+                field[...] = v
+            return field
+        else:
+            return v
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.storage_dir, "header.json")
+
+    def save_snapshot(self) -> None:
+        """
+        Flush memmap fields to disk and record the header, so that a later run
+        pointing buffer_storage_dir to the same directory resumes with the contents.
+        """
+        if self.storage != "memmap":
+            return
+        for v in self._named_arrays().values():
+            v.flush()
+        header = {k: getattr(self, k) for k in self.snapshot_keys}
+        header["max_size"] = self.max_size
+        tmp_path = self._snapshot_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f, default=lambda x: x.item())
+        os.replace(tmp_path, self._snapshot_path())
+
+    def _load_snapshot(self) -> None:
+        with open(self._snapshot_path()) as f:
+            header = json.load(f)
+        if header.pop("max_size") != self.max_size:
+            raise ValueError(
+                f"Buffer in {self.storage_dir} was saved with a different buffer_max_size!"
+            )
+        for k, v in header.items():
+            setattr(self, k, v)
+
+    def _named_arrays(self) -> dict:
+        """Arrays backing the buffer, State fields are flattened into dotted names."""
+        return flatten_arrays(self.buf)
+
     def __get_RAM__(self):
-        return int(sys.getsizeof(self.buf)) * self.size / (self.max_size * 1000000)
+        return self.memory_info()["resident"] / 1000000
+
+    def memory_info(self) -> dict:
+        """
+        Memory used by the buffer in bytes.
+
+        Returns:
+            dict with the allocated bytes of every array backing the buffer in "fields",
+            their sum in "allocated", the bytes of the rows holding stored transitions in
+            "resident" (untouched pages of zeroed or memmap storage are not committed), and
+            the allocated bytes amortized over the capacity in "bytes_per_transition".
+        """
+        field_bytes = {k: int(v.nbytes) for k, v in self._named_arrays().items()}
+        allocated = sum(field_bytes.values())
+        resident = 0
+        for k, v in self._named_arrays().items():
+            if v.ndim > 0 and len(v) == self.max_size:
+                resident += field_bytes[k] * len(self) // self.max_size
+            else:
+                resident += field_bytes[k]
+        return {
+            "fields": field_bytes,
+            "allocated": allocated,
+            "resident": resident,
+            "bytes_per_transition": allocated / self.max_size,
+        }
 
     def store(
         self,
@@ -82,8 +282,8 @@ class ReplayBuffer:
         next_info: dict,
         logp: np.ndarray,
     ) -> None:
-        self.buf["obs"][self.ptr] = obs
-        self.buf["obs2"][self.ptr] = next_obs
+        self.buf["obs"][self.ptr] = self._encode_obs(obs)
+        self.buf["obs2"][self.ptr] = self._encode_obs(next_obs)
         self.buf["act"][self.ptr] = act
         self.buf["rew"][self.ptr] = rew
         self.buf["done"][self.ptr] = done
@@ -94,15 +294,110 @@ class ReplayBuffer:
         self.ptr = (self.ptr + 1) % self.max_size
         self.size = min(self.size + 1, self.max_size)
 
-    def add_batch(self, samples: list) -> None:
-        list(map(lambda sample: self.store(*sample), samples))
+    def add_batch(self, samples: Union[list, dict]) -> None:
+        if isinstance(samples, dict):
+            self.store_columns(samples)
+        else:
+            list(map(lambda sample: self.store(*sample), samples))
+
+    def store_columns(self, samples: dict) -> None:
+        """
+        Store a batch of transitions given as a dict of stacked arrays keyed like
+        the buffer fields, with at most two slice assignments per field.
+        """
+        batch_size = len(samples["rew"])
+        if batch_size > self.max_size:
+            # only the latest max_size transitions survive the ring buffer
+            start = (self.ptr + batch_size - self.max_size) % self.max_size
+            samples = {k: v[batch_size - self.max_size:] for k, v in samples.items()}
+            self.ptr, batch_size = start, self.max_size
+        first = min(batch_size, self.max_size - self.ptr)
+        for k, v in samples.items():
+            if k in ("obs", "obs2"):
+                v = self._encode_obs(v)
+            self.buf[k][self.ptr:self.ptr + first] = v[:first]
+            if first < batch_size:
+                self.buf[k][:batch_size - first] = v[first:]
+        self.ptr = (self.ptr + batch_size) % self.max_size
+        self.size = min(self.size + batch_size, self.max_size)
 
     def sample_batch(self, batch_size: int) -> dict:
         idxes = np.random.randint(0, self.size, size=batch_size)
+        return self.get_batch(idxes)
+
+    def get_batch(self, idxes: np.ndarray) -> dict:
+        if self.preallocate:
+            return self._get_preallocated_batch(idxes)
         batch = {}
         for k, v in self.buf.items():
-            if isinstance(v, np.ndarray):
+            if k in ("obs", "obs2"):
+                batch[k] = torch.from_numpy(self._decode_obs(v[idxes]))
+            elif isinstance(v, np.ndarray):
                 batch[k] = torch.as_tensor(v[idxes], dtype=torch.float32)
             else:
-                batch[k] = v[idxes].array2tensor()
+                batch[k] = v.take(idxes).tensor()
         return batch
+
+    def _get_preallocated_batch(self, idxes: np.ndarray) -> dict:
+        batch_size = len(idxes)
+        if batch_size not in self.batch_cache:
+            leaves, decoded = [], []
+            batch = {}
+            for k, v in self.buf.items():
+                if k in ("obs", "obs2") and self.obs_dtype != np.float32:
+                    # gather stored observations into a scratch array, then dequantize
+                    scratch = np.empty((batch_size, *v.shape[1:]), dtype=v.dtype)
+                    batch[k] = torch.empty(
+                        scratch.shape, dtype=torch.float32, pin_memory=self.pin_memory
+                    )
+                    leaves.append((v, scratch))
+                    decoded.append((scratch, batch[k].numpy()))
+                else:
+                    batch[k] = self._preallocate_field(v, batch_size, leaves)
+            self.batch_cache[batch_size] = (batch, leaves, decoded)
+        batch, leaves, decoded = self.batch_cache[batch_size]
+        event = self.copy_events.pop(batch_size, None)
+        if event is not None:
+            # the previous batch may still be read by its copy to the GPU
+            event.synchronize()
+        for src, out in leaves:
+            np.take(src, idxes, axis=0, out=out)
+        for scratch, out in decoded:
+            self._decode_obs(scratch, out=out)
+        # tensors are reused across calls, the dict is not
+        return dict(batch)
+
+    def record_device_copy(self, batch_size: int) -> None:
+        """
+        Record that the last batch of batch_size is being copied to the GPU with
+        non_blocking=True, so that the next batch is not gathered into its pinned
+        tensors before the copy has finished.
+        """
+        if self.pin_memory and batch_size in self.batch_cache:
+            event = torch.cuda.Event()
+            event.record()
+            self.copy_events[batch_size] = event
+
+    def _preallocate_field(self, v, batch_size: int, leaves: list):
+        if isinstance(v, np.ndarray):
+            out = torch.empty(
+                (batch_size, *v.shape[1:]),
+                dtype=torch.from_numpy(v[:0]).dtype,
+                pin_memory=self.pin_memory,
+            )
+            leaves.append((v, out.numpy()))
+            return out
+        elif isinstance(v, StateColumns):
+            # e.g. State of gen-OCP envs, gathered block by block
+            outs = []
+            for block in v.blocks:
+                out = torch.empty(
+                    (batch_size, block.shape[-1]),
+                    dtype=torch.from_numpy(block[:0]).dtype,
+                    pin_memory=self.pin_memory,
+                )
+                leaves.append((block, out.numpy()))
+                outs.append(out)
+            return v.layout.build(outs)
+        else:
+            return v
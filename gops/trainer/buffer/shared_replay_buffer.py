@@ -0,0 +1,191 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Replay buffer in shared memory for parallel off-policy trainers
+
+
+import os
+import uuid
+from multiprocessing import shared_memory
+
+import numpy as np
+from gops.trainer.buffer.replay_buffer import ReplayBuffer
+
+__all__ = ["SharedReplayBuffer"]
+
+
+# shared memory blocks attached in this process, reused across unpickled handles
+_attached_blocks = {}
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    if name not in _attached_blocks:
+        block = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Attaching registers the block with the resource tracker of this process,
+            # which would unlink it when the process exits. Only the owner may unlink.
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(block._name, "shared_memory")
+        _attached_blocks[name] = block
+    return _attached_blocks[name]
+
+
+class SharedReplayBuffer(ReplayBuffer):
+    """
+    Implementation of replay buffer with uniform sampling probability whose fields live
+    in named shared memory blocks on the node.
+
+    The buffer is split into one ring segment per writer (sampler). The ptr and size of
+    each segment are kept in a shared header and are only written by the writer owning
+    that segment, so writers never need a lock and no buffer actor has to forward data.
+    Pickling the buffer, e.g. passing it to a Ray task, only ships the block names and
+    the receiving process attaches to the same memory. Readers may see transitions that
+    are being overwritten at the same time, which is tolerated for uniform replay.
+
+    Args:
+        num_samplers (int, optional): Number of writers, i.e. ring segments.
+                                      Defaults to 1.
+    """
+
+    def __init__(self, index=0, **kwargs):
+        for v in kwargs["additional_info"].values():
+            if not isinstance(v, dict):
+                raise NotImplementedError(
+                    "SharedReplayBuffer only supports additional_info given by shape and dtype!"
+                )
+        if kwargs.get("buffer_storage", "ram") != "ram":
+            raise NotImplementedError("SharedReplayBuffer only supports buffer_storage ram!")
+        self.num_segments = kwargs.get("num_samplers", 1)
+        self.segment_size = kwargs["buffer_max_size"] // self.num_segments
+        self.block_prefix = "gops_" + uuid.uuid4().hex[:12]
+        self.field_specs = {}
+        self.is_owner = True
+        self.writer = 0
+        kwargs = dict(kwargs, buffer_max_size=self.segment_size * self.num_segments)
+        try:
+            self.header = self._create_field("header", (self.num_segments, 2), np.int64)
+            self.header[...] = 0
+            super().__init__(index, **kwargs)
+        except BaseException:
+            # release the blocks created so far
+            self.close()
+            raise
+
+    def _create_field(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        block_name = "{}_{}".format(self.block_prefix, len(self.field_specs))
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        block = shared_memory.SharedMemory(name=block_name, create=True, size=max(nbytes, 1))
+        _attached_blocks[block_name] = block
+        self.field_specs[name] = (block_name, shape, dtype.str)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["buf"], state["header"], state["batch_cache"], state["copy_events"]
+        state["is_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.batch_cache = {}
+        self.copy_events = {}
+        arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=_attach_block(block_name).buf)
+            for name, (block_name, shape, dtype) in self.field_specs.items()
+        }
+        self.header = arrays.pop("header")
+        self.buf = arrays
+
+    def close(self) -> None:
+        """Detach from shared memory, and release it if this is the owning process."""
+        for block_name, _, _ in self.field_specs.values():
+            block = _attached_blocks.pop(block_name, None)
+            if block is None and self.is_owner:
+                # already detached by a handle unpickled in this process
+                block = shared_memory.SharedMemory(name=block_name)
+            if block is not None:
+                block.close()
+                if self.is_owner:
+                    block.unlink()
+        self.field_specs = {}
+
+    def set_writer(self, index: int) -> None:
+        self.writer = index % self.num_segments
+
+    @property
+    def ptr(self) -> int:
+        return int(self.header[self.writer, 0])
+
+    @ptr.setter
+    def ptr(self, value: int) -> None:
+        self.header[self.writer, 0] = value
+
+    @property
+    def size(self) -> int:
+        return int(self.header[self.writer, 1])
+
+    @size.setter
+    def size(self, value: int) -> None:
+        self.header[self.writer, 1] = value
+
+    def __len__(self):
+        return int(self.header[:, 1].sum())
+
+    def _named_arrays(self) -> dict:
+        return dict(super()._named_arrays(), header=self.header)
+
+    def store(
+        self,
+        obs: np.ndarray,
+        act: np.ndarray,
+        rew: float,
+        done: bool,
+        info: dict,
+        next_obs: np.ndarray,
+        next_info: dict,
+        logp: np.ndarray,
+    ) -> None:
+        ptr = self.ptr
+        slot = self.writer * self.segment_size + ptr
+        self.buf["obs"][slot] = self._encode_obs(obs)
+        self.buf["obs2"][slot] = self._encode_obs(next_obs)
+        self.buf["act"][slot] = act
+        self.buf["rew"][slot] = rew
+        self.buf["done"][slot] = done
+        self.buf["logp"][slot] = logp
+        for k in self.additional_info.keys():
+            self.buf[k][slot] = info[k]
+            self.buf["next_" + k][slot] = next_info[k]
+        # publish after the data is written
+        self.ptr = (ptr + 1) % self.segment_size
+        self.size = min(self.size + 1, self.segment_size)
+
+    def store_columns(self, samples: dict) -> None:
+        batch_size = len(samples["rew"])
+        ptr = self.ptr
+        if batch_size > self.segment_size:
+            ptr = (ptr + batch_size - self.segment_size) % self.segment_size
+            samples = {k: v[batch_size - self.segment_size:] for k, v in samples.items()}
+            batch_size = self.segment_size
+        slots = self.writer * self.segment_size + (ptr + np.arange(batch_size)) % self.segment_size
+        for k, v in samples.items():
+            if k in ("obs", "obs2"):
+                v = self._encode_obs(v)
+            self.buf[k][slots] = v
+        self.ptr = (ptr + batch_size) % self.segment_size
+        self.size = min(self.size + batch_size, self.segment_size)
+
+    def sample_batch(self, batch_size: int) -> dict:
+        sizes = self.header[:, 1].copy()
+        ends = np.cumsum(sizes)
+        positions = np.random.randint(0, ends[-1], size=batch_size)
+        segments = np.searchsorted(ends, positions, side="right")
+        idxes = segments * self.segment_size + positions - (ends - sizes)[segments]
+        return self.get_batch(idxes)
@@ -8,11 +8,11 @@
 
 
 import numpy as np
-import torch
 
 from gops.create_pkg.create_env import create_env
 from gops.create_pkg.create_alg import create_approx_contrainer
 from gops.utils.common_utils import set_seed
+from gops.utils.policy_actor import PolicyActor
 
 
 class Evaluator:
@@ -28,6 +28,9 @@ class Evaluator:
         _, self.env = set_seed(kwargs["trainer"], kwargs["seed"], index + 400, self.env)
 
         self.networks = create_approx_contrainer(**kwargs)
+        self.actor = PolicyActor(
+            self.networks, kwargs.get("policy_acting_backend", "eager")
+        )
         self.render = kwargs["is_render"]
 
         self.num_eval_episode = kwargs["num_eval_episode"]
@@ -41,6 +44,11 @@ class Evaluator:
 
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
+        self.actor.refresh()
+
+    def load_flat_weights(self, weights):
+        weights.load_into(self.networks)
+        self.actor.refresh()
 
     def run_an_episode(self, iteration, render=True):
         if self.print_iteration != iteration:
@@ -55,11 +63,7 @@ class Evaluator:
         done = 0
         info["TimeLimit.truncated"] = False
         while not (done or info["TimeLimit.truncated"]):
-            batch_obs = torch.from_numpy(np.expand_dims(obs, axis=0).astype("float32"))
-            logits = self.networks.policy(batch_obs)
-            action_distribution = self.networks.create_action_distributions(logits)
-            action = action_distribution.mode()
-            action = action.detach().numpy()[0]
+            action = self.actor.mode(np.expand_dims(obs, axis=0))[0]
             next_obs, reward, done, next_info = self.env.step(action)
             obs_list.append(obs)
             action_list.append(action)
@@ -25,6 +25,7 @@ from torch.utils.tensorboard import SummaryWriter
 
 from gops.utils.common_utils import random_choice_with_index
 from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.parameter_server import ParameterServer
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 
 warnings.filterwarnings("ignore")
@@ -36,6 +37,7 @@ class OffAsyncTrainer:
         self.samplers = sampler
         self.buffers = buffer
         self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
+        self.shared_buffer = kwargs["buffer_name"] == "shared_replay_buffer"
         if self.per_flag and kwargs["num_buffers"] > 1:
             raise RuntimeError(
                 "Using multiple prioritized_replay_buffers is not supported!"
@@ -58,6 +60,8 @@ class OffAsyncTrainer:
         # initialize center network
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
+        # samplers and evaluator pull the policy only, learners all networks
+        self.param_server = ParameterServer(self.networks)
 
         self.replay_batch_size = kwargs["replay_batch_size"]
         self.max_iteration = kwargs["max_iteration"]
@@ -81,16 +85,10 @@ class OffAsyncTrainer:
         self._set_samplers()
 
         self.warm_size = kwargs["buffer_warm_size"]
-        while not all(
-            [
-                l >= self.warm_size
-                for l in ray.get([rb.__len__.remote() for rb in self.buffers])
-            ]
-        ):
+        while not all([l >= self.warm_size for l in self._get_buffer_lens()]):
             for sampler, objID in list(self.sample_tasks.completed()):
-                batch_data, _ = ray.get(objID)
-                random.choice(self.buffers).add_batch.remote(batch_data)
-                self.sample_tasks.add(sampler, sampler.sample.remote())
+                self._store_samples(objID)
+                self._add_sample_task(sampler)
 
         # create alg tasks and start computing gradient
         self.learn_tasks = TaskPool()
@@ -108,16 +106,57 @@ class OffAsyncTrainer:
         self.start_time = time.time()
 
     def _set_samplers(self):
-        weights = self.networks.state_dict()
         for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
-            self.sample_tasks.add(sampler, sampler.sample.remote())
+            self.param_server.sync(sampler, "policy")
+            self._add_sample_task(sampler)
+
+    def _add_sample_task(self, sampler):
+        if self.shared_buffer:
+            # samplers write into the shared buffer themselves
+            task = sampler.sample_to_buffer.remote(self.buffers[0])
+        else:
+            task = sampler.sample.remote()
+        self.sample_tasks.add(sampler, task)
+
+    def _store_samples(self, objID) -> dict:
+        batch_data, sampler_tb_dict = ray.get(objID)
+        if not self.shared_buffer:
+            random.choice(self.buffers).add_batch.remote(batch_data)
+        return sampler_tb_dict
+
+    def _add_learn_task(self, alg):
+        if self.shared_buffer:
+            # algorithms sample from the shared buffer themselves
+            task = alg.get_remote_update_info_from_buffer.remote(
+                self.buffers[0], self.replay_batch_size, self.iteration
+            )
+        else:
+            data = ray.get(
+                random.choice(self.buffers).sample_batch.remote(self.replay_batch_size)
+            )
+            if self.use_gpu:
+                for k, v in data.items():
+                    data[k] = v.cuda()
+            task = alg.get_remote_update_info.remote(data, self.iteration)
+        self.learn_tasks.add(alg, task)
+
+    def _get_buffer_lens(self) -> list:
+        if self.shared_buffer:
+            return [len(self.buffers[0])]
+        return ray.get([rb.__len__.remote() for rb in self.buffers])
+
+    def _get_buffer_memory_info(self) -> list:
+        if self.shared_buffer:
+            return [self.buffers[0].memory_info()]
+        return ray.get([buffer.memory_info.remote() for buffer in self.buffers])
 
     def _set_algs(self):
-        weights = self.networks.state_dict()
         for alg in self.algs:
             alg.train.remote()
-            alg.load_state_dict.remote(weights)
+            self.param_server.sync(alg)
+            if self.shared_buffer:
+                self._add_learn_task(alg)
+                continue
             buffer, _ = random_choice_with_index(self.buffers)
             data = ray.get(buffer.sample_batch.remote(self.replay_batch_size))
             self.learn_tasks.add(
@@ -129,12 +168,10 @@ class OffAsyncTrainer:
         sampler_tb_dict = {}
         if self.iteration % self.sample_interval == 0:
             if self.sample_tasks.completed_num > 0:
-                weights = ray.put(self.networks.state_dict())
                 for sampler, objID in self.sample_tasks.completed():
-                    batch_data, sampler_tb_dict = ray.get(objID)
-                    random.choice(self.buffers).add_batch.remote(batch_data)
-                    sampler.load_state_dict.remote(weights)
-                    self.sample_tasks.add(sampler, sampler.sample.remote())
+                    sampler_tb_dict = self._store_samples(objID)
+                    self.param_server.sync(sampler, "policy")
+                    self._add_sample_task(sampler)
 
         # learning
         for alg, objID in self.learn_tasks.completed():
@@ -145,25 +182,17 @@ class OffAsyncTrainer:
             else:
                 alg_tb_dict, update_info = ray.get(objID)
 
-            # replay
-            data = ray.get(
-                random.choice(self.buffers).sample_batch.remote(self.replay_batch_size)
-            )
-            if self.use_gpu:
-                for k, v in data.items():
-                    data[k] = v.cuda()
-
-            weights = ray.put(self.networks.state_dict())
-            alg.load_state_dict.remote(weights)
-            self.learn_tasks.add(
-                alg, alg.get_remote_update_info.remote(data, self.iteration)
-            )
+            self.param_server.sync(alg)
+            self._add_learn_task(alg)
             if self.use_gpu:
                 for k, v in update_info.items():
                     if isinstance(v, list):
                         for i in range(len(v)):
                             update_info[k][i] = v[i].cpu()
+                    elif isinstance(v, torch.Tensor):
+                        update_info[k] = v.cpu()
             self.networks.remote_update(update_info)
+            self.param_server.new_version()
 
             self.iteration += 1
 
@@ -205,13 +234,15 @@ class OffAsyncTrainer:
                         + "/apprfunc/apprfunc_{}_opt.pkl".format(self.iteration),
                     )
 
+                buffer_memory = self._get_buffer_memory_info()
                 self.writer.add_scalar(
                     tb_tags["Buffer RAM of RL iteration"],
-                    sum(
-                        ray.get(
-                            [buffer.__get_RAM__.remote() for buffer in self.buffers]
-                        )
-                    ),
+                    sum(info["resident"] for info in buffer_memory) / 1000000,
+                    self.iteration,
+                )
+                self.writer.add_scalar(
+                    tb_tags["Buffer allocated RAM of RL iteration"],
+                    sum(info["allocated"] for info in buffer_memory) / 1000000,
                     self.iteration,
                 )
                 self.writer.add_scalar(
@@ -246,15 +277,23 @@ class OffAsyncTrainer:
 
         self.save_apprfunc()
         self.writer.flush()
+        if self.shared_buffer:
+            # release the shared memory of the buffer
+            self.buffers[0].close()
 
     def save_apprfunc(self):
         torch.save(
             self.networks.state_dict(),
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
+        # keep a memmap buffer resumable along with the networks
+        if self.shared_buffer:
+            self.buffers[0].save_snapshot()
+        else:
+            ray.get([buffer.save_snapshot.remote() for buffer in self.buffers])
 
     def _add_eval_task(self):
-        self.evaluator.load_state_dict.remote(self.networks.state_dict())
+        self.param_server.sync(self.evaluator, "policy")
         self.evluate_tasks.add(
             self.evaluator,
             self.evaluator.run_evaluation.remote(self.iteration)
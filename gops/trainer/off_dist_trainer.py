@@ -0,0 +1,345 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Data-parallel trainer for off-policy RL algorithms on CPU cores
+
+__all__ = ["OffDistTrainer"]
+
+from cmath import inf
+import os
+import socket
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.utils.tensorboard import SummaryWriter
+
+from gops.utils.common_utils import seed_everything
+from gops.utils.execution_backend import get
+from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.tensorboard_setup import add_scalars, tb_tags
+
+
+class OffDistTrainer:
+    """
+    Data-parallel trainer for off-policy RL algorithms on the CPU cores of one node.
+
+    num_learners learner processes, connected by torch.distributed with the gloo
+    backend, each own an algorithm, a sampler and a buffer. In every iteration, each
+    learner computes the update info of the algorithm, e.g. gradients, on its own
+    replay batch. The tensors of the update info are averaged over learners by
+    all-reducing flattened buckets of dist_bucket_size bytes, and every learner
+    applies the same update locally, so networks stay identical and weights never
+    pass through the driver. The driver process is learner 0, which starts the
+    other learners and also logs, evaluates and saves.
+
+    Args:
+        num_learners (int, optional): number of learner processes. Defaults to 2.
+        learner_num_threads (int, optional): torch threads per learner. Defaults to 1.
+        dist_bucket_size (int, optional): bytes per all-reduce bucket. Defaults to 2 ** 22.
+        dist_init_method (str, optional): torch.distributed init method.
+                                          Defaults to a free local TCP port.
+    """
+
+    def __init__(self, alg, sampler, buffer, evaluator, rank=0, **kwargs):
+        if kwargs["use_gpu"]:
+            raise ValueError("OffDistTrainer runs learners on CPU!")
+        self.rank = rank
+        self.world_size = kwargs.get("num_learners", 2)
+        self.bucket_size = kwargs.get("dist_bucket_size", 2 ** 22)
+        torch.set_num_threads(kwargs.get("learner_num_threads", 1))
+
+        self.alg = alg
+        self.sampler = sampler
+        self.buffer = buffer
+        self.per_flag = kwargs["buffer_name"] == "prioritized_replay_buffer"
+        self.evaluator = evaluator
+
+        # create center network
+        self.networks = self.alg.networks
+        self.sampler.set_networks(self.networks)
+
+        # initialize center network
+        if kwargs["ini_network_dir"] is not None:
+            self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
+
+        self.replay_batch_size = kwargs["replay_batch_size"]
+        self.max_iteration = kwargs["max_iteration"]
+        self.sample_interval = kwargs.get("sample_interval", 1)
+        self.log_save_interval = kwargs["log_save_interval"]
+        self.apprfunc_save_interval = kwargs["apprfunc_save_interval"]
+        self.eval_interval = kwargs["eval_interval"]
+        self.best_tar = -inf
+        self.save_folder = kwargs["save_folder"]
+        self.iteration = 0
+
+        # start the other learners, which join the process group
+        self.workers = []
+        if self.rank == 0:
+            if kwargs.get("dist_init_method") is None:
+                kwargs["dist_init_method"] = "tcp://127.0.0.1:{}".format(_free_port())
+            ctx = mp.get_context("spawn")
+            for worker_rank in range(1, self.world_size):
+                worker = ctx.Process(
+                    target=_run_learner, args=(worker_rank, kwargs), daemon=True
+                )
+                worker.start()
+                self.workers.append(worker)
+        dist.init_process_group(
+            "gloo",
+            init_method=kwargs["dist_init_method"],
+            rank=self.rank,
+            world_size=self.world_size,
+        )
+        # all learners start from the networks of learner 0
+        _broadcast(list(self.networks.state_dict().values()), self.bucket_size)
+
+        if self.rank == 0:
+            self.writer = SummaryWriter(log_dir=self.save_folder, flush_secs=20)
+            # flush tensorboard at the beginning
+            add_scalars(
+                {tb_tags["alg_time"]: 0, tb_tags["sampler_time"]: 0}, self.writer, 0
+            )
+            self.writer.flush()
+
+        # pre sampling
+        while self.buffer.size < kwargs["buffer_warm_size"]:
+            samples, _ = self.sampler.sample()
+            self.buffer.add_batch(samples)
+
+        # create evaluation tasks
+        self.evluate_tasks = TaskPool()
+        self.last_eval_iteration = 0
+
+        self.start_time = time.time()
+
+    def step(self):
+        # sampling
+        sampler_tb_dict = {}
+        if self.iteration % self.sample_interval == 0:
+            sampler_samples, sampler_tb_dict = self.sampler.sample()
+            self.buffer.add_batch(sampler_samples)
+
+        # replay
+        replay_samples = self.buffer.sample_batch(self.replay_batch_size)
+
+        # learning
+        self.networks.train()
+        if self.per_flag:
+            extra_info, update_info = self.alg.get_remote_update_info(
+                replay_samples, self.iteration
+            )
+            alg_tb_dict, idx, new_priority = extra_info
+            self.buffer.update_batch(idx, new_priority)
+        else:
+            alg_tb_dict, update_info = self.alg.get_remote_update_info(
+                replay_samples, self.iteration
+            )
+        start_time = time.perf_counter()
+        _all_reduce_mean(update_info, self.world_size, self.bucket_size)
+        alg_tb_dict[tb_tags["allreduce_time"]] = (time.perf_counter() - start_time) * 1000
+        self.alg.remote_update(update_info)
+        self.networks.eval()
+
+        if self.rank != 0:
+            return
+
+        # log
+        if self.iteration % self.log_save_interval == 0:
+            print("Iter = ", self.iteration)
+            add_scalars(alg_tb_dict, self.writer, step=self.iteration)
+            add_scalars(sampler_tb_dict, self.writer, step=self.iteration)
+
+        # save
+        if self.iteration % self.apprfunc_save_interval == 0:
+            self.save_apprfunc()
+
+        # evaluate
+        if self.iteration - self.last_eval_iteration >= self.eval_interval:
+            if self.evluate_tasks.count == 0:
+                # There is no evaluation task, add one.
+                self._add_eval_task()
+            elif self.evluate_tasks.completed_num == 1:
+                # Evaluation tasks is completed, log data and add another one.
+                objID = next(self.evluate_tasks.completed())[1]
+                total_avg_return = get(objID)
+                self._add_eval_task()
+
+                if (
+                    total_avg_return >= self.best_tar
+                    and self.iteration >= self.max_iteration / 5
+                ):
+                    self.best_tar = total_avg_return
+                    print("Best return = {}!".format(str(self.best_tar)))
+
+                    for filename in os.listdir(self.save_folder + "/apprfunc/"):
+                        if filename.endswith("_opt.pkl"):
+                            os.remove(self.save_folder + "/apprfunc/" + filename)
+
+                    torch.save(
+                        self.networks.state_dict(),
+                        self.save_folder
+                        + "/apprfunc/apprfunc_{}_opt.pkl".format(self.iteration),
+                    )
+
+                buffer_memory = self.buffer.memory_info()
+                self.writer.add_scalar(
+                    tb_tags["Buffer RAM of RL iteration"],
+                    buffer_memory["resident"] * self.world_size / 1000000,
+                    self.iteration,
+                )
+                self.writer.add_scalar(
+                    tb_tags["Buffer allocated RAM of RL iteration"],
+                    buffer_memory["allocated"] * self.world_size / 1000000,
+                    self.iteration,
+                )
+                self.writer.add_scalar(
+                    tb_tags["TAR of RL iteration"], total_avg_return, self.iteration
+                )
+                self.writer.add_scalar(
+                    tb_tags["TAR of replay samples"],
+                    total_avg_return,
+                    self.iteration * self.replay_batch_size * self.world_size,
+                )
+                self.writer.add_scalar(
+                    tb_tags["TAR of total time"],
+                    total_avg_return,
+                    int(time.time() - self.start_time),
+                )
+                self.writer.add_scalar(
+                    tb_tags["TAR of collected samples"],
+                    total_avg_return,
+                    self.sampler.get_total_sample_number() * self.world_size,
+                )
+
+    def train(self):
+        while self.iteration < self.max_iteration:
+            self.step()
+            self.iteration += 1
+
+        if self.rank == 0:
+            self.save_apprfunc()
+            self.writer.flush()
+        dist.barrier()
+        dist.destroy_process_group()
+        for worker in self.workers:
+            worker.join()
+
+    def save_apprfunc(self):
+        torch.save(
+            self.networks.state_dict(),
+            self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
+        )
+        # keep a memmap buffer resumable along with the networks
+        self.buffer.save_snapshot()
+
+    def _add_eval_task(self):
+        self.evaluator.load_state_dict.remote(self.networks.state_dict())
+        self.evluate_tasks.add(
+            self.evaluator,
+            self.evaluator.run_evaluation.remote(self.iteration)
+        )
+        self.last_eval_iteration = self.iteration
+
+
+def _run_learner(rank: int, kwargs: dict):
+    """Entry of learner processes other than learner 0."""
+    from gops.create_pkg.create_alg import create_alg
+    from gops.create_pkg.create_buffer import create_buffer
+    from gops.create_pkg.create_sampler import create_sampler
+
+    # learners explore and replay differently, networks are synchronized anyway
+    kwargs = dict(kwargs, seed=kwargs["seed"] + rank)
+    seed_everything(kwargs["seed"])
+    alg = create_alg(**kwargs)
+    sampler = create_sampler(**kwargs)
+    buffer = create_buffer(**dict(kwargs, index=rank))
+    OffDistTrainer(alg, sampler, buffer, None, rank=rank, **kwargs).train()
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _buckets(tensors: list, bucket_size: int):
+    """Consecutive groups of tensors of the same dtype of at most bucket_size bytes."""
+    bucket, nbytes = [], 0
+    for t in tensors:
+        size = t.numel() * t.element_size()
+        if bucket and (t.dtype != bucket[0].dtype or nbytes + size > bucket_size):
+            yield bucket
+            bucket, nbytes = [], 0
+        bucket.append(t)
+        nbytes += size
+    if bucket:
+        yield bucket
+
+
+def _update_values(update_info: dict) -> list:
+    values = []
+    for k in sorted(update_info.keys()):
+        v = update_info[k]
+        values.extend(v if isinstance(v, (list, tuple)) else [v])
+    return values
+
+
+def _update_tensors(update_info: dict) -> list:
+    return [
+        t for t in _update_values(update_info)
+        if isinstance(t, torch.Tensor) and t.is_floating_point()
+    ]
+
+
+def _check_update_structure(update_info: dict):
+    """
+    Raise if update info differs in structure across learners, e.g. a gradient which is
+    None on some learners only, as their buckets would not match in the all-reduce.
+    """
+    sizes = torch.tensor(
+        [
+            t.numel() if isinstance(t, torch.Tensor) and t.is_floating_point() else 0
+            for t in _update_values(update_info)
+            if t is None or isinstance(t, torch.Tensor)
+        ],
+        dtype=torch.float64,
+    )
+    # maximum and negated minimum over learners in one all-reduce
+    bounds = torch.cat([sizes, -sizes])
+    dist.all_reduce(bounds, op=dist.ReduceOp.MAX)
+    if not torch.equal(bounds[:len(sizes)], -bounds[len(sizes):]):
+        raise RuntimeError(
+            "Update info differs in structure across learners, e.g. gradients are None "
+            "on some learners only, and cannot be averaged!"
+        )
+
+
+def _all_reduce_mean(update_info: dict, world_size: int, bucket_size: int):
+    """Average the tensors of update info over all learners in place."""
+    _check_update_structure(update_info)
+    for bucket in _buckets(_update_tensors(update_info), bucket_size):
+        flat = torch.cat([t.detach().reshape(-1) for t in bucket])
+        dist.all_reduce(flat)
+        flat /= world_size
+        offset = 0
+        for t in bucket:
+            t.detach().copy_(flat[offset:offset + t.numel()].view_as(t))
+            offset += t.numel()
+
+
+def _broadcast(tensors: list, bucket_size: int):
+    """Broadcast tensors of learner 0 to all learners in place."""
+    for bucket in _buckets(tensors, bucket_size):
+        flat = torch.cat([t.detach().reshape(-1) for t in bucket])
+        dist.broadcast(flat, 0)
+        offset = 0
+        for t in bucket:
+            t.detach().copy_(flat[offset:offset + t.numel()].view_as(t))
+            offset += t.numel()
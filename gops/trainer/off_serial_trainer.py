@@ -17,11 +17,11 @@ from cmath import inf
 import os
 import time
 
-import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
 from gops.utils.common_utils import ModuleOnDevice
+from gops.utils.execution_backend import get
 from gops.utils.parallel_task_manager import TaskPool
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 
@@ -36,7 +36,7 @@ class OffSerialTrainer:
 
         # create center network
         self.networks = self.alg.networks
-        self.sampler.networks = self.networks
+        self.sampler.set_networks(self.networks)
 
         # initialize center network
         if kwargs["ini_network_dir"] is not None:
@@ -88,7 +88,12 @@ class OffSerialTrainer:
         # learning
         if self.use_gpu:
             for k, v in replay_samples.items():
-                replay_samples[k] = v.cuda()
+                if isinstance(v, torch.Tensor):
+                    # asynchronous when the buffer gathers into pinned memory
+                    replay_samples[k] = v.cuda(non_blocking=True)
+                else:
+                    replay_samples[k] = v.cuda()
+            self.buffer.record_device_copy(self.replay_batch_size)
 
         self.networks.train()
         if self.per_flag:
@@ -118,7 +123,7 @@ class OffSerialTrainer:
             elif self.evluate_tasks.completed_num == 1:
                 # Evaluation tasks is completed, log data and add another one.
                 objID = next(self.evluate_tasks.completed())[1]
-                total_avg_return = ray.get(objID)
+                total_avg_return = get(objID)
                 self._add_eval_task()
 
                 if (
@@ -138,9 +143,15 @@ class OffSerialTrainer:
                         + "/apprfunc/apprfunc_{}_opt.pkl".format(self.iteration),
                     )
 
+                buffer_memory = self.buffer.memory_info()
                 self.writer.add_scalar(
                     tb_tags["Buffer RAM of RL iteration"],
-                    self.buffer.__get_RAM__(),
+                    buffer_memory["resident"] / 1000000,
+                    self.iteration,
+                )
+                self.writer.add_scalar(
+                    tb_tags["Buffer allocated RAM of RL iteration"],
+                    buffer_memory["allocated"] / 1000000,
                     self.iteration,
                 )
                 self.writer.add_scalar(
@@ -175,6 +186,8 @@ class OffSerialTrainer:
             self.networks.state_dict(),
             self.save_folder + "/apprfunc/apprfunc_{}.pkl".format(self.iteration),
         )
+        # keep a memmap buffer resumable along with the networks
+        self.buffer.save_snapshot()
 
     def _add_eval_task(self):
         with ModuleOnDevice(self.networks, "cpu"):
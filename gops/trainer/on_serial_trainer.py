@@ -17,11 +17,11 @@ from cmath import inf
 import os
 import time
 
-import ray
 import torch
 from torch.utils.tensorboard import SummaryWriter
 
 from gops.utils.common_utils import ModuleOnDevice
+from gops.utils.execution_backend import get
 from gops.utils.parallel_task_manager import TaskPool
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 
@@ -34,7 +34,7 @@ class OnSerialTrainer:
 
         # create center network
         self.networks = self.alg.networks
-        self.sampler.networks = self.networks
+        self.sampler.set_networks(self.networks)
 
         # initialize center network
         if kwargs["ini_network_dir"] is not None:
@@ -99,7 +99,7 @@ class OnSerialTrainer:
             elif self.evluate_tasks.completed_num == 1:
                 # Evaluation tasks is completed, log data and add another one.
                 objID = next(self.evluate_tasks.completed())[1]
-                total_avg_return = ray.get(objID)
+                total_avg_return = get(objID)
                 self._add_eval_task()
 
                 if (
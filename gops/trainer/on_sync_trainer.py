@@ -23,6 +23,7 @@ import torch
 from torch.utils.tensorboard import SummaryWriter
 
 from gops.utils.parallel_task_manager import TaskPool
+from gops.utils.parameter_server import ParameterServer
 from gops.utils.tensorboard_setup import add_scalars, tb_tags
 
 warnings.filterwarnings("ignore")
@@ -50,6 +51,8 @@ class OnSyncTrainer:
         # initialize center network
         if kwargs["ini_network_dir"] is not None:
             self.networks.load_state_dict(torch.load(kwargs["ini_network_dir"]))
+        # on-policy samplers also need the value network, the evaluator the policy only
+        self.param_server = ParameterServer(self.networks)
 
         self.max_iteration = kwargs["max_iteration"]
         self.log_save_interval = kwargs["log_save_interval"]
@@ -79,9 +82,8 @@ class OnSyncTrainer:
 
     def step(self):
         # sampling
-        weights = ray.put(self.networks.state_dict())
         for sampler in self.samplers:
-            sampler.load_state_dict.remote(weights)
+            self.param_server.sync(sampler)
         samples, sampler_tb_dict = zip(
             *ray.get(
                 [
@@ -99,6 +101,7 @@ class OnSyncTrainer:
                 all_samples[k] = v.cuda()
         alg_tb_dict = self.alg.local_update(all_samples, self.iteration)
         self.networks.load_state_dict(self.alg.state_dict())
+        self.param_server.new_version()
 
         # log
         if self.iteration % self.log_save_interval == 0:
@@ -174,7 +177,7 @@ class OnSyncTrainer:
         )
 
     def _add_eval_task(self):
-        self.evaluator.load_state_dict.remote(self.networks.state_dict())
+        self.param_server.sync(self.evaluator, "policy")
         self.evluate_tasks.add(
             self.evaluator,
             self.evaluator.run_evaluation.remote(self.iteration)
@@ -15,13 +15,13 @@ from typing import List, NamedTuple, Tuple, Union
 import time
 
 import numpy as np
-import torch
 
 from gops.create_pkg.create_env import create_env
 from gops.create_pkg.create_alg import create_approx_contrainer
 from gops.env.vector.vector_env import VectorEnv
 from gops.utils.common_utils import set_seed
 from gops.utils.explore_noise import GaussNoise, EpsilonGreedy
+from gops.utils.policy_actor import PolicyActor
 from gops.utils.tensorboard_setup import tb_tags
 
 
@@ -36,6 +36,53 @@ class Experience(NamedTuple):
     logp: float
 
 
+def stack_experiences(experiences: List[Experience], info_keys) -> dict:
+    """
+    Convert a list of transitions to a dict of stacked arrays keyed like replay buffer
+    fields, so that buffers can ingest the whole batch with slice assignments.
+    """
+    obs, action, reward, done, info, next_obs, next_info, logp = zip(*experiences)
+    data = {
+        "obs": np.stack(obs),
+        "act": np.stack(action),
+        "rew": np.array(reward, dtype=np.float32),
+        "done": np.array(done, dtype=np.float32),
+        "obs2": np.stack(next_obs),
+        "logp": np.array(logp, dtype=np.float32),
+    }
+    for k in info_keys:
+        data[k] = _stack_info([i[k] for i in info])
+        data["next_" + k] = _stack_info([i[k] for i in next_info])
+    return data
+
+
+def _stack_info(values: list):
+    # structured infos (e.g. State of gen-OCP envs) provide their own stack method
+    if hasattr(values[0], "stack"):
+        return type(values[0]).stack(values)
+    return np.stack(values)
+
+
+def stack_column(values: np.ndarray):
+    """Stack a batched info of a vector env into one array."""
+    # batched infos of vector env are object arrays unless the info is a scalar
+    if values.dtype == object:
+        return _stack_info(list(values))
+    return values
+
+
+def concat_columns(batches: List[dict]) -> dict:
+    """Concatenate dicts of stacked transitions, e.g. of successive steps."""
+    data = {}
+    for k in batches[0].keys():
+        values = [batch[k] for batch in batches]
+        if hasattr(values[0], "concat"):
+            data[k] = type(values[0]).concat(values)
+        else:
+            data[k] = np.concatenate(values)
+    return data
+
+
 class BaseSampler(metaclass=ABCMeta):
     def __init__(
         self, 
@@ -44,9 +91,13 @@ class BaseSampler(metaclass=ABCMeta):
         noise_params=None,
         **kwargs
     ):
+        self.index = index
         self.env = create_env(**kwargs)
         _, self.env = set_seed(kwargs["trainer"], kwargs["seed"], index + 200, self.env)  #? seed here?
         self.networks = create_approx_contrainer(**kwargs)
+        self.actor = PolicyActor(
+            self.networks, kwargs.get("policy_acting_backend", "eager")
+        )
         self.noise_params = noise_params
         self.sample_batch_size = sample_batch_size
         if isinstance(self.env, VectorEnv):
@@ -61,6 +112,7 @@ class BaseSampler(metaclass=ABCMeta):
             self.num_envs = 1
             self.horizon = self.sample_batch_size
         self.action_type = kwargs["action_type"]
+        self.info_keys = list(kwargs["additional_info"].keys())
         self.reward_scale = 1.0  #? why hard-coded?
         if self.noise_params is not None:
             if self.action_type == "continu":
@@ -71,14 +123,21 @@ class BaseSampler(metaclass=ABCMeta):
         self.total_sample_number = 0
         self.obs, self.info = self.env.reset()
         if self._is_vector:
-            # convert a dict of batched data to a list of dict of unbatched data
-            # e.g. next_info = {"a": [1, 2, 3], "b": [4, 5, 6]} ->
-            #      unbatched_infos = [{"a": 1, "b": 4}, {"a": 2, "b": 5}, {"a": 3, "b": 6}]
-            # ref: https://stackoverflow.com/questions/5558418/list-of-dicts-to-from-dict-of-lists
-            self.info = [dict(zip(self.info, t)) for t in zip(*self.info.values())] if self.info else [{}] * self.num_envs
+            # keep infos of vector env as (num_envs, ...) columns of the additional info keys
+            self.info = {k: stack_column(self.info[k]) for k in self.info_keys}
+
+    def set_networks(self, networks):
+        """Act with networks, e.g. the center networks of a serial trainer, from now on."""
+        self.networks = networks
+        self.actor = PolicyActor(networks, self.actor.backend)
 
     def load_state_dict(self, state_dict):
         self.networks.load_state_dict(state_dict)
+        self.actor.refresh()
+
+    def load_flat_weights(self, weights):
+        weights.load_into(self.networks)
+        self.actor.refresh()
 
     def sample(self) -> Tuple[Union[List[Experience], dict], dict]:
         self.total_sample_number += self.sample_batch_size
@@ -91,6 +150,13 @@ class BaseSampler(metaclass=ABCMeta):
         tb_info[tb_tags["sampler_time"]] = (end_time - start_time) * 1000
         return data, tb_info
     
+    def sample_to_buffer(self, buffer) -> Tuple[None, dict]:
+        """Sample and write the batch into a buffer in shared memory, only tb info is returned."""
+        data, tb_info = self.sample()
+        buffer.set_writer(self.index)
+        buffer.add_batch(data)
+        return None, tb_info
+
     @abstractmethod
     def _sample(self) -> Union[List[Experience], dict]:
         pass
@@ -98,90 +164,95 @@ class BaseSampler(metaclass=ABCMeta):
     def get_total_sample_number(self) -> int:
         return self.total_sample_number
     
-    def _step(self) -> List[Experience]:
-        # take action using behavior policy
+    def _act(self, obs: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # take action using behavior policy, for obs of some vector envs if given
         if not self._is_vector:
-            batch_obs = torch.from_numpy(
-                np.expand_dims(self.obs, axis=0).astype("float32")
-            )
-        else:
-            batch_obs = torch.from_numpy(self.obs.astype("float32"))
-        logits = self.networks.policy(batch_obs)
-        action_distribution = self.networks.create_action_distributions(logits)
-        action, logp = action_distribution.sample()
-
-        if self._is_vector:
-            action = action.detach().numpy()
-            logp = logp.detach().numpy()
+            action, logp = self.actor.sample(np.expand_dims(self.obs, axis=0))
+            action, logp = action[0], logp[0]
         else:
-            action = action.detach()[0].numpy()
-            logp = logp.detach()[0].numpy()
+            action, logp = self.actor.sample(self.obs if obs is None else obs)
 
         if self.noise_params is not None:
             action = self.noise_processor.sample(action)
         
         if self.action_type == "continu":
-            action_clip = action.clip(
-                self.env.action_space.low, self.env.action_space.high
-            )
+            space = self.env.single_action_space if self._is_vector else self.env.action_space
+            action_clip = action.clip(space.low, space.high)
         else:
             action_clip = action
-        
+        return action, logp, action_clip
+
+    def _step_columns(self) -> Tuple[dict, np.ndarray]:
+        """
+        Take one step in all environments, keeping the transitions as (num_envs, ...)
+        arrays keyed like replay buffer fields, so that the per-step Python work does
+        not grow with the number of vector envs.
+
+        Returns:
+            dict of transitions and truncation flags of shape (num_envs,).
+        """
+        if not self._is_vector:
+            experiences = self._step()
+            truncated = np.array([experiences[0].next_info["TimeLimit.truncated"]])
+            return stack_experiences(experiences, self.info_keys), truncated
+
+        action, logp, action_clip = self._act()
+        next_obs, reward, terminated, truncated, next_info = self.env.step(action_clip)
+        # Vector env resets finished environments automatically, their real final
+        # observations and infos are kept in next_info and masked by "_final_observation".
+        final_index = np.nonzero(next_info.get("_final_observation", np.zeros(0)))[0]
+        obs2 = next_obs
+        if len(final_index) > 0:
+            obs2 = next_obs.copy()
+            obs2[final_index] = np.stack(next_info["final_observation"][final_index])
+        data = {
+            "obs": self.obs,
+            "act": action,
+            "rew": np.asarray(reward, dtype=np.float32),
+            "done": np.asarray(terminated, dtype=np.float32),
+            "obs2": obs2,
+            "logp": np.asarray(logp, dtype=np.float32),
+        }
+        for k in self.info_keys:
+            values = next_info[k]
+            final_values = values
+            if len(final_index) > 0:
+                final_values = values.copy()
+                for i in final_index:
+                    final_values[i] = next_info["final_info"][i][k]
+            data[k] = self.info[k]
+            data["next_" + k] = stack_column(final_values)
+            self.info[k] = stack_column(values)
+        self.obs = next_obs
+        return data, np.asarray(truncated, dtype=np.bool_)
+
+    def _step(self) -> List[Experience]:
+        """Take one step in a single environment."""
+        action, logp, action_clip = self._act()
+
         # interact with environment
-        if self._is_vector:
-            next_obs, reward, terminated, truncated, next_info = self.env.step(action_clip)
-            # For vector env, next_obs, reward, terminated, truncated, and next_info are batched data,
-            # and vector env will automatically reset the environment when terminated or truncated is True,
-            # So we need to get real final observation and info from next_info.
-
-            # Get real final observation
-            if "final_observation" in next_info.keys():
-                # get the index where next_info["_final_observation"] is True
-                index = np.where(next_info["_final_observation"])[0]
-                next_obs[index, :] = np.stack(next_info["final_observation"][index])
-                
-            
-            # convert a dict of batched data to a list of dicts of unbatched data
-            # e.g. next_info = {"a": [1, 2, 3], "b": [4, 5, 6]} ->
-            #      unbatched_infos = [{"a": 1, "b": 4}, {"a": 2, "b": 5}, {"a": 3, "b": 6}]
-            # ref: https://stackoverflow.com/questions/5558418/list-of-dicts-to-from-dict-of-lists
-            unbatched_infos = [dict(zip(next_info, t)) for t in zip(*next_info.values())]
-            
-            # Get real final info
-            if "final_info" in next_info.keys():
-                for i in index:
-                    unbatched_infos[i] = next_info["final_info"][i]
-
-            experiences = [Experience(*e) for e in zip(self.obs, action, reward, terminated, self.info, next_obs, unbatched_infos, logp)]
-
-            self.obs = next_obs
-            self.info = unbatched_infos
-
-            return experiences
-            
-        else:
-            next_obs, reward, done, next_info = self.env.step(action_clip)
+        next_obs, reward, done, next_info = self.env.step(action_clip)
 
-            # TODO: deprecate this after changing to gymnasium
-            if "TimeLimit.truncated" not in next_info.keys():
-                next_info["TimeLimit.truncated"] = False
-            if next_info["TimeLimit.truncated"]:
-                done = False
+        # TODO: deprecate this after changing to gymnasium
+        if "TimeLimit.truncated" not in next_info.keys():
+            next_info["TimeLimit.truncated"] = False
+        if next_info["TimeLimit.truncated"]:
+            done = False
         
-            experience = Experience(
-                obs=self.obs.copy(),
-                action=action,
-                reward=self.reward_scale * reward,
-                done=done,
-                info=self.info,
-                next_obs=next_obs.copy(),
-                next_info=next_info,
-                logp=logp,
-            )
-            
-            self.obs = next_obs
-            self.info = next_info
-            if done or next_info["TimeLimit.truncated"]:
-                self.obs, self.info = self.env.reset()
+        experience = Experience(
+            obs=self.obs.copy(),
+            action=action,
+            reward=self.reward_scale * reward,
+            done=done,
+            info=self.info,
+            next_obs=next_obs.copy(),
+            next_info=next_info,
+            logp=logp,
+        )
+        
+        self.obs = next_obs
+        self.info = next_info
+        if done or next_info["TimeLimit.truncated"]:
+            self.obs, self.info = self.env.reset()
 
-            return [experience]
+        return [experience]
@@ -12,12 +12,25 @@
 #  Update Date: 2023-07-22, Zhilong Zheng: inherit from BaseSampler
 
 
-from typing import List
+import numpy as np
 
-from gops.trainer.sampler.base import BaseSampler, Experience
+from gops.trainer.sampler.base import BaseSampler, concat_columns, stack_column
 
 
 class OffSampler(BaseSampler):
+    """
+    Sampler for off-policy algorithms.
+
+    With vector_env_min_ready and a vector env with send and recv, e.g. of type
+    "batched_async", environments are stepped asynchronously in partial batches:
+    every recv returns the transitions of at least vector_env_min_ready ready
+    environments, which are sent their next actions right away, while slow
+    environments keep stepping. Observations, infos, actions and logp are kept per
+    environment, so every transition belongs to one environment. A sample holds at
+    least sample_batch_size transitions, environments still stepping carry over to
+    the next sample.
+    """
+
     def __init__(
         self, 
         sample_batch_size,
@@ -31,10 +44,71 @@ class OffSampler(BaseSampler):
             noise_params,
             **kwargs
         )
-    
-    def _sample(self) -> List[Experience]:
+        self.min_ready = kwargs.get("vector_env_min_ready", None)
+        if self.min_ready is not None and not hasattr(self.env, "recv"):
+            raise ValueError(
+                "vector_env_min_ready needs a vector env with send and recv, e.g. batched_async!"
+            )
+        # actions and logp of the stepping environments
+        self.pending_act = None
+        self.pending_logp = None
+
+    def _sample(self) -> dict:
+        if self.min_ready is not None:
+            return self._sample_partial()
         batch_data = []
         for _ in range(self.horizon):
-            experiences = self._step()
-            batch_data.extend(experiences)
-        return batch_data
\ No newline at end of file
+            data, _ = self._step_columns()
+            batch_data.append(data)
+        return concat_columns(batch_data)
+
+    def _sample_partial(self) -> dict:
+        if self.pending_act is None:
+            self._send(np.arange(self.num_envs))
+        batch_data, num = [], 0
+        while num < self.sample_batch_size:
+            data, env_ids = self._recv_columns()
+            batch_data.append(data)
+            num += len(env_ids)
+            self._send(env_ids)
+        self.total_sample_number += num - self.sample_batch_size
+        return concat_columns(batch_data)
+
+    def _send(self, env_ids: np.ndarray):
+        action, logp, action_clip = self._act(self.obs[env_ids])
+        if self.pending_act is None:
+            self.pending_act = np.zeros((self.num_envs, *action.shape[1:]), action.dtype)
+            self.pending_logp = np.zeros(self.num_envs, dtype=np.float32)
+        self.pending_act[env_ids] = action
+        self.pending_logp[env_ids] = logp
+        self.env.send(action_clip, env_ids)
+
+    def _recv_columns(self):
+        """Transitions of the ready environments as arrays keyed like replay buffer fields."""
+        next_obs, reward, terminated, _, next_info = self.env.recv(self.min_ready)
+        env_ids = next_info["env_id"]
+        final_index = np.nonzero(next_info.get("_final_observation", np.zeros(0)))[0]
+        obs2 = next_obs
+        if len(final_index) > 0:
+            obs2 = next_obs.copy()
+            obs2[final_index] = np.stack(next_info["final_observation"][final_index])
+        data = {
+            "obs": self.obs[env_ids],
+            "act": self.pending_act[env_ids],
+            "rew": np.asarray(reward, dtype=np.float32),
+            "done": np.asarray(terminated, dtype=np.float32),
+            "obs2": obs2,
+            "logp": self.pending_logp[env_ids],
+        }
+        for k in self.info_keys:
+            values = next_info[k]
+            final_values = values
+            if len(final_index) > 0:
+                final_values = values.copy()
+                for i in final_index:
+                    final_values[i] = next_info["final_info"][i][k]
+            data[k] = self.info[k][env_ids]
+            data["next_" + k] = stack_column(final_values)
+            self.info[k][env_ids] = stack_column(values)
+        self.obs[env_ids] = next_obs
+        return data, env_ids
@@ -13,12 +13,11 @@
 #  Update Date: 2023-07-22, Zhilong Zheng: inherit from BaseSampler
 
 
-from typing import List
-
 import numpy as np
 import torch
 
-from gops.trainer.sampler.base import BaseSampler, Experience
+from gops.trainer.sampler.base import BaseSampler
+from gops.utils.state_columns import StateColumns
 
 
 class OnSampler(BaseSampler):
@@ -62,29 +61,30 @@ class OnSampler(BaseSampler):
             self.mb_adv = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
             self.mb_ret = np.zeros((self.num_envs, self.horizon), dtype=np.float32)
         self.mb_info = {}
-        self.info_keys = kwargs["additional_info"].keys()
         for k, v in kwargs["additional_info"].items():
-            self.mb_info[k] = np.zeros(
-                (self.num_envs, self.horizon, *v["shape"]), dtype=v["dtype"]
-            )
-            self.mb_info["next_" + k] = np.zeros(
-                (self.num_envs, self.horizon, *v["shape"]), dtype=v["dtype"]
-            )
+            if isinstance(v, dict):
+                self.mb_info[k] = np.zeros(
+                    (self.num_envs, self.horizon, *v["shape"]), dtype=v["dtype"]
+                )
+                self.mb_info["next_" + k] = np.zeros(
+                    (self.num_envs, self.horizon, *v["shape"]), dtype=v["dtype"]
+                )
+            else:
+                # e.g. State of gen-OCP envs
+                self.mb_info[k] = StateColumns.allocate(v, (self.num_envs, self.horizon))
+                self.mb_info["next_" + k] = StateColumns.allocate(
+                    v, (self.num_envs, self.horizon)
+                )
 
     def _sample(self) -> dict:
-        self.ptr = np.zeros(self.num_envs, dtype=np.int32)
-        self.last_ptr = np.zeros(self.num_envs, dtype=np.int32)
+        # next obs of trajectories finished at (env, t), bootstrapped at the end of horizon
+        self.end_env, self.end_t, self.end_obs = [], [], []
         for t in range(self.horizon):
-            # batch_obs has shape (num_envs, obs_dim)
-            if not self._is_vector:
-                batch_obs = torch.from_numpy(
-                    np.expand_dims(self.obs, axis=0).astype("float32")
-                )
-            else:
-                batch_obs = torch.from_numpy(self.obs.astype("float32"))
             # interact with environment
-            experiences = self._step()
-            self._process_experiences(experiences, batch_obs, t)
+            data, truncated = self._step_columns()
+            self._process_experiences(data, truncated, t)
+        if self.need_value_flag:
+            self._compute_gae()
 
         # wrap collected data into replay format
         mb_data = {
@@ -101,87 +101,59 @@ class OnSampler(BaseSampler):
                 "adv": torch.from_numpy(self.mb_adv.reshape(-1)),
             })
         for k, v in self.mb_info.items():
-            mb_data[k] = torch.from_numpy(v.reshape(-1, *v.shape[2:]))
+            if isinstance(v, StateColumns):
+                mb_data[k] = v.reshape(-1).tensor()
+            else:
+                mb_data[k] = torch.from_numpy(v.reshape(-1, *v.shape[2:]))
         return mb_data
 
     def sample_with_replay_format(self):
         return self.sample()
 
-    def _process_experiences(
-        self, 
-        experiences: List[Experience],
-        batch_obs: np.ndarray, 
-        t: int
-    ):
-        if self.need_value_flag:
-            value = self.networks.value(batch_obs).detach()
-            self.mb_val[:, t] = value
-        
-        for i in np.arange(self.num_envs):
-            (
-                obs, 
-                action, 
-                reward, 
-                done, 
-                info, 
-                next_obs, 
-                next_info, 
-                logp,
-            ) = experiences[i]
-
-            (
-                self.mb_obs[i, t, ...],
-                self.mb_act[i, t, ...],
-                self.mb_rew[i, t],
-                self.mb_done[i, t],
-                self.mb_tlim[i, t],
-                self.mb_logp[i, t],
-            ) = (
-                obs,
-                action,
-                reward,
-                done,
-                next_info["TimeLimit.truncated"],
-                logp,
-            )
+    def _process_experiences(self, data: dict, truncated: np.ndarray, t: int):
+        self.mb_obs[:, t] = data["obs"]
+        self.mb_act[:, t] = data["act"]
+        self.mb_rew[:, t] = data["rew"]
+        self.mb_done[:, t] = data["done"]
+        self.mb_tlim[:, t] = truncated
+        self.mb_logp[:, t] = data["logp"]
+        for key in self.info_keys:
+            self.mb_info[key][:, t] = data[key]
+            self.mb_info["next_" + key][:, t] = data["next_" + key]
 
-            for key in self.info_keys:
-                self.mb_info[key][i, t] = info[key]
-                self.mb_info["next_" + key][i, t] = next_info[key]
+        if self.need_value_flag:
+            if t == self.horizon - 1:
+                ends = np.arange(self.num_envs)
+            else:
+                ends = np.nonzero(self.mb_done[:, t] | self.mb_tlim[:, t])[0]
+            self.end_env.extend(ends)
+            self.end_t.extend([t] * len(ends))
+            self.end_obs.extend(data["obs2"][ends])
 
-            # calculate value target (mb_ret) & gae (mb_adv)
-            if (
-                done
-                or next_info["TimeLimit.truncated"]
-                or t == self.horizon - 1
-            ) and self.need_value_flag:
-                last_obs_expand = torch.from_numpy(
-                    np.expand_dims(next_obs, axis=0).astype("float32")
-                )
-                est_last_value = self.networks.value(
-                    last_obs_expand
-                ).detach().item() * (1 - done)
-                self.ptr[i] = t
-                self._finish_trajs(i, est_last_value)
-                self.last_ptr[i] = self.ptr[i]
+    def _compute_gae(self):
+        # values of all visited and bootstrap observations in one batch
+        num_steps = self.num_envs * self.horizon
+        obs = np.concatenate(
+            [
+                self.mb_obs.reshape(num_steps, *self.obs_dim),
+                np.stack(self.end_obs).astype(np.float32),
+            ]
+        )
+        values = self.networks.value(torch.from_numpy(obs)).detach().numpy()
+        self.mb_val[...] = values[:num_steps].reshape(self.num_envs, self.horizon)
 
-    def _finish_trajs(self, env_index: int, est_last_val: float):
-        # calculate value target (mb_ret) & gae (mb_adv) whenever episode is finished
-        path_slice = slice(self.last_ptr[env_index], self.ptr[env_index] + 1)
-        value_preds_slice = np.append(self.mb_val[env_index, path_slice], est_last_val)
-        rews_slice = self.mb_rew[env_index, path_slice]
-        length = len(rews_slice)
-        ret = np.zeros(length)
-        adv = np.zeros(length)
-        gae = 0.0
-        for i in reversed(range(length)):
-            delta = (
-                rews_slice[i]
-                + self.gamma * value_preds_slice[i + 1]
-                - value_preds_slice[i]
-            )
-            gae = delta + self.gamma * self.gae_lambda * gae
-            ret[i] = gae + value_preds_slice[i]
-            adv[i] = gae
-        self.mb_ret[env_index, path_slice] = ret
-        self.mb_adv[env_index, path_slice] = adv
+        # calculate value target (mb_ret) & gae (mb_adv), trajectories end on
+        # termination, truncation or the end of horizon
+        end_env, end_t = np.array(self.end_env), np.array(self.end_t)
+        val = self.mb_val.astype(np.float64)
+        next_val = np.zeros_like(val)
+        next_val[:, :-1] = val[:, 1:]
+        next_val[end_env, end_t] = values[num_steps:] * (1 - self.mb_done[end_env, end_t])
+        not_end = np.ones_like(val)
+        not_end[end_env, end_t] = 0.0
+        delta = self.mb_rew + self.gamma * next_val - val
+        gae = np.zeros(self.num_envs)
+        for t in reversed(range(self.horizon)):
+            gae = delta[:, t] + self.gamma * self.gae_lambda * not_end[:, t] * gae
+            self.mb_adv[:, t] = gae
+        self.mb_ret[...] = self.mb_adv + val
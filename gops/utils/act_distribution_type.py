@@ -10,18 +10,42 @@
 #  Update Date: 2021-03-10, Yujie Yang: Revise Codes
 
 
+import threading
+from contextlib import contextmanager
+
 import torch
 
 EPS = 1e-6
 
+# validate_args of torch distributions built in this thread, None for the torch default
+_local = threading.local()
+
+
+@contextmanager
+def no_validation():
+    """Build torch distributions of action distributions in this thread without argument checks."""
+    validate_args = getattr(_local, "validate_args", None)
+    _local.validate_args = False
+    try:
+        yield
+    finally:
+        _local.validate_args = validate_args
+
+
+def _validate_args():
+    return getattr(_local, "validate_args", None)
+
 
 class TanhGaussDistribution:
     def __init__(self, logits):
         self.logits = logits
         self.mean, self.std = torch.chunk(logits, chunks=2, dim=-1)
         self.gauss_distribution = torch.distributions.Independent(
-            base_distribution=torch.distributions.Normal(self.mean, self.std),
+            base_distribution=torch.distributions.Normal(
+                self.mean, self.std, validate_args=_validate_args()
+            ),
             reinterpreted_batch_ndims=1,
+            validate_args=_validate_args(),
         )
         self.act_high_lim = torch.tensor([1.0])
         self.act_low_lim = torch.tensor([-1.0])
@@ -81,8 +105,11 @@ class GaussDistribution:
         self.logits = logits
         self.mean, self.std = torch.chunk(logits, chunks=2, dim=-1)
         self.gauss_distribution = torch.distributions.Independent(
-            base_distribution=torch.distributions.Normal(self.mean, self.std),
+            base_distribution=torch.distributions.Normal(
+                self.mean, self.std, validate_args=_validate_args()
+            ),
             reinterpreted_batch_ndims=1,
+            validate_args=_validate_args(),
         )
         self.act_high_lim = torch.tensor([1.0])
         self.act_low_lim = torch.tensor([-1.0])
@@ -116,7 +143,9 @@ class GaussDistribution:
 class CategoricalDistribution:
     def __init__(self, logits: torch.Tensor):
         self.logits = logits
-        self.cat = torch.distributions.Categorical(logits=logits)
+        self.cat = torch.distributions.Categorical(
+            logits=logits, validate_args=_validate_args()
+        )
 
     def sample(self):
         action = self.cat.sample()
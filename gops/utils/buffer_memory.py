@@ -0,0 +1,91 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Estimate memory footprint of a replay buffer before training
+#  Usage: python -m gops.utils.buffer_memory --env_id gym_pendulum --buffer_max_size 1000000
+
+
+import argparse
+
+from gops.create_pkg.create_buffer import create_buffer
+from gops.create_pkg.create_env import create_env
+
+__all__ = ["estimate_buffer_memory"]
+
+
+def _probe_buffer_memory(max_size: int, **kwargs) -> dict:
+    kwargs = dict(kwargs, buffer_max_size=max_size, buffer_storage="ram")
+    return create_buffer(**kwargs).memory_info()
+
+
+def estimate_buffer_memory(**kwargs) -> dict:
+    """
+    Estimate memory allocated by a buffer of buffer_max_size without allocating it.
+
+    Two small buffers are created and their difference is extrapolated to
+    buffer_max_size. Buffer arrays, including State fields and prioritized trees, have
+    a length affine in the capacity, except for the frames of CompactReplayBuffer with
+    max_size + max_size // 8 rows. So the small capacities are 8 and 16 plus the
+    remainder of buffer_max_size modulo 8, over which the lengths of all arrays are
+    affine, and the estimate is exact.
+
+    Args:
+        kwargs: arguments of create_buffer, where obsv_dim, action_dim, additional_info
+                and buffer_max_size are needed.
+
+    Returns:
+        dict with allocated bytes per field in "fields", their sum in "allocated" and
+        the allocated bytes amortized over the capacity in "bytes_per_transition".
+    """
+    max_size = kwargs["buffer_max_size"]
+    kwargs.setdefault("trainer", "off_serial_trainer")
+    kwargs.setdefault("seed", 0)
+    small_size = 8 + max_size % 8
+    if max_size <= small_size + 8:
+        memory = _probe_buffer_memory(max_size, **kwargs)
+        return {k: memory[k] for k in ("fields", "allocated", "bytes_per_transition")}
+    small = _probe_buffer_memory(small_size, **kwargs)
+    large = _probe_buffer_memory(small_size + 8, **kwargs)
+    field_bytes = {
+        k: small["fields"][k]
+        + (large["fields"][k] - small["fields"][k]) * (max_size - small_size) // 8
+        for k in small["fields"]
+    }
+    allocated = sum(field_bytes.values())
+    return {
+        "fields": field_bytes,
+        "allocated": allocated,
+        "bytes_per_transition": allocated / max_size,
+    }
+
+
+def _env_buffer_kwargs(env) -> dict:
+    # same dimensions as init_args, without creating save folders
+    obs_shape = env.observation_space.shape
+    act_shape = getattr(env.action_space, "shape", ())
+    return {
+        "obsv_dim": obs_shape[0] if len(obs_shape) == 1 else obs_shape,
+        "action_dim": act_shape[0] if len(act_shape) == 1 else (act_shape or 1),
+        "additional_info": getattr(env, "additional_info", {}),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env_id", type=str, default="gym_pendulum")
+    parser.add_argument("--buffer_name", type=str, default="replay_buffer")
+    parser.add_argument("--buffer_max_size", type=int, default=int(1e6))
+    args = vars(parser.parse_args())
+
+    env = create_env(env_id=args["env_id"])
+    args.update(_env_buffer_kwargs(env))
+    memory = estimate_buffer_memory(**args)
+    for k, v in memory["fields"].items():
+        print("{:<40s}{:>12.2f} MB".format(k, v / 1000000))
+    print("{:<40s}{:>12.2f} MB".format("allocated", memory["allocated"] / 1000000))
+    print("{:<40s}{:>12.2f} B".format("bytes per transition", memory["bytes_per_transition"]))
@@ -12,6 +12,7 @@
 
 import sys
 import os
+import torch
 import torch.nn as nn
 import numpy as np
 import logging
@@ -65,6 +66,7 @@ def get_apprfunc_dict(key: str, **kwargs):
     var["std_type"] = kwargs.get(key + "_std_type", "mlp_shared")
     var["norm_matrix"] = kwargs.get("norm_matrix", None)
     var["pre_horizon"] = kwargs.get("pre_horizon", None)
+    var["ensemble_size"] = kwargs.get(key + "_ensemble_size", 2)
 
     apprfunc_type = kwargs[key + "_func_type"]
     if key + "_output_activation" not in kwargs.keys():
@@ -273,6 +275,46 @@ def get_parameters(modules):
     return model_parameters
 
 
+def polyak_update(params, target_params, tau: float):
+    """
+    Soft update of target parameters, target = (1 - tau) * target + tau * param,
+    applied to all parameters by fused foreach kernels.
+    :param params: iterable of parameters
+    :param target_params: iterable of target parameters in the same order
+    """
+    target_params = list(target_params)
+    with torch.no_grad():
+        torch._foreach_mul_(target_params, 1 - tau)
+        torch._foreach_add_(target_params, list(params), alpha=tau)
+
+
+def flat_grad(params) -> torch.Tensor:
+    """
+    Concatenate gradients of parameters into one flat tensor, missing gradients are zeros.
+    :param params: iterable of parameters
+    :returns: flat gradient tensor
+    """
+    return torch.cat(
+        [
+            (p.grad if p.grad is not None else torch.zeros_like(p)).reshape(-1)
+            for p in params
+        ]
+    )
+
+
+def set_flat_grad(params, grad: torch.Tensor):
+    """
+    Set gradients of parameters from a flat tensor made by flat_grad.
+    :param params: iterable of parameters in the same order as in flat_grad
+    :param grad: flat gradient tensor
+    """
+    offset = 0
+    for p in params:
+        numel = p.numel()
+        p._grad = grad[offset:offset + numel].view_as(p)
+        offset += numel
+
+
 class ModuleOnDevice:
     def __init__(self, module, device):
         self.module = module
@@ -0,0 +1,147 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Execution backends of workers with the call interface of Ray actors
+
+
+import copy
+import multiprocessing as mp
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures import wait as futures_wait
+from typing import Any, Callable, List, Tuple
+
+__all__ = ["BACKENDS", "LocalActor", "create_actor", "get", "wait"]
+
+# "ray": Ray actor, "thread": worker thread of the trainer process,
+# "process": forked subprocess of the trainer process
+BACKENDS = ("ray", "thread", "process")
+
+
+class _RemoteMethod:
+    def __init__(self, actor: "LocalActor", name: str):
+        self.actor = actor
+        self.name = name
+
+    def remote(self, *args, **kwargs) -> Future:
+        return self.actor._submit(self.name, args, kwargs)
+
+
+class LocalActor:
+    """
+    Worker without Ray, with the call interface of Ray actors.
+
+    actor.method.remote(*args, **kwargs) calls method of the worker asynchronously and
+    returns a concurrent.futures.Future, which get and wait of this module, and hence
+    TaskPool, handle like Ray object refs. Calls run one at a time in submission order,
+    like the methods of a Ray actor.
+
+    With backend "thread", the worker lives in the trainer process and its methods run
+    in a worker thread. Arguments are deep-copied at call time, so that they are passed
+    by value like with Ray, e.g. a state dict is not changed by later updates. With
+    backend "process", the worker is created in a forked subprocess, whose methods
+    get pickled arguments and do not compete with the trainer for the GIL.
+
+    Args:
+        cls (Callable): class of the worker.
+        backend (str, optional): "thread" or "process". Defaults to "thread".
+        **kwargs: keyword arguments of cls.
+    """
+
+    def __init__(self, cls: Callable, backend: str = "thread", **kwargs: Any):
+        if backend == "thread":
+            self._instance = cls(**kwargs)
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        elif backend == "process":
+            self._instance = None
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=mp.get_context("fork"),
+                initializer=_init_process_actor,
+                initargs=(cls, kwargs),
+            )
+        else:
+            raise ValueError(f"Unknown local backend: {backend}")
+        self.backend = backend
+
+    def __getattr__(self, name: str) -> _RemoteMethod:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _RemoteMethod(self, name)
+
+    def _submit(self, name: str, args: tuple, kwargs: dict) -> Future:
+        if self.backend == "thread":
+            args, kwargs = copy.deepcopy((args, kwargs))
+            return self._executor.submit(getattr(self._instance, name), *args, **kwargs)
+        return self._executor.submit(_call_process_actor, name, args, kwargs)
+
+
+# worker of the forked subprocess of a LocalActor
+_process_actor = None
+
+
+def _init_process_actor(cls: Callable, kwargs: dict):
+    global _process_actor
+    _process_actor = cls(**kwargs)
+
+
+def _call_process_actor(name: str, args: tuple, kwargs: dict):
+    return getattr(_process_actor, name)(*args, **kwargs)
+
+
+def create_actor(cls: Callable, backend: str = "ray", num_cpus: int = 1, **kwargs):
+    """Create a worker of cls with backend, a Ray actor or a LocalActor."""
+    if backend == "ray":
+        import ray
+
+        return ray.remote(num_cpus=num_cpus)(cls).remote(**kwargs)
+    return LocalActor(cls, backend, **kwargs)
+
+
+def get(obj_ids):
+    """Results of object refs or futures, or of a list of them, like ray.get."""
+    if isinstance(obj_ids, list):
+        if obj_ids and not isinstance(obj_ids[0], Future):
+            import ray
+
+            return ray.get(obj_ids)
+        return [f.result() for f in obj_ids]
+    if isinstance(obj_ids, Future):
+        return obj_ids.result()
+    import ray
+
+    return ray.get(obj_ids)
+
+
+def wait(
+    obj_ids: List, num_returns: int = 1, timeout: float = None
+) -> Tuple[List, List]:
+    """Ready and pending object refs or futures, like ray.wait."""
+    if not obj_ids or not isinstance(obj_ids[0], Future):
+        import ray
+
+        return ray.wait(obj_ids, num_returns=num_returns, timeout=timeout)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    ready = [f for f in obj_ids if f.done()]
+    while len(ready) < num_returns:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
+        futures_wait(
+            [f for f in obj_ids if not f.done()],
+            timeout=remaining,
+            return_when=FIRST_COMPLETED,
+        )
+        ready = [f for f in obj_ids if f.done()]
+    ready = ready[:num_returns]
+    return ready, [f for f in obj_ids if f not in ready]
@@ -14,13 +14,13 @@ import copy
 import datetime
 import json
 import os
-import ray
 import torch
 import warnings
 from gym.spaces import Box, Discrete
 from gymnasium.spaces import Box as GymnasiumBox
 from gymnasium.spaces import Discrete as GymnasiumDiscrete
 from gops.utils.common_utils import change_type, seed_everything
+from gops.utils.execution_backend import BACKENDS
 
 
 
@@ -121,7 +121,16 @@ def init_args(env, **args):
         args["additional_info"] = {}
 
     # Start a new local Ray instance
-    # This is necessary since all training scripts use evaluator, which uses ray.
-    ray.init(address="local")
+    # This is necessary since all training scripts use evaluator, which uses ray,
+    # unless serial trainers run the evaluator with a local execution backend.
+    args.setdefault("execution_backend", "ray")
+    if args["execution_backend"] not in BACKENDS:
+        raise ValueError(f"Unknown execution backend: {args['execution_backend']}")
+    if args["execution_backend"] == "ray":
+        import ray
+
+        ray.init(address="local")
+    elif args["trainer"] not in ("on_serial_trainer", "off_serial_trainer", "off_dist_trainer"):
+        raise ValueError(f"{args['trainer']} runs on Ray, execution_backend must be ray!")
 
     return args
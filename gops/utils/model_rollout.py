@@ -0,0 +1,182 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Multi-step rollout of policies in environment models
+
+
+import time
+import warnings
+from typing import Callable, List, NamedTuple
+
+import numpy as np
+import torch
+
+__all__ = ["ModelRollout", "rollout_model", "discounted_sum", "HorizonRollout"]
+
+
+class ModelRollout(NamedTuple):
+    rewards: List[torch.Tensor]
+    infos: List[dict]
+    # obs and done after the last step
+    obs: torch.Tensor
+    done: torch.Tensor
+
+
+def rollout_model(
+    model_forward: Callable,
+    policy: Callable,
+    obs: torch.Tensor,
+    done: torch.Tensor,
+    info: dict,
+    forward_step: int,
+) -> ModelRollout:
+    """
+    Roll a policy forward in an environment model for forward_step steps.
+
+    The rollout is differentiable if it is not run under torch.no_grad, so one rollout
+    can serve both the policy loss, through its graph, and the value target, through
+    its detached tensors.
+
+    Args:
+        model_forward: function (obs, act, done, info) -> (obs2, rew, done, info).
+        policy: function obs -> act.
+        obs, done, info: start of the rollout, info is not modified.
+        forward_step: number of model steps.
+    """
+    rewards, infos = [], []
+    for _ in range(forward_step):
+        act = policy(obs)
+        obs, rew, done, info = model_forward(obs, act, done, info)
+        rewards.append(rew)
+        infos.append(info)
+    return ModelRollout(rewards, infos, obs, done)
+
+
+def discounted_sum(values: List[torch.Tensor], gamma: float) -> torch.Tensor:
+    """Sum of gamma ** step * values[step] over all steps."""
+    total = values[0]
+    for step in range(1, len(values)):
+        total = total + gamma**step * values[step]
+    return total
+
+
+class HorizonRollout:
+    """
+    Discounted return of a finite-horizon policy rolled out in an environment model
+    over the whole prediction horizon, as used by FHADP.
+
+    The virtual time inputs of the policy are preallocated for all steps. A full-horizon
+    policy, i.e. one with forward_all_policy, is evaluated once for the actions of all
+    steps, which are then applied open-loop in the model. With backend
+    "compile", the whole horizon, i.e. policy and wrapped model, is compiled by
+    torch.compile into one graph, falling back to eager mode if compilation fails.
+    With timing, the rollout runs eagerly and the forward time of the policy and the
+    model at every step is recorded in step_time, a [pre_horizon, 2] array in ms.
+
+    Args:
+        policy: finite-horizon policy, called as policy(obs, virtual_t), or full-horizon
+                policy with forward_all_policy(obs).
+        model_forward: function (obs, act, done, info) -> (obs2, rew, done, info).
+        pre_horizon (int): prediction horizon.
+        gamma (float): discount factor.
+        backend (str, optional): "eager" or "compile". Defaults to "eager".
+        timing (bool, optional): record per-step forward time. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        policy: Callable,
+        model_forward: Callable,
+        pre_horizon: int,
+        gamma: float,
+        backend: str = "eager",
+        timing: bool = False,
+    ):
+        if backend not in ("eager", "compile"):
+            raise ValueError(f"Unknown rollout backend: {backend}")
+        self.policy = policy
+        self.full_horizon = hasattr(policy, "forward_all_policy")
+        if self.full_horizon and policy.pre_horizon < pre_horizon:
+            raise ValueError(
+                f"Full-horizon policy predicts {policy.pre_horizon} steps, "
+                f"but pre_horizon is {pre_horizon}!"
+            )
+        self.model_forward = model_forward
+        self.pre_horizon = pre_horizon
+        self.gamma = gamma
+        self.backend = backend
+        self.timing = timing
+        self.step_time = np.zeros((pre_horizon, 2))
+        self.virtual_t = None
+        self.compiled = None
+        if backend == "compile":
+            if hasattr(torch, "compile"):
+                self.compiled = torch.compile(self._rollout)
+            else:
+                warnings.warn("torch.compile is not available, rolling out in eager mode")
+
+    def __call__(self, obs: torch.Tensor, done: torch.Tensor, info: dict) -> torch.Tensor:
+        virtual_t = self._get_virtual_t(obs)
+        if self.timing:
+            return self._timed_rollout(obs, done, info, virtual_t)
+        if self.compiled is not None:
+            try:
+                return self.compiled(obs, done, info, virtual_t)
+            except Exception as e:
+                warnings.warn(f"Compiling model rollout failed, rolling out in eager mode: {e}")
+                self.compiled = None
+        return self._rollout(obs, done, info, virtual_t)
+
+    def _get_virtual_t(self, obs: torch.Tensor) -> torch.Tensor:
+        # [pre_horizon, batch, 1] tensor holding step + 1 for every step
+        if self.full_horizon:
+            return None
+        if (
+            self.virtual_t is None
+            or self.virtual_t.shape[1] != obs.shape[0]
+            or self.virtual_t.device != obs.device
+        ):
+            steps = torch.arange(
+                1, self.pre_horizon + 1, dtype=torch.float32, device=obs.device
+            )
+            self.virtual_t = steps.view(-1, 1, 1).repeat(1, obs.shape[0], 1)
+        return self.virtual_t
+
+    def _rollout(self, obs, done, info, virtual_t):
+        if self.full_horizon:
+            actions = self.policy.forward_all_policy(obs)
+        v_pi = 0
+        for step in range(self.pre_horizon):
+            if self.full_horizon:
+                act = actions[:, step]
+            else:
+                act = self.policy(obs, virtual_t[step])
+            obs, rew, done, info = self.model_forward(obs, act, done, info)
+            v_pi = v_pi + rew * (self.gamma ** step)
+        return v_pi
+
+    def _timed_rollout(self, obs, done, info, virtual_t):
+        sync = torch.cuda.synchronize if obs.is_cuda else (lambda: None)
+        v_pi = 0
+        for step in range(self.pre_horizon):
+            sync()
+            start = time.perf_counter()
+            if self.full_horizon:
+                # the single policy forward is accounted to the first step
+                if step == 0:
+                    actions = self.policy.forward_all_policy(obs)
+                act = actions[:, step]
+            else:
+                act = self.policy(obs, virtual_t[step])
+            sync()
+            mid = time.perf_counter()
+            obs, rew, done, info = self.model_forward(obs, act, done, info)
+            sync()
+            self.step_time[step] = (mid - start) * 1000, (time.perf_counter() - mid) * 1000
+            v_pi = v_pi + rew * (self.gamma ** step)
+        return v_pi
@@ -10,12 +10,13 @@
 #  Update: 2021-03-10, Yang Guan: Create codes
 
 
-import ray
+from gops.utils.execution_backend import wait
 
 
 class TaskPool(object):
     """
-    Helper class for tracking status of many in-flight actor tasks.
+    Helper class for tracking status of many in-flight actor tasks, of Ray actors
+    or of LocalActors.
     """
 
     def __init__(self):
@@ -34,17 +35,18 @@ class TaskPool(object):
     def completed(self, blocking_wait=False):
         pending = list(self._tasks)
         if pending:
-            ready, _ = ray.wait(pending, num_returns=len(pending), timeout=0)
+            ready, _ = wait(pending, num_returns=len(pending), timeout=0)
             if not ready and blocking_wait:
-                ready, _ = ray.wait(pending, num_returns=1, timeout=10.0)
+                ready, _ = wait(pending, num_returns=1, timeout=10.0)
             for obj_id in ready:
                 yield self._tasks.pop(obj_id), self._objects.pop(obj_id)
 
     @property
     def completed_num(self):
         pending = list(self._tasks)
+        ready = []
         if pending:
-            ready, _ = ray.wait(pending, num_returns=len(pending), timeout=0)
+            ready, _ = wait(pending, num_returns=len(pending), timeout=0)
         return len(ready)
 
     @property
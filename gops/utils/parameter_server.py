@@ -0,0 +1,140 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Versioned publication of network weights to Ray workers
+
+
+import warnings
+from collections import OrderedDict
+from typing import Dict, Sequence
+
+import ray
+import torch
+
+__all__ = ["FlatWeights", "ParameterServer"]
+
+
+class FlatWeights:
+    """
+    Weights of a state dict, or of the subset of its keys with given prefixes, packed
+    into one flat numpy array per dtype.
+
+    Ray serializes numpy arrays without pickling their data and workers on the same
+    node read them from the object store without copying, so a FlatWeights is put
+    into the object store with a single copy of the weights.
+
+    Args:
+        state_dict (dict): state dict of networks.
+        version (int): version of the weights.
+        prefixes (Sequence[str], optional): keep only keys starting with one of them.
+                                            Defaults to None, i.e. all keys.
+    """
+
+    def __init__(self, state_dict: dict, version: int, prefixes: Sequence[str] = None):
+        self.version = version
+        self.partial = prefixes is not None
+        groups = OrderedDict()
+        for k, v in state_dict.items():
+            if self.partial and not k.startswith(tuple(prefixes)):
+                continue
+            groups.setdefault(v.dtype, []).append((k, v))
+
+        # (key, index of flat array, offset, shape) of every tensor
+        self.layout = []
+        self.arrays = []
+        for tensors in groups.values():
+            offset = 0
+            for k, v in tensors:
+                self.layout.append((k, len(self.arrays), offset, tuple(v.shape)))
+                offset += v.numel()
+            flat = torch.cat([v.detach().reshape(-1).cpu() for _, v in tensors])
+            self.arrays.append(flat.numpy())
+
+    def state_dict(self) -> OrderedDict:
+        """State dict of views into the flat arrays."""
+        with warnings.catch_warnings():
+            # arrays read from the object store are not writable, loading copies them
+            warnings.simplefilter("ignore", UserWarning)
+            flats = [torch.from_numpy(a) for a in self.arrays]
+        state_dict = OrderedDict()
+        for k, i, offset, shape in self.layout:
+            numel = 1
+            for n in shape:
+                numel *= n
+            state_dict[k] = flats[i][offset:offset + numel].view(shape)
+        return state_dict
+
+    def load_into(self, networks: torch.nn.Module):
+        networks.load_state_dict(self.state_dict(), strict=not self.partial)
+
+
+class ParameterServer:
+    """
+    Versioned publication of the weights of the center networks of a trainer to Ray
+    workers, i.e. samplers, learners and evaluators.
+
+    Whenever the center networks change, the trainer calls new_version(). The weights
+    of a version are flattened and put into the object store once per subset, on the
+    first sync of a worker, no matter how many workers pull them. A worker is only sent
+    weights if it has not got the current version yet, which it loads by
+    load_flat_weights(weights).
+
+    Subsets map a name to key prefixes of the state dict, "all" means all keys. By
+    default, the "policy" subset only contains the policy, without critics and target
+    networks, which is all that samplers and evaluators of off-policy algorithms act
+    with. A subset matching no key, e.g. "policy" of DQN, whose policy is derived from
+    its Q network, falls back to all keys.
+
+    Args:
+        networks (torch.nn.Module): center networks.
+        subsets (dict, optional): key prefixes of named subsets.
+                                  Defaults to {"policy": ("policy.",)}.
+    """
+
+    def __init__(
+        self, networks: torch.nn.Module, subsets: Dict[str, Sequence[str]] = None
+    ):
+        self.networks = networks
+        if subsets is None:
+            subsets = {"policy": ("policy.",)}
+        keys = list(networks.state_dict().keys())
+        self.subsets = {
+            name: tuple(prefixes)
+            if any(k.startswith(tuple(prefixes)) for k in keys)
+            else None
+            for name, prefixes in subsets.items()
+        }
+        self.subsets["all"] = None
+        self.version = 0
+        # subset name -> object ref of the current version
+        self._published = {}
+        # worker -> version it has got
+        self._worker_versions = {}
+
+    def new_version(self):
+        """Mark the weights of the center networks as changed."""
+        self.version += 1
+        self._published.clear()
+
+    def get(self, subset: str = "all"):
+        """Object ref of the current weights of subset, put at most once per version."""
+        prefixes = self.subsets[subset]
+        if prefixes is None:
+            subset = "all"
+        if subset not in self._published:
+            weights = FlatWeights(self.networks.state_dict(), self.version, prefixes)
+            self._published[subset] = ray.put(weights)
+        return self._published[subset]
+
+    def sync(self, worker, subset: str = "all") -> bool:
+        """Send the current weights of subset to worker unless it already has them."""
+        if self._worker_versions.get(worker) == self.version:
+            return False
+        worker.load_flat_weights.remote(self.get(subset))
+        self._worker_versions[worker] = self.version
+        return True
@@ -0,0 +1,145 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Action selection of policies for acting in environments
+#  Usage: python -m gops.utils.policy_actor  (benchmark of acting steps per second)
+
+
+import warnings
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from gops.utils.act_distribution_type import no_validation
+
+__all__ = ["PolicyActor"]
+
+
+class PolicyActor:
+    """
+    Action selection of a policy for acting in environments, used by samplers,
+    evaluators and simulation tools.
+
+    Actions are computed in inference mode, so no autograd graph is recorded, and
+    action distributions are built without the argument checks of torch distributions,
+    which dominate the cost of small acting batches. The
+    policy can be traced by TorchScript or compiled by torch.compile for acting, in
+    which case refresh() has to be called whenever new weights are loaded.
+
+    Args:
+        networks: approximate function container with policy and
+                  create_action_distributions.
+        backend (str, optional): "eager", "trace" or "compile". Defaults to "eager".
+    """
+
+    def __init__(self, networks, backend: str = "eager"):
+        if backend not in ("eager", "trace", "compile"):
+            raise ValueError(f"Unknown acting backend: {backend}")
+        self.networks = networks
+        self.backend = backend
+        self.create_action_distributions = networks.create_action_distributions
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Rebuild the acting policy from the current weights of networks."""
+        # traced policies are specialized to the input shape
+        self.traced = {}
+        self.policy = self.networks.policy
+        if self.backend == "compile":
+            if hasattr(torch, "compile"):
+                self.policy = torch.compile(self.networks.policy, dynamic=True)
+            else:
+                warnings.warn("torch.compile is not available, acting in eager mode")
+
+    def _get_policy(self, batch_obs: torch.Tensor):
+        if self.backend != "trace":
+            return self.policy
+        shape = tuple(batch_obs.shape)
+        if shape not in self.traced:
+            try:
+                self.traced[shape] = torch.jit.trace(
+                    self.networks.policy, batch_obs, check_trace=False
+                )
+            except Exception as e:
+                warnings.warn(f"Tracing policy failed, acting in eager mode: {e}")
+                self.traced[shape] = self.networks.policy
+        return self.traced[shape]
+
+    def _action_distribution(self, obs: np.ndarray):
+        batch_obs = torch.from_numpy(np.asarray(obs, dtype=np.float32))
+        logits = self._get_policy(batch_obs)(batch_obs)
+        return self.create_action_distributions(logits)
+
+    def sample(self, obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Sample actions and their log probabilities for a batch of observations."""
+        with torch.inference_mode(), no_validation():
+            action, logp = self._action_distribution(obs).sample()
+        return action.numpy(), logp.numpy()
+
+    def mode(self, obs: np.ndarray) -> np.ndarray:
+        """Deterministic actions for a batch of observations."""
+        with torch.inference_mode(), no_validation():
+            action = self._action_distribution(obs).mode()
+        return action.numpy()
+
+
+if __name__ == "__main__":
+    import time
+
+    from gops.create_pkg.create_alg import create_approx_contrainer
+
+    kwargs = dict(
+        algorithm="SAC",
+        obsv_dim=32,
+        action_type="continu",
+        action_dim=4,
+        action_high_limit=np.ones(4, dtype=np.float32),
+        action_low_limit=-np.ones(4, dtype=np.float32),
+        value_func_name="ActionValue",
+        value_func_type="MLP",
+        value_hidden_sizes=[256, 256],
+        value_hidden_activation="relu",
+        value_output_activation="linear",
+        policy_func_name="StochaPolicy",
+        policy_func_type="MLP",
+        policy_act_distribution="TanhGaussDistribution",
+        policy_hidden_sizes=[256, 256],
+        policy_hidden_activation="relu",
+        policy_output_activation="linear",
+        policy_min_log_std=-20,
+        policy_max_log_std=0.5,
+        q_learning_rate=1e-3,
+        policy_learning_rate=1e-3,
+        alpha_learning_rate=1e-3,
+        cnn_shared=False,
+    )
+    networks = create_approx_contrainer(**kwargs)
+
+    def autograd_sample(obs):
+        # acting path before PolicyActor
+        batch_obs = torch.from_numpy(obs.astype("float32"))
+        logits = networks.policy(batch_obs)
+        action, logp = networks.create_action_distributions(logits).sample()
+        return action.detach().numpy(), logp.detach().numpy()
+
+    def steps_per_second(act, obs, n=2000):
+        for _ in range(20):
+            act(obs)
+        start = time.perf_counter()
+        for _ in range(n):
+            act(obs)
+        return n / (time.perf_counter() - start)
+
+    for batch_size in (1, 64):
+        obs = np.random.randn(batch_size, 32)
+        print("batch size {}:".format(batch_size))
+        print("  autograd + detach  {:10.0f} steps/s".format(steps_per_second(autograd_sample, obs)))
+        for backend in ("eager", "trace"):
+            actor = PolicyActor(networks, backend)
+            print("  {:<18s} {:10.0f} steps/s".format(backend, steps_per_second(actor.sample, obs)))
@@ -0,0 +1,171 @@
+#  Copyright (c). All Rights Reserved.
+#  General Optimal control Problem Solver (GOPS)
+#  Intelligent Driving Lab (iDLab), Tsinghua University
+#
+#  Creator: iDLab
+#  Lab Leader: Prof. Shengbo Eben Li
+#  Email: lisb04@gmail.com
+#
+#  Description: Columnar storage of batches of State of gen-OCP envs
+
+
+from dataclasses import is_dataclass
+from typing import Callable, List, Sequence
+
+import numpy as np
+import torch
+
+from gops.env.env_gen_ocp.pyth_base import field_names
+
+__all__ = ["StateLayout", "StateColumns"]
+
+
+class StateLayout:
+    """
+    Layout of the leaves of a State or ContextState template in flat columns.
+
+    Array leaves of the same dtype are laid side by side in the rows of one block, so
+    a batch of states is stored as one (..., width) array per dtype, and every leaf is
+    a column range of its block. Leaves which are not arrays, e.g. a constraint of
+    None, are kept as constants of the template. The layout is computed once, so
+    states are split into and rebuilt from blocks without reflecting on dataclass
+    fields.
+
+    Args:
+        template: State or ContextState of one environment, e.g. additional_info["state"].
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.dtypes: List[np.dtype] = []
+        self.widths: List[int] = []
+        # (path of field names, index of block, offset, size, shape) of every array leaf
+        self.leaves = []
+        self._add_leaves(template, ())
+        self._build = self._compile(template)
+
+    def _add_leaves(self, v, path: tuple):
+        if isinstance(v, np.ndarray):
+            if v.dtype not in self.dtypes:
+                self.dtypes.append(v.dtype)
+                self.widths.append(0)
+            i = self.dtypes.index(v.dtype)
+            self.leaves.append((path, i, self.widths[i], v.size, v.shape))
+            self.widths[i] += v.size
+        elif is_dataclass(v):
+            for name in field_names(v):
+                self._add_leaves(getattr(v, name), path + (name,))
+
+    def _compile(self, v) -> Callable:
+        # function building the structure of v from an iterator over leaf values
+        if isinstance(v, np.ndarray):
+            return next
+        if is_dataclass(v):
+            cls = v.__class__
+            builders = [self._compile(getattr(v, name)) for name in field_names(v)]
+            return lambda it: cls(*[build(it) for build in builders])
+        return lambda it: v
+
+    def split(self, state) -> list:
+        """Leaf values of state in the order of leaves."""
+        values = []
+        for path, _, _, _, _ in self.leaves:
+            v = state
+            for name in path:
+                v = getattr(v, name)
+            values.append(v)
+        return values
+
+    def build(self, blocks: Sequence, fn: Callable = None):
+        """
+        State of views into blocks of numpy arrays or tensors of shape (..., width),
+        with fn applied to every leaf if given.
+        """
+        values = []
+        for _, i, offset, size, shape in self.leaves:
+            block = blocks[i]
+            v = block[..., offset:offset + size].reshape(block.shape[:-1] + shape)
+            values.append(v if fn is None else fn(v))
+        return self._build(iter(values))
+
+
+class StateColumns:
+    """
+    Batch of states stored in the flat blocks of a StateLayout.
+
+    Indexing with the leading dimensions works like indexing a batched State:
+    columns[idx] gives a State of numpy arrays and columns[idx] = state writes a State.
+    take gathers rows with one indexing operation per block, tensor converts the
+    blocks to tensors, optionally on a device, and views them as a State of tensors.
+
+    Args:
+        layout (StateLayout): layout of the states.
+        blocks (list): one array of shape (..., width) per dtype of the layout.
+    """
+
+    def __init__(self, layout: StateLayout, blocks: list):
+        self.layout = layout
+        self.blocks = blocks
+
+    @classmethod
+    def allocate(
+        cls, template, shape: tuple, create_field: Callable = None
+    ) -> "StateColumns":
+        """
+        Allocate blocks with leading dimensions shape, filled with the template.
+
+        create_field(name, shape, dtype) allocates a block, e.g. in another storage
+        backend, defaults to np.zeros. Blocks are named by their dtype.
+        """
+        layout = StateLayout(template)
+        if create_field is None:
+            create_field = lambda name, shape, dtype: np.zeros(shape, dtype=dtype)
+        blocks = [
+            create_field(dtype.name, (*shape, width), dtype)
+            for dtype, width in zip(layout.dtypes, layout.widths)
+        ]
+        return cls(layout, blocks)
+
+    @property
+    def shape(self) -> tuple:
+        return self.blocks[0].shape[:-1]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def named_blocks(self, prefix: str) -> dict:
+        return {
+            prefix + "." + dtype.name: block
+            for dtype, block in zip(self.layout.dtypes, self.blocks)
+        }
+
+    def take(self, idx) -> "StateColumns":
+        return StateColumns(self.layout, [block[idx] for block in self.blocks])
+
+    def reshape(self, *shape) -> "StateColumns":
+        return StateColumns(
+            self.layout, [block.reshape(*shape, block.shape[-1]) for block in self.blocks]
+        )
+
+    def state(self):
+        """State of numpy views into the blocks."""
+        return self.layout.build(self.blocks)
+
+    def tensor(self, device=None):
+        """State of tensors sharing memory with the blocks unless moved to device."""
+        if device is None:
+            # numpy views are cheaper to build than tensor views
+            return self.layout.build(self.blocks, torch.from_numpy)
+        blocks = [torch.from_numpy(block).to(device) for block in self.blocks]
+        return self.layout.build(blocks)
+
+    def __getitem__(self, idx):
+        return self.take(idx).state()
+
+    def __setitem__(self, idx, value):
+        idx = idx if isinstance(idx, tuple) else (idx,)
+        for (_, i, offset, size, shape), v in zip(self.layout.leaves, self.layout.split(value)):
+            v = np.asarray(v)
+            self.blocks[i][idx + (slice(offset, offset + size),)] = v.reshape(
+                *v.shape[:v.ndim - len(shape)], size
+            )
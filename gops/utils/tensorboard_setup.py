@@ -157,12 +157,14 @@ tb_tags = {
     "TAR of collected samples": "Evaluation/3. TAR-Collected samples",
     "TAR of replay samples": "Evaluation/4. TAR-Replay samples",
     "Buffer RAM of RL iteration": "RAM/RAM [MB]-RL iter",
+    "Buffer allocated RAM of RL iteration": "RAM/Allocated RAM [MB]-RL iter",
     "loss_actor": "Loss/Actor loss-RL iter",
     "loss_actor_reward": "Loss/Actor reward loss-RL iter",
     "loss_actor_constraint": "Loss/Actor constraint loss-RL iter",
     "loss_critic": "Loss/Critic loss-RL iter",
     "alg_time": "Time/Algorithm time [ms]-RL iter",
     "sampler_time": "Time/Sampler time [ms]-RL iter",
+    "allreduce_time": "Time/Allreduce time [ms]-RL iter",
     "critic_avg_value": "Train/Critic avg value-RL iter",
     "lips_value": "Lipschitz/Lipschitz value - RL iter",
 }